@@ -1,6 +1,17 @@
-from django.contrib import admin
+from django import forms
+from django.contrib import admin, messages
 from django.contrib.auth.admin import UserAdmin
-from .models import Professional, User, Booking
+from django.http import HttpResponseRedirect, StreamingHttpResponse
+from django.utils import timezone
+
+from .models import (
+    ArchivedBooking, Professional, User, Booking, BookingDailyStat, BookingTombstone, OutboundEmail, OpeningHours,
+    RecurrenceException, RecurringBooking, Service,
+)
+from .paginators import ApproximateCountPaginator
+from .services.booking_service import BookingService
+from .services.bulk_service import BulkBookingService
+from .services.recurrence_service import RecurrenceService
 
 
 @admin.register(User)
@@ -15,9 +26,125 @@ class CustomUserAdmin(UserAdmin):
     ordering = ('id',)
 
 
+class OpeningHoursInline(admin.TabularInline):
+    """Orari di apertura modificabili direttamente dalla scheda del Professional."""
+    model = OpeningHours
+    extra = 0
+
+
+class ServiceInline(admin.TabularInline):
+    """Catalogo dei servizi (durata e prezzo) modificabile dalla scheda del Professional."""
+    model = Service
+    extra = 0
+
+
+@admin.register(Professional)
+class ProfessionalAdmin(admin.ModelAdmin):
+    """Professional: ogni salone/studio collegato a un utente, con orari di apertura e catalogo servizi."""
+    inlines = [OpeningHoursInline, ServiceInline]
+    # Serve all'autocomplete del campo professional nella scheda Booking
+    search_fields = ('business_name',)
+
+
+@admin.register(Booking)
+class BookingAdmin(admin.ModelAdmin):
+    """
+    Prenotazioni, pensato per tabelle da milioni di righe:
+    - colonne esplicite con professional e service in JOIN (list_select_related):
+      niente __str__ né query per riga;
+    - date_hierarchy sull'indice booking_date_idx; alla prima apertura della
+      sessione la lista parte dall'anno corrente, così mesi e righe si leggono
+      da un range dell'indice invece che dall'intera tabella;
+    - totale stimato senza filtri (ApproximateCountPaginator) e nessun secondo
+      COUNT(*) per il "mostra tutti";
+    - azioni di massa: annullamento a blocchi con avviso al cliente ed export
+      CSV in streaming.
+    """
+    list_display = ('date', 'time', 'client_name', 'client_email', 'professional', 'service')
+    list_select_related = ('professional', 'service')
+    date_hierarchy = 'date'
+    # Stesso ordine dell'indice booking_date_idx letto all'indietro (id come tie-breaker)
+    ordering = ('-date', '-time', '-id')
+    paginator = ApproximateCountPaginator
+    show_full_result_count = False
+    autocomplete_fields = ('professional',)
+    raw_id_fields = ('service',)
+    actions = ('cancel_bookings', 'export_csv')
+
+    # Sessione: la lista si è già aperta sull'anno corrente una volta
+    DEFAULT_YEAR_SESSION_KEY = 'booking_admin_default_year'
+
+    def changelist_view(self, request, extra_context=None):
+        # Solo alla prima apertura della sessione: poi "Tutte le date" (link "?") mostra
+        # l'elenco completo, con il totale stimato
+        if request.method == 'GET' and not request.GET and not request.session.get(self.DEFAULT_YEAR_SESSION_KEY):
+            request.session[self.DEFAULT_YEAR_SESSION_KEY] = True
+            return HttpResponseRedirect(f'{request.path}?date__year={timezone.localdate().year}')
+        return super().changelist_view(request, extra_context)
+
+    def get_actions(self, request):
+        actions = super().get_actions(request)
+        # delete_selected carica in memoria tutte le booking scelte (e i relativi oggetti)
+        # per la pagina di conferma: cancel_bookings lavora a blocchi
+        actions.pop('delete_selected', None)
+        return actions
+
+    @admin.action(description="Annulla le prenotazioni selezionate e avvisa i clienti", permissions=['delete'])
+    def cancel_bookings(self, request, queryset):
+        cancelled = BookingService.cancel_bookings(queryset)
+        self.message_user(request, f"Annullate {cancelled} prenotazioni.", messages.SUCCESS)
+
+    @admin.action(description="Esporta in CSV le prenotazioni selezionate")
+    def export_csv(self, request, queryset):
+        lines = BulkBookingService.iter_export(queryset, 'csv', fields=('id',) + BulkBookingService.FIELDS)
+        response = StreamingHttpResponse(lines, content_type='text/csv; charset=utf-8')
+        response['Content-Disposition'] = 'attachment; filename="prenotazioni.csv"'
+        return response
+
+
+class RecurringBookingForm(forms.ModelForm):
+    class Meta:
+        model = RecurringBooking
+        fields = '__all__'
+
+    def clean(self):
+        """Come BookingService.create_recurring: nessuna occorrenza su uno slot già occupato."""
+        cleaned_data = super().clean()
+        if not self.errors:
+            conflict = RecurrenceService.find_conflict(self.instance)
+            if conflict:
+                raise forms.ValidationError(f"Il {conflict} alle {self.instance.time} lo slot è già occupato.")
+        return cleaned_data
+
+
+class RecurrenceExceptionInline(admin.TabularInline):
+    """Occorrenze annullate o spostate (la booking sostitutiva si crea con BookingService.override_occurrence)."""
+    model = RecurrenceException
+    extra = 0
+    raw_id_fields = ('booking',)
+
+
+@admin.register(RecurringBooking)
+class RecurringBookingAdmin(admin.ModelAdmin):
+    """Appuntamenti ricorrenti: le occorrenze non sono righe, si calcolano da RecurrenceService."""
+    form = RecurringBookingForm
+    list_display = ('client_name', 'professional', 'service', 'frequency', 'interval', 'time', 'start_date', 'until')
+    list_select_related = ('professional', 'service')
+    autocomplete_fields = ('professional',)
+    raw_id_fields = ('service',)
+    inlines = [RecurrenceExceptionInline]
+
+
 # Registrazione standard dei modelli business
-# Professional: ogni salone/studio collegato a un utente
-admin.site.register(Professional)
 
-# Booking: tutte le prenotazioni create dai clienti
-admin.site.register(Booking)
+# ArchivedBooking: booking passate spostate dall'archiviazione (`manage.py archive_bookings`)
+admin.site.register(ArchivedBooking)
+
+# BookingDailyStat: rollup giornaliero (mantenuto dai signal, ricostruibile con rebuild_daily_stats)
+admin.site.register(BookingDailyStat)
+
+# BookingTombstone: booking cancellate, annunciate dal feed calendario (pulizia con prune_tombstones)
+admin.site.register(BookingTombstone)
+
+# OutboundEmail: coda delle email in uscita (spedite da `manage.py send_outbox`)
+admin.site.register(OutboundEmail)
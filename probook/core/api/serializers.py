@@ -0,0 +1,56 @@
+from rest_framework import serializers
+
+from core.forms import BookingForm
+from core.models import Booking
+
+
+class BookingSerializer(serializers.ModelSerializer):
+    """
+    Booking "piatta": nessun campo annidato sul Professional, così una lista
+    di N booking si serializza senza query aggiuntive (niente N+1).
+    Il servizio esce per nome (service) e per id del catalogo (service_id):
+    il queryset deve caricarlo con select_related('service').
+    """
+    service = serializers.CharField(source='service.name', read_only=True)
+
+    class Meta:
+        model = Booking
+        fields = ['id', 'date', 'time', 'client_name', 'client_email', 'service', 'service_id', 'notes']
+        read_only_fields = fields
+
+    # Colonne da caricare con only(): esattamente quelle serializzate
+    ONLY_FIELDS = [
+        'id', 'professional_id', 'date', 'time', 'client_name', 'client_email', 'service__name', 'notes',
+    ]
+
+
+class BookingCreateSerializer(serializers.Serializer):
+    """
+    Input della prenotazione pubblica. Le regole restano quelle di BookingForm
+    (stessa validazione del form HTML, data passata compresa): il serializer
+    si limita a farle girare e a riportarne gli errori in formato API.
+    """
+    client_name = serializers.CharField()
+    client_email = serializers.CharField()
+    service = serializers.CharField(help_text="Id del servizio nel catalogo del professionista.")
+    date = serializers.CharField()
+    time = serializers.CharField()
+    notes = serializers.CharField(required=False, allow_blank=True)
+
+    def validate(self, attrs):
+        form = BookingForm(attrs, professional=self.context.get('professional'))
+        if not form.is_valid():
+            raise serializers.ValidationError(
+                {field: list(errors) for field, errors in form.errors.items()}
+            )
+        attrs['form'] = form
+        return attrs
+
+
+class DashboardSerializer(serializers.Serializer):
+    """Card della dashboard + prenotazioni in arrivo (stesso contenuto della pagina HTML)."""
+    total_bookings = serializers.IntegerField()
+    future_count = serializers.IntegerField()
+    today_count = serializers.IntegerField()
+    next_booking = BookingSerializer(allow_null=True)
+    bookings = BookingSerializer(many=True)
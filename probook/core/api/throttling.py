@@ -0,0 +1,24 @@
+from rest_framework.throttling import BaseThrottle
+
+from core.services.throttle_service import ThrottleService
+from core.throttling import throttle_buckets
+
+
+class TokenBucketThrottle(BaseThrottle):
+    """
+    Gli stessi token bucket del decoratore core.throttling.throttle per le
+    APIView: DRF controlla i throttle in initial(), prima di leggere il body
+    e di chiamare il metodo della view. Per un endpoint senza professional_id
+    nell'URL basta una sottoclasse con scopes = ('ip',).
+    """
+    scopes = ('ip', 'professional')
+    methods = ('POST',)
+
+    def allow_request(self, request, view):
+        self.retry_after = 0
+        if ThrottleService.enabled() and request.method in self.methods:
+            self.retry_after = ThrottleService.check(throttle_buckets(request, view.kwargs, self.scopes))
+        return not self.retry_after
+
+    def wait(self):
+        return self.retry_after
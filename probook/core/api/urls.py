@@ -0,0 +1,41 @@
+from functools import cache
+
+from django.urls import path
+from django.utils.module_loading import import_string
+from django.views.decorators.csrf import csrf_exempt
+
+
+@cache
+def _resolve_view(dotted_path):
+    return import_string(dotted_path).as_view()
+
+
+def lazy_view(dotted_path):
+    """
+    View di classe importata alla prima richiesta invece che al caricamento
+    degli URL. Le APIView leggono le classi di autenticazione alla definizione,
+    quindi importarle carica DRF e simplejwt (che a sua volta importa
+    django.test): con le view pigre il costo lo paga la prima chiamata API,
+    non l'avvio del worker, `manage.py check` o le pagine HTML.
+    csrf_exempt come ogni APIView di DRF.
+    """
+    @csrf_exempt
+    def view(request, *args, **kwargs):
+        return _resolve_view(dotted_path)(request, *args, **kwargs)
+    return view
+
+
+# API v1: montate sotto /api/v1/ in probook/urls.py
+urlpatterns = [
+    # JWT: login e rinnovo del token
+    path('token/', lazy_view('rest_framework_simplejwt.views.TokenObtainPairView'), name='api_token'),
+    path('token/refresh/', lazy_view('rest_framework_simplejwt.views.TokenRefreshView'), name='api_token_refresh'),
+
+    # Area professionista (JWT)
+    path('bookings/', lazy_view('core.api.views.BookingListAPIView'), name='api_bookings'),
+    path('dashboard/', lazy_view('core.api.views.DashboardAPIView'), name='api_dashboard'),
+    path('stats/trend/', lazy_view('core.api.views.TrendAPIView'), name='api_trend'),
+
+    # Prenotazione pubblica
+    path('professionals/<int:professional_id>/bookings/', lazy_view('core.api.views.PublicBookingAPIView'), name='api_public_booking'),
+]
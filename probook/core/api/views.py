@@ -0,0 +1,156 @@
+from datetime import date, timedelta
+
+from django.shortcuts import get_object_or_404
+from rest_framework import status
+from rest_framework.exceptions import PermissionDenied, ValidationError
+from rest_framework.permissions import AllowAny, IsAuthenticated
+from rest_framework.response import Response
+from rest_framework.views import APIView
+
+from core.api.serializers import BookingCreateSerializer, BookingSerializer, DashboardSerializer
+from core.api.throttling import TokenBucketThrottle
+from core.models import Professional
+from core.services.booking_service import BookingService, SlotTakenError
+from core.services.cache_service import ProfessionalCache
+from core.services.catalog_service import ServiceCatalogService
+from core.services.history_service import HistoryService
+from core.services.page_cache_service import PageCacheService
+from core.services.professional_service import ProfessionalService
+from core.services.stats_service import BookingStatsService
+
+
+class ProfessionalAPIView(APIView):
+    """
+    Base per le API del professionista autenticato (JWT).
+    Gestisce il GET condizionale: l'ETag deriva dalla versione in cache del
+    professionista (bumpata ad ogni modifica delle sue booking), quindi una
+    lista invariata risponde 304 senza toccare le tabelle delle booking.
+    Validatori e If-None-Match passano da PageCacheService, come per le pagine.
+    """
+    permission_classes = [IsAuthenticated]
+
+    def get_professional(self):
+        try:
+            return Professional.objects.get(user=self.request.user)
+        except Professional.DoesNotExist:
+            raise PermissionDenied("L'utente non ha un profilo Professional.")
+
+    def make_etag(self, professional, *extra):
+        return PageCacheService.etag(ProfessionalCache.version(professional.id), self.request.get_full_path(), *extra)
+
+    def get_etag(self, professional):
+        return self.make_etag(professional)
+
+    def get(self, request, *args, **kwargs):
+        professional = self.get_professional()
+        etag = self.get_etag(professional)
+        response = PageCacheService.not_modified(request, etag) or Response(self.get_data(professional))
+        # Il contenuto dipende dall'utente: niente cache condivise (proxy)
+        return PageCacheService.set_validators(response, etag, private=True)
+
+    def get_data(self, professional):
+        raise NotImplementedError
+
+
+class BookingListAPIView(ProfessionalAPIView):
+    """
+    GET /api/v1/bookings/ – storico/lista delle booking del professionista,
+    dalla più recente, con paginazione keyset (?cursor=...).
+    Filtri opzionali (HistoryService.query): date_from, date_to (YYYY-MM-DD),
+    service (id o nome), client (inizio di nome o email), q (parole nelle note).
+    """
+
+    def get_data(self, professional):
+        params = self.request.query_params
+        try:
+            date_from = date.fromisoformat(params['date_from']) if params.get('date_from') else None
+            date_to = date.fromisoformat(params['date_to']) if params.get('date_to') else None
+        except ValueError:
+            raise ValidationError({'date': "Usa il formato YYYY-MM-DD."})
+        query = (
+            HistoryService.query(professional)
+            .dates(date_from, date_to).service(params.get('service'))
+            .client(params.get('client')).notes(params.get('q'))
+        )
+
+        # Stessi filtri su booking e archivio: paginate fonde le due pagine
+        bookings = [source.only(*BookingSerializer.ONLY_FIELDS) for source in query.sources()]
+        page = HistoryService.paginate(bookings, cursor=params.get('cursor'))
+        return {
+            'results': BookingSerializer(page['bookings'], many=True).data,
+            'next_cursor': page['next_cursor'],
+        }
+
+
+class DashboardAPIView(ProfessionalAPIView):
+    """GET /api/v1/dashboard/ – le stesse statistiche della dashboard HTML."""
+
+    def get_etag(self, professional):
+        # Le card dipendono dalla data, la "prossima prenotazione" anche dall'ora:
+        # entrambe entrano nell'ETag (le stats arrivano dalla cache, quindi costa poco)
+        self.stats = ProfessionalService.get_cached_dashboard_stats(professional)
+        next_booking = self.stats['next_booking']
+        return self.make_etag(
+            professional, date.today().isoformat(), next_booking.id if next_booking else '',
+        )
+
+    def get_data(self, professional):
+        return DashboardSerializer(self.stats).data
+
+
+class TrendAPIView(ProfessionalAPIView):
+    """
+    GET /api/v1/stats/trend/ – prenotazioni per giorno (e per servizio con ?by=service)
+    e totali/ricavi per servizio nel periodo, letti dal rollup BookingDailyStat:
+    il costo dipende dai giorni, non dalle booking.
+    Parametri: start (YYYY-MM-DD, default: days giorni fa), days (default 30).
+    """
+
+    def get_data(self, professional):
+        params = self.request.query_params
+        try:
+            days = int(params.get('days', BookingStatsService.DEFAULT_TREND_DAYS))
+        except ValueError:
+            raise ValidationError({'detail': "Parametri start/days non validi."})
+        if not 1 <= days <= BookingStatsService.MAX_TREND_DAYS:
+            raise ValidationError({'days': f"Deve essere tra 1 e {BookingStatsService.MAX_TREND_DAYS}."})
+        try:
+            start = (
+                date.fromisoformat(params['start']) if params.get('start')
+                else date.today() - timedelta(days=days - 1)
+            )
+            # Un periodo che finisce oltre date.max è un parametro non valido, non un 500
+            end = start + timedelta(days=days - 1)
+        except (ValueError, OverflowError):
+            raise ValidationError({'detail': "Parametri start/days non validi."})
+        return {
+            'start': start,
+            'end': end,
+            'days': BookingStatsService.trend(
+                professional, start, days, by_service=params.get('by') == 'service',
+            ),
+            'services': ServiceCatalogService.revenue(professional, start, end),
+        }
+
+
+class PublicBookingAPIView(APIView):
+    """
+    POST /api/v1/professionals/<id>/bookings/ – prenotazione pubblica (senza login),
+    stesso flusso del form HTML: BookingForm + BookingService.
+    """
+    authentication_classes = []
+    permission_classes = [AllowAny]
+    throttle_classes = [TokenBucketThrottle]
+
+    def post(self, request, professional_id):
+        professional = get_object_or_404(Professional, id=professional_id)
+        serializer = BookingCreateSerializer(data=request.data, context={'professional': professional})
+        serializer.is_valid(raise_exception=True)
+        try:
+            booking = BookingService.create_booking(professional_id, serializer.validated_data['form'])
+        except SlotTakenError:
+            return Response(
+                {'time': ["Questo orario è già stato prenotato. Scegli un altro orario."]},
+                status=status.HTTP_409_CONFLICT,
+            )
+        return Response(BookingSerializer(booking).data, status=status.HTTP_201_CREATED)
@@ -12,6 +12,10 @@ class CoreConfig(AppConfig):
     - modello Professional (salone/studio)
     - modello Booking (prenotazioni)
     e tutte le relative viste/forms/template.
+    In ready() registro i signal (invalidazione cache ecc.).
     """
     default_auto_field = 'django.db.models.BigAutoField'
     name = 'core'
+
+    def ready(self):
+        from . import signals  # noqa: F401
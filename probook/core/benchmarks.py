@@ -0,0 +1,401 @@
+"""
+Benchmark dei percorsi principali di ProBook (usato da `manage.py benchmark`).
+
+- seed(): genera N professionisti e M prenotazioni con bulk_create
+- run_scenarios(): misura latenza (p50/p95/p99) e numero di query per
+  public_booking (POST), dashboard, storico e pagina di conferma,
+  passando dal client di test di Django (middleware e template compresi),
+  e per la ricerca nella directory (DirectoryService.search a cache vuota)
+- run_concurrency(): throughput (richieste/s) dei percorsi pubblici con N client
+  concorrenti, via WSGI (un thread per client) e via ASGI (coroutine su un solo event loop)
+- compare(): confronta i risultati con una baseline JSON e con SCENARIO_BUDGET_MS
+  e ritorna le regressioni.
+- run_startup() / compare_startup(): avvio a freddo (import dell'applicazione
+  WSGI/ASGI con -X importtime e `manage.py check`) in processi nuovi, contro
+  un budget fisso e una baseline (usati da `manage.py benchmark_startup`).
+"""
+import asyncio
+import os
+import statistics
+import subprocess
+import sys
+import tempfile
+import threading
+import time as clock
+from datetime import date, time, timedelta
+
+from asgiref.sync import sync_to_async
+
+from django.conf import settings
+from django.contrib.auth.hashers import make_password
+from django.core.cache import cache
+from django.db import connection, connections
+from django.test import AsyncClient, Client
+from django.test.utils import CaptureQueriesContext
+from django.urls import reverse
+
+from core.models import Booking, Professional, Service, User
+from core.services.directory_service import DirectoryService
+from core.services.stats_service import BookingStatsService
+
+# Prenotazioni per giorno generate dal seed (slot orari dalle 8 in poi)
+SLOTS_PER_DAY = 10
+# Giorni di prenotazioni future per ogni professionista (il resto è storico)
+FUTURE_DAYS = 30
+BENCH_PASSWORD = 'bench-password'
+
+# Ricerche misurate nella directory: un nome (prefisso, pochi risultati) e un
+# servizio offerto da tutti i professionisti generati (conteggio sull'intero indice)
+DIRECTORY_QUERIES = {
+    'directory_search_name': 'salone bench42',
+    'directory_search_service': 'taglio',
+}
+# Budget del p95 per scenario (ms), verificato anche senza baseline. L'obiettivo
+# della directory è 10 ms a 100k professionisti (`benchmark --professionals 100000`)
+SCENARIO_BUDGET_MS = {
+    'directory_search_name': 10.0,
+    'directory_search_service': 10.0,
+}
+
+# Moduli importati da un worker a freddo, per metrica di avvio
+STARTUP_TARGETS = {
+    'wsgi_import': 'probook.wsgi',
+    'asgi_import': 'probook.asgi',
+}
+# Budget dell'avvio (mediana in ms, settings di produzione): superarlo è una regressione
+# anche senza baseline. Va abbassato quando un'ottimizzazione lo consente, mai alzato alla leggera.
+STARTUP_BUDGET_MS = {
+    'wsgi_import': 700.0,
+    'asgi_import': 700.0,
+    'check': 1500.0,
+}
+
+
+def seed(professionals, bookings, batch_size=5000, stdout=None):
+    """
+    Crea `professionals` professionisti e distribuisce tra loro `bookings`
+    prenotazioni (slot tutti distinti, dal passato fino a FUTURE_DAYS giorni nel futuro).
+    Ritorna il Professional "principale" su cui girano i benchmark.
+    """
+    password = make_password(BENCH_PASSWORD)  # un solo hash per tutti gli utenti
+    users = User.objects.bulk_create([
+        User(username=f'bench{i}', password=password, is_professional=True)
+        for i in range(professionals)
+    ], batch_size=batch_size)
+    pros = Professional.objects.bulk_create([
+        Professional(user=user, business_name=f'Salone {user.username}', services='Taglio, Barba')
+        for user in users
+    ], batch_size=batch_size)
+    # bulk_create non emette signal: indice della directory e catalogo dei servizi li creo qui
+    DirectoryService.rebuild_index()
+    Service.objects.bulk_create([
+        Service(professional=pro, name=name, duration_minutes=60, price=price)
+        for pro in pros for name, price in (('Barba', 15), ('Taglio', 25))
+    ], batch_size=batch_size)
+    catalog = {
+        (service.professional_id, service.name): service
+        for service in Service.objects.filter(professional__in=pros)
+    }
+
+    per_professional = max(bookings // professionals, 1)
+    # Lo storico termina FUTURE_DAYS giorni dopo oggi: ci sono sia passate che future
+    days = per_professional // SLOTS_PER_DAY + 1
+    start = date.today() + timedelta(days=FUTURE_DAYS - days)
+
+    created = 0
+    batch = []
+    for pro in pros:
+        for k in range(per_professional):
+            if created >= bookings:
+                break
+            batch.append(Booking(
+                professional=pro,
+                client_name=f'Cliente {k}',
+                client_email=f'cliente{k}@example.com',
+                date=start + timedelta(days=k // SLOTS_PER_DAY),
+                time=time(8 + k % SLOTS_PER_DAY),
+                service=catalog[(pro.id, 'Taglio' if k % 2 else 'Barba')],
+            ))
+            created += 1
+            if len(batch) >= batch_size:
+                Booking.objects.bulk_create(batch)
+                batch = []
+                if stdout:
+                    stdout.write(f"  {created} prenotazioni create")
+    if batch:
+        Booking.objects.bulk_create(batch)
+    # bulk_create non emette signal: il rollup giornaliero va ricostruito
+    BookingStatsService.rebuild()
+    return pros[0]
+
+
+def _measure(iterations, request, clear_cache):
+    """Esegue `request()` più volte e raccoglie tempi (ms) e query dell'ultima esecuzione."""
+    timings = []
+    queries = 0
+    for i in range(iterations):
+        if clear_cache:
+            cache.clear()
+        with CaptureQueriesContext(connection) as ctx:
+            started = clock.perf_counter()
+            response = request(i)
+            timings.append((clock.perf_counter() - started) * 1000)
+        # Gli scenari di servizio (directory) non passano da una risposta HTTP
+        if getattr(response, 'status_code', 200) >= 400:
+            raise RuntimeError(f"Risposta inattesa {response.status_code}")
+        queries = len(ctx.captured_queries)
+
+    percentiles = statistics.quantiles(timings, n=100) if len(timings) > 1 else timings * 99
+    return {
+        'iterations': iterations,
+        'mean_ms': round(statistics.fmean(timings), 3),
+        'p50_ms': round(percentiles[49], 3),
+        'p95_ms': round(percentiles[94], 3),
+        'p99_ms': round(percentiles[98], 3),
+        'queries': queries,
+    }
+
+
+def run_scenarios(professional, iterations=50, clear_cache=True):
+    """Misura i quattro percorsi principali; ritorna {scenario: metriche}."""
+    public = Client()
+    logged = Client()
+    logged.force_login(professional.user)
+
+    booking_url = reverse('public_booking', args=[professional.id])
+    service = professional.catalog.get(name='Taglio')
+    # Slot liberi per le POST: un giorno lontano nel futuro per ogni iterazione
+    future = date.today() + timedelta(days=3650)
+
+    def post_booking(i):
+        response = public.post(booking_url, {
+            'client_name': 'Bench', 'client_email': 'bench@example.com', 'service': service.id,
+            'date': (future + timedelta(days=i)).isoformat(), 'time': '10:00',
+        })
+        if response.status_code != 302:
+            raise RuntimeError("La prenotazione di benchmark non è stata creata")
+        return response
+
+    existing = Booking.objects.filter(professional=professional).only('id').first()
+    success_url = reverse('booking_success', args=[existing.id])
+    dashboard_url = reverse('professional_dashboard', args=[professional.id])
+    history_url = reverse('booking_history')
+
+    results = {
+        'public_booking_post': _measure(iterations, post_booking, clear_cache),
+        'professional_dashboard': _measure(iterations, lambda i: logged.get(dashboard_url), clear_cache),
+        'booking_history': _measure(iterations, lambda i: logged.get(history_url), clear_cache),
+        'booking_success': _measure(iterations, lambda i: public.get(success_url), clear_cache),
+    }
+    for name, query in DIRECTORY_QUERIES.items():
+        results[name] = _measure(iterations, lambda i, query=query: DirectoryService.search(query), clear_cache)
+    # Tolgo le prenotazioni create dalle POST, così un run successivo (--keepdb) parte uguale
+    Booking.objects.filter(professional=professional, date__gte=future).delete()
+    return results
+
+
+def _concurrency_urls(professional):
+    """Percorsi pubblici usati nel test di concorrenza (form, disponibilità, conferma)."""
+    existing = Booking.objects.filter(professional=professional).only('id').first()
+    return [
+        reverse('public_booking', args=[professional.id]),
+        reverse('professional_availability', args=[professional.id]),
+        reverse('booking_success', args=[existing.id]),
+    ]
+
+
+def _throughput(mode, concurrency, requests, seconds, errors):
+    return {
+        'mode': mode,
+        'concurrency': concurrency,
+        'requests': requests,
+        'errors': errors,
+        'seconds': round(seconds, 3),
+        'requests_per_second': round(requests / seconds, 1) if seconds else 0.0,
+    }
+
+
+def _run_wsgi(urls, concurrency, per_client):
+    """Un thread (e una connessione al DB) per client, come un server WSGI a thread."""
+    errors = []
+
+    def worker():
+        client = Client()
+        try:
+            for i in range(per_client):
+                if client.get(urls[i % len(urls)]).status_code >= 400:
+                    errors.append(1)
+        finally:
+            connections.close_all()
+
+    threads = [threading.Thread(target=worker) for _ in range(concurrency)]
+    started = clock.perf_counter()
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    return clock.perf_counter() - started, len(errors)
+
+
+async def _run_asgi(urls, concurrency, per_client):
+    """Tutti i client come coroutine sullo stesso event loop, come un worker ASGI."""
+    errors = 0
+
+    async def worker():
+        nonlocal errors
+        client = AsyncClient()
+        for i in range(per_client):
+            if (await client.get(urls[i % len(urls)])).status_code >= 400:
+                errors += 1
+
+    started = clock.perf_counter()
+    await asyncio.gather(*(worker() for _ in range(concurrency)))
+    elapsed = clock.perf_counter() - started
+    await sync_to_async(connections.close_all)()
+    return elapsed, errors
+
+
+def run_concurrency(professional, concurrency=50, requests=500, clear_cache=True):
+    """
+    Stesso carico (`requests` GET divise tra `concurrency` client) servito
+    dall'handler WSGI e da quello ASGI; ritorna {modalità: throughput}.
+    """
+    urls = _concurrency_urls(professional)
+    per_client = max(requests // concurrency, 1)
+    total = per_client * concurrency
+
+    results = {}
+    for mode in ('wsgi', 'asgi'):
+        if clear_cache:
+            cache.clear()
+        if mode == 'wsgi':
+            seconds, errors = _run_wsgi(urls, concurrency, per_client)
+        else:
+            seconds, errors = asyncio.run(_run_asgi(urls, concurrency, per_client))
+        results[mode] = _throughput(mode, concurrency, total, seconds, errors)
+    return results
+
+
+def compare(results, baseline, threshold, budget=None):
+    """
+    Confronta i risultati con la baseline e con il budget (default SCENARIO_BUDGET_MS).
+    È una regressione un p95 oltre il budget, oltre baseline * (1 + threshold) oppure
+    un numero di query maggiore. Ritorna la lista dei messaggi di regressione.
+    """
+    budget = SCENARIO_BUDGET_MS if budget is None else budget
+    regressions = []
+    for name, current in results['scenarios'].items():
+        if name in budget and current['p95_ms'] > budget[name]:
+            regressions.append(
+                f"{name}: p95 {current['p95_ms']:.1f} ms oltre il budget di {budget[name]:.1f} ms"
+            )
+        previous = (baseline or {}).get('scenarios', {}).get(name)
+        if not previous:
+            continue
+        limit = previous['p95_ms'] * (1 + threshold)
+        if current['p95_ms'] > limit:
+            regressions.append(
+                f"{name}: p95 {current['p95_ms']:.1f} ms > {limit:.1f} ms "
+                f"(baseline {previous['p95_ms']:.1f} ms)"
+            )
+        if current['queries'] > previous['queries']:
+            regressions.append(
+                f"{name}: {current['queries']} query (baseline {previous['queries']})"
+            )
+    return regressions
+
+
+# --- avvio a freddo -----------------------------------------------------------
+
+def parse_importtime(stderr, module, top=10):
+    """
+    Output di `python -X importtime -c "import <module>"` -> tempo totale (ms,
+    il cumulativo di `module`), numero di moduli importati e i `top` moduli
+    più lenti per tempo proprio.
+    """
+    rows = []
+    for line in stderr.splitlines():
+        if not line.startswith('import time:') or 'self [us]' in line:
+            continue
+        self_us, cumulative_us, name = line[len('import time:'):].split('|')
+        rows.append((int(self_us), int(cumulative_us), name.strip()))
+    if not rows:
+        raise RuntimeError("Output di -X importtime vuoto.")
+    cumulative = next((row[1] for row in rows if row[2] == module), None)
+    if cumulative is None:
+        raise RuntimeError(f"{module} non compare nell'output di -X importtime.")
+    slowest = sorted(rows, reverse=True)[:top]
+    return {
+        'import_ms': round(cumulative / 1000, 3),
+        'modules': len(rows),
+        'slowest': [{'module': name, 'self_ms': round(self_us / 1000, 3)} for self_us, _, name in slowest],
+    }
+
+
+def _run_process(args, env):
+    """Esegue un processo Python nuovo dalla cartella del progetto; ritorna (ms, stderr)."""
+    started = clock.perf_counter()
+    process = subprocess.run(args, env=env, cwd=settings.BASE_DIR, capture_output=True, text=True)
+    elapsed = (clock.perf_counter() - started) * 1000
+    if process.returncode:
+        raise RuntimeError(f"{' '.join(args)} è fallito:\n{process.stderr[-2000:]}")
+    return elapsed, process.stderr
+
+
+def run_startup(settings_module, runs=5):
+    """
+    Avvio a freddo con `settings_module`, ogni misura in un processo nuovo:
+    import di probook.wsgi / probook.asgi (django.setup() compreso) e
+    `manage.py check` (che carica anche gli URL). Ritorna {metrica: mediana e campioni}.
+    """
+    env = {**os.environ, 'DJANGO_SETTINGS_MODULE': settings_module}
+    # Le settings di produzione la richiedono; per misurare l'avvio basta un valore qualsiasi
+    env.setdefault('PROBOOK_SECRET_KEY', 'benchmark-startup')
+    # ...e una cache condivisa (non locmem): la cache su file non richiede servizi esterni
+    if 'PROBOOK_CACHE_BACKEND' not in env:
+        env['PROBOOK_CACHE_BACKEND'] = 'django.core.cache.backends.filebased.FileBasedCache'
+        env['PROBOOK_CACHE_LOCATION'] = os.path.join(tempfile.gettempdir(), 'probook-benchmark-cache')
+
+    results = {}
+    for metric, module in STARTUP_TARGETS.items():
+        samples = []
+        for _ in range(runs):
+            _, stderr = _run_process([sys.executable, '-X', 'importtime', '-c', f'import {module}'], env)
+            imports = parse_importtime(stderr, module)
+            samples.append(imports['import_ms'])
+        results[metric] = {
+            'median_ms': round(statistics.median(samples), 3),
+            'samples_ms': samples,
+            'modules': imports['modules'],
+            'slowest': imports['slowest'],
+        }
+
+    samples = [
+        round(_run_process([sys.executable, 'manage.py', 'check'], env)[0], 3)
+        for _ in range(runs)
+    ]
+    results['check'] = {'median_ms': round(statistics.median(samples), 3), 'samples_ms': samples}
+    return results
+
+
+def compare_startup(results, baseline=None, threshold=0.2, budget=None):
+    """
+    Regressioni dell'avvio: mediana oltre il budget (default STARTUP_BUDGET_MS)
+    oppure oltre baseline * (1 + threshold). Ritorna la lista dei messaggi.
+    """
+    budget = STARTUP_BUDGET_MS if budget is None else budget
+    regressions = []
+    for name, current in results['startup'].items():
+        if name in budget and current['median_ms'] > budget[name]:
+            regressions.append(
+                f"{name}: {current['median_ms']:.1f} ms oltre il budget di {budget[name]:.1f} ms"
+            )
+        previous = (baseline or {}).get('startup', {}).get(name)
+        if previous:
+            limit = previous['median_ms'] * (1 + threshold)
+            if current['median_ms'] > limit:
+                regressions.append(
+                    f"{name}: {current['median_ms']:.1f} ms > {limit:.1f} ms "
+                    f"(baseline {previous['median_ms']:.1f} ms)"
+                )
+    return regressions
@@ -1,6 +1,6 @@
 from datetime import date
 from django import forms
-from .models import Booking
+from .models import Booking, Service
 
 
 class BookingForm(forms.ModelForm):
@@ -21,6 +21,17 @@ class BookingForm(forms.ModelForm):
             'notes': forms.Textarea(attrs={'rows': 3}),
         }
 
+    def __init__(self, *args, professional=None, **kwargs):
+        """
+        Il servizio si sceglie dal catalogo del professionista (solo voci attive):
+        senza professional la scelta è vuota e il form non può essere valido.
+        """
+        super().__init__(*args, **kwargs)
+        self.fields['service'].queryset = (
+            professional.catalog.filter(is_active=True) if professional else Service.objects.none()
+        )
+        self.fields['service'].empty_label = "Scegli un servizio"
+
     def clean_date(self):
         """
         Validazione personalizzata sul campo 'date'.
@@ -33,3 +44,42 @@ class BookingForm(forms.ModelForm):
                 "Non puoi prenotare in una data passata. Scegli una data da oggi in poi."
             )
         return d
+
+
+class HistoryFilterForm(forms.Form):
+    """
+    Filtri (in GET) della pagina storico, tutti facoltativi: i valori validi
+    si compongono sul query builder di HistoryService con apply_to.
+    """
+    client = forms.CharField(
+        required=False, max_length=100, label="Cliente",
+        widget=forms.TextInput(attrs={'placeholder': "Inizio di nome o email"}),
+    )
+    service = forms.ModelChoiceField(queryset=Service.objects.none(), required=False, label="Servizio")
+    date_from = forms.DateField(required=False, label="Dal", widget=forms.DateInput(attrs={'type': 'date'}))
+    date_to = forms.DateField(required=False, label="Al", widget=forms.DateInput(attrs={'type': 'date'}))
+    q = forms.CharField(
+        required=False, max_length=200, label="Note",
+        widget=forms.TextInput(attrs={'placeholder': "Parole nelle note"}),
+    )
+
+    def __init__(self, *args, professional=None, **kwargs):
+        """Tutto il catalogo del professionista, anche i servizi disattivati (restano nello storico)."""
+        super().__init__(*args, **kwargs)
+        self.fields['service'].queryset = professional.catalog.all() if professional else Service.objects.none()
+        self.fields['service'].empty_label = "Tutti i servizi"
+
+    def clean(self):
+        cleaned_data = super().clean()
+        date_from, date_to = cleaned_data.get('date_from'), cleaned_data.get('date_to')
+        if date_from and date_to and date_from > date_to:
+            self.add_error('date_to', "La data finale deve seguire quella iniziale.")
+        return cleaned_data
+
+    def apply_to(self, query):
+        """Aggiunge alla HistoryQuery i filtri compilati (il form deve essere valido)."""
+        data = self.cleaned_data
+        return (
+            query.client(data['client']).service(data['service'])
+            .dates(data['date_from'], data['date_to']).notes(data['q'])
+        )
@@ -0,0 +1,161 @@
+"""
+Strumentazione per richiesta (usata da core.middleware.RequestProfilingMiddleware).
+
+Il profilo della richiesta corrente vive in una ContextVar: span(), le query SQL
+e il rendering dei template vi registrano i propri tempi solo se un profilo è
+attivo. install() aggancia template e service layer una sola volta, e solo
+quando la profilazione è abilitata: da disabilitata non c'è alcun overhead.
+"""
+import functools
+import inspect
+import time
+from collections import Counter, defaultdict
+from contextlib import contextmanager
+from contextvars import ContextVar
+
+from django.utils.module_loading import import_string
+
+_current_profile = ContextVar('probook_profile', default=None)
+
+# Classi del service layer i cui metodi pubblici vengono cronometrati
+SERVICE_CLASSES = [
+    'core.services.archive_service.ArchiveService',
+    'core.services.availability_service.AvailabilityService',
+    'core.services.booking_service.BookingService',
+    'core.services.bulk_service.BulkBookingService',
+    'core.services.calendar_service.CalendarService',
+    'core.services.catalog_service.ServiceCatalogService',
+    'core.services.directory_service.DirectoryService',
+    'core.services.email_service.EmailOutboxService',
+    'core.services.history_service.HistoryService',
+    'core.services.notification_service.NotificationService',
+    'core.services.page_cache_service.PageCacheService',
+    'core.services.professional_service.ProfessionalService',
+    'core.services.recurrence_service.RecurrenceService',
+    'core.services.stats_service.BookingStatsService',
+    'core.services.throttle_service.ThrottleService',
+]
+
+_installed = False
+
+
+class RequestProfile:
+    """Tempi raccolti durante una singola richiesta."""
+
+    def __init__(self):
+        self.started = time.perf_counter()
+        self.sql_time = 0.0
+        self.sql_count = 0
+        self.sql_statements = Counter()  # SQL (senza parametri) -> volte eseguita
+        self.template_time = 0.0
+        self.spans = defaultdict(float)  # nome span -> secondi totali
+
+    def record_query(self, sql, duration):
+        self.sql_time += duration
+        self.sql_count += 1
+        self.sql_statements[sql] += 1
+
+    def duplicates(self, threshold):
+        """Query identiche ripetute almeno `threshold` volte (tipico sintomo di N+1)."""
+        return {sql: count for sql, count in self.sql_statements.items() if count >= threshold}
+
+    @property
+    def total_time(self):
+        return time.perf_counter() - self.started
+
+
+def start_profile():
+    profile = RequestProfile()
+    return profile, _current_profile.set(profile)
+
+
+def stop_profile(token):
+    _current_profile.reset(token)
+
+
+@contextmanager
+def span(name):
+    """Cronometra un blocco nel profilo della richiesta corrente (no-op se non c'è)."""
+    profile = _current_profile.get()
+    if profile is None:
+        yield
+        return
+    started = time.perf_counter()
+    try:
+        yield
+    finally:
+        profile.spans[name] += time.perf_counter() - started
+
+
+def sql_wrapper(execute, sql, params, many, context):
+    """execute_wrapper di Django: misura ogni query del profilo corrente."""
+    profile = _current_profile.get()
+    if profile is None:
+        return execute(sql, params, many, context)
+    started = time.perf_counter()
+    try:
+        return execute(sql, params, many, context)
+    finally:
+        profile.record_query(sql, time.perf_counter() - started)
+
+
+def _timed(name, func):
+    if inspect.isgeneratorfunction(func):
+        # Il lavoro avviene mentre la risposta viene consumata (streaming), fuori dallo span
+        return func
+    if inspect.iscoroutinefunction(func):
+        @functools.wraps(func)
+        async def async_wrapper(*args, **kwargs):
+            with span(name):
+                return await func(*args, **kwargs)
+        return async_wrapper
+
+    @functools.wraps(func)
+    def wrapper(*args, **kwargs):
+        with span(name):
+            return func(*args, **kwargs)
+    return wrapper
+
+
+def instrument_class(cls):
+    """Avvolge in uno span i metodi pubblici (static/class/istanza) di una classe."""
+    for attr, value in list(vars(cls).items()):
+        if attr.startswith('_'):
+            continue
+        name = f'svc.{cls.__name__}.{attr}'
+        if isinstance(value, staticmethod):
+            setattr(cls, attr, staticmethod(_timed(name, value.__func__)))
+        elif isinstance(value, classmethod):
+            setattr(cls, attr, classmethod(_timed(name, value.__func__)))
+        elif inspect.isfunction(value):
+            setattr(cls, attr, _timed(name, value))
+
+
+def _instrument_templates():
+    from django.template.backends.django import Template
+
+    original_render = Template.render
+
+    @functools.wraps(original_render)
+    def render(self, *args, **kwargs):
+        profile = _current_profile.get()
+        if profile is None:
+            return original_render(self, *args, **kwargs)
+        started = time.perf_counter()
+        try:
+            return original_render(self, *args, **kwargs)
+        finally:
+            profile.template_time += time.perf_counter() - started
+
+    Template.render = render
+
+
+def install():
+    """Aggancia template e service layer (idempotente)."""
+    global _installed
+    if _installed:
+        return
+    _instrument_templates()
+    for path in SERVICE_CLASSES:
+        instrument_class(import_string(path))
+    _installed = True
@@ -0,0 +1,25 @@
+from django.core.management.base import BaseCommand, CommandError
+
+from core.services.archive_service import ArchiveService
+
+
+class Command(BaseCommand):
+    help = (
+        "Sposta in ArchivedBooking le prenotazioni più vecchie dell'orizzonte, a blocchi "
+        "(da cron, una volta al giorno): lo storico continua a mostrarle."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--days', type=int, default=ArchiveService.HORIZON_DAYS,
+            help="Archivia le prenotazioni più vecchie di questi giorni.",
+        )
+        parser.add_argument('--batch-size', type=int, default=ArchiveService.BATCH_SIZE)
+        parser.add_argument('--professional', type=int, help="Solo le prenotazioni di questo Professional.")
+
+    def handle(self, *args, days, batch_size, professional, **options):
+        if days < 0:
+            raise CommandError("--days non può essere negativo: archivierebbe prenotazioni future.")
+        cutoff = ArchiveService.cutoff(days)
+        archived = ArchiveService.archive_before(cutoff, batch_size=batch_size, professional=professional)
+        self.stdout.write(self.style.SUCCESS(f"Archiviate {archived} prenotazioni precedenti al {cutoff}."))
@@ -0,0 +1,104 @@
+import json
+import platform
+from datetime import datetime, timezone
+
+import django
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connection
+from django.test.utils import setup_test_environment, teardown_test_environment
+
+from core import benchmarks
+from core.models import Professional
+
+
+class Command(BaseCommand):
+    help = (
+        "Benchmark di public_booking, dashboard, storico, conferma e ricerca nella directory "
+        "su un database di test generato al volo; salva i risultati in JSON e li confronta "
+        "con il budget e con una baseline."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--professionals', type=int, default=10)
+        parser.add_argument('--bookings', type=int, default=10_000, help="Prenotazioni totali (fino a 1M).")
+        parser.add_argument('--iterations', type=int, default=50, help="Richieste misurate per scenario.")
+        parser.add_argument('--warm-cache', action='store_true', help="Non svuota la cache tra una richiesta e l'altra.")
+        parser.add_argument('--output', default='bench_results.json', help="File JSON dei risultati.")
+        parser.add_argument('--baseline', help="JSON di un run precedente con cui confrontarsi.")
+        parser.add_argument('--threshold', type=float, default=0.2, help="Peggioramento tollerato sul p95 (0.2 = +20%%).")
+        parser.add_argument(
+            '--concurrency', type=int, default=0,
+            help="Client concorrenti per il confronto di throughput WSGI/ASGI (0 = non eseguito).",
+        )
+        parser.add_argument('--concurrent-requests', type=int, default=500, help="Richieste totali per modalità.")
+        parser.add_argument('--keepdb', action='store_true', help="Riusa il database di test (e i dati generati).")
+
+    def handle(self, *args, **options):
+        # Come `manage.py test`: mai toccare il database reale
+        setup_test_environment()
+        old_name = connection.settings_dict['NAME']
+        connection.creation.create_test_db(verbosity=0, keepdb=options['keepdb'])
+        try:
+            results = self.run(options)
+        finally:
+            connection.creation.destroy_test_db(old_name, verbosity=0, keepdb=options['keepdb'])
+            teardown_test_environment()
+
+        with open(options['output'], 'w') as f:
+            json.dump(results, f, indent=2)
+        self.stdout.write(f"Risultati salvati in {options['output']}")
+
+        for name, metrics in results['scenarios'].items():
+            self.stdout.write(
+                f"{name:24} p50 {metrics['p50_ms']:8.2f} ms  p95 {metrics['p95_ms']:8.2f} ms  "
+                f"p99 {metrics['p99_ms']:8.2f} ms  query {metrics['queries']}"
+            )
+
+        for mode, metrics in results.get('concurrency', {}).items():
+            self.stdout.write(
+                f"{mode.upper():24} {metrics['requests_per_second']:8.1f} req/s  "
+                f"({metrics['requests']} richieste, {metrics['concurrency']} client, "
+                f"{metrics['errors']} errori)"
+            )
+
+        baseline = None
+        if options['baseline']:
+            with open(options['baseline']) as f:
+                baseline = json.load(f)
+        # Il budget (SCENARIO_BUDGET_MS) vale anche senza baseline
+        regressions = benchmarks.compare(results, baseline, options['threshold'])
+        if regressions:
+            raise CommandError("Regressioni rispetto a budget e baseline:\n" + '\n'.join(regressions))
+        self.stdout.write(self.style.SUCCESS("Nessuna regressione rispetto a budget e baseline."))
+
+    def run(self, options):
+        professional = Professional.objects.order_by('id').first()
+        if professional is None:
+            self.stdout.write(
+                f"Genero {options['professionals']} professionisti e {options['bookings']} prenotazioni..."
+            )
+            professional = benchmarks.seed(
+                options['professionals'], options['bookings'], stdout=self.stdout,
+            )
+
+        scenarios = benchmarks.run_scenarios(
+            professional, iterations=options['iterations'], clear_cache=not options['warm_cache'],
+        )
+        results = {
+            'meta': {
+                'timestamp': datetime.now(timezone.utc).isoformat(),
+                'professionals': options['professionals'],
+                'bookings': options['bookings'],
+                'warm_cache': options['warm_cache'],
+                'python': platform.python_version(),
+                'django': django.get_version(),
+                'database': connection.vendor,
+            },
+            'scenarios': scenarios,
+        }
+        if options['concurrency']:
+            results['concurrency'] = benchmarks.run_concurrency(
+                professional, concurrency=options['concurrency'],
+                requests=options['concurrent_requests'], clear_cache=not options['warm_cache'],
+            )
+        return results
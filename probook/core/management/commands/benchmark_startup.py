@@ -0,0 +1,65 @@
+import json
+import platform
+from datetime import datetime, timezone
+
+import django
+from django.core.management.base import BaseCommand, CommandError
+
+from core import benchmarks
+
+
+class Command(BaseCommand):
+    help = (
+        "Misura l'avvio a freddo di un worker (import dell'applicazione WSGI/ASGI con "
+        "-X importtime e `manage.py check`) e fallisce se supera il budget o la baseline."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--settings-module', default='probook.settings_production',
+            help="Settings con cui avviare i processi misurati.",
+        )
+        parser.add_argument('--runs', type=int, default=5, help="Processi per misura (si usa la mediana).")
+        parser.add_argument('--output', default='startup_results.json', help="File JSON dei risultati.")
+        parser.add_argument('--baseline', help="JSON di un run precedente con cui confrontarsi.")
+        parser.add_argument('--threshold', type=float, default=0.2, help="Peggioramento tollerato (0.2 = +20%%).")
+        parser.add_argument('--no-budget', action='store_true', help="Confronta solo con la baseline.")
+
+    def handle(self, *args, **options):
+        try:
+            startup = benchmarks.run_startup(options['settings_module'], runs=options['runs'])
+        except RuntimeError as exc:
+            raise CommandError(str(exc))
+        results = {
+            'meta': {
+                'timestamp': datetime.now(timezone.utc).isoformat(),
+                'settings': options['settings_module'],
+                'runs': options['runs'],
+                'python': platform.python_version(),
+                'django': django.get_version(),
+            },
+            'startup': startup,
+        }
+
+        with open(options['output'], 'w') as f:
+            json.dump(results, f, indent=2)
+        self.stdout.write(f"Risultati salvati in {options['output']}")
+
+        for name, metrics in startup.items():
+            line = f"{name:16} mediana {metrics['median_ms']:8.1f} ms"
+            if 'modules' in metrics:
+                line += f"  ({metrics['modules']} moduli)"
+            self.stdout.write(line)
+            for module in metrics.get('slowest', [])[:5]:
+                self.stdout.write(f"{'':18}{module['self_ms']:8.1f} ms  {module['module']}")
+
+        baseline = None
+        if options['baseline']:
+            with open(options['baseline']) as f:
+                baseline = json.load(f)
+        regressions = benchmarks.compare_startup(
+            results, baseline, options['threshold'], budget={} if options['no_budget'] else None,
+        )
+        if regressions:
+            raise CommandError("Regressioni dell'avvio:\n" + '\n'.join(regressions))
+        self.stdout.write(self.style.SUCCESS("Avvio entro il budget."))
@@ -0,0 +1,30 @@
+from django.core.management.base import BaseCommand
+
+from core.models import Booking
+from core.services.bulk_service import BulkBookingService
+
+
+class Command(BaseCommand):
+    help = "Esporta le prenotazioni in CSV o JSONL (stesso formato letto da import_bookings)."
+
+    def add_arguments(self, parser):
+        parser.add_argument('path', nargs='?', default='-', help="File di destinazione (default stdout).")
+        parser.add_argument('--professional', type=int, help="Solo le prenotazioni di questo Professional.")
+        parser.add_argument('--format', choices=BulkBookingService.FORMATS, help="Default: dedotto dall'estensione.")
+        parser.add_argument('--chunk-size', type=int, default=BulkBookingService.BATCH_SIZE)
+
+    def handle(self, *args, path, professional, format, chunk_size, **options):
+        queryset = Booking.objects.all()
+        if professional:
+            queryset = queryset.filter(professional_id=professional)
+
+        fmt = BulkBookingService.detect_format(path, format)
+        stream = self.stdout if path == '-' else open(path, 'w', newline='', encoding='utf-8')
+        try:
+            count = BulkBookingService.export_rows(queryset, stream, fmt, chunk_size=chunk_size)
+        finally:
+            if stream is not self.stdout:
+                stream.close()
+
+        if path != '-':
+            self.stdout.write(self.style.SUCCESS(f"Esportate {count} prenotazioni in {path}."))
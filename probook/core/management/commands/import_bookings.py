@@ -0,0 +1,53 @@
+import sys
+
+from django.core.management.base import BaseCommand, CommandError
+
+from core.models import Professional
+from core.services.bulk_service import BulkBookingService
+
+
+class Command(BaseCommand):
+    help = "Importa prenotazioni storiche da CSV o JSONL a blocchi, senza email né signal per riga."
+
+    def add_arguments(self, parser):
+        parser.add_argument('path', help="File da importare ('-' per leggere da stdin).")
+        parser.add_argument('--professional', type=int, required=True, help="ID del Professional.")
+        parser.add_argument('--format', choices=BulkBookingService.FORMATS, help="Default: dedotto dall'estensione.")
+        parser.add_argument('--batch-size', type=int, default=BulkBookingService.BATCH_SIZE)
+        parser.add_argument('--max-errors', type=int, default=20, help="Errori di validazione mostrati al massimo.")
+
+    def handle(self, *args, path, professional, format, batch_size, max_errors, **options):
+        try:
+            professional = Professional.objects.get(id=professional)
+        except Professional.DoesNotExist:
+            raise CommandError(f"Professional {professional} inesistente.")
+
+        fmt = BulkBookingService.detect_format(path, format)
+        shown_errors = 0
+
+        def on_error(line_number, exc):
+            nonlocal shown_errors
+            if shown_errors < max_errors:
+                self.stderr.write(f"Riga {line_number}: {'; '.join(exc.messages)}")
+            shown_errors += 1
+
+        def on_batch(stats):
+            rate = stats['read'] / stats['seconds'] if stats['seconds'] else 0
+            self.stdout.write(f"{stats['read']} righe lette ({rate:.0f} righe/s)")
+
+        stream = sys.stdin if path == '-' else open(path, newline='', encoding='utf-8')
+        try:
+            rows = BulkBookingService.read_rows(stream, fmt)
+            stats = BulkBookingService.import_rows(
+                professional, rows, batch_size=batch_size, on_error=on_error, on_batch=on_batch,
+            )
+        finally:
+            if stream is not sys.stdin:
+                stream.close()
+
+        rate = stats['read'] / stats['seconds'] if stats['seconds'] else 0
+        self.stdout.write(self.style.SUCCESS(
+            f"Import completato: {stats['imported']} importate, {stats['skipped']} su slot già occupati, "
+            f"{stats['invalid']} non valide su {stats['read']} righe in {stats['seconds']:.1f}s "
+            f"({rate:.0f} righe/s)."
+        ))
@@ -0,0 +1,15 @@
+from django.core.management.base import BaseCommand
+
+from core.services.calendar_service import CalendarService
+
+
+class Command(BaseCommand):
+    help = (
+        "Cancella i tombstone delle booking più vecchi della finestra di sync del feed "
+        "calendario (da cron, una volta al giorno): i client con un sync token più vecchio "
+        "ricevono comunque il feed completo."
+    )
+
+    def handle(self, *args, **options):
+        deleted = CalendarService.prune_tombstones()
+        self.stdout.write(self.style.SUCCESS(f"Tombstone cancellati: {deleted}."))
@@ -0,0 +1,29 @@
+from django.core.management.base import BaseCommand, CommandError
+
+from core.models import Professional
+from core.services.cache_service import ProfessionalCache
+from core.services.stats_service import BookingStatsService
+
+
+class Command(BaseCommand):
+    help = (
+        "Ricalcola da zero il rollup giornaliero BookingDailyStat dalle prenotazioni "
+        "(dopo import massivi, update su queryset o per correggere derive)."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--professional', type=int, help="Solo questo Professional (default: tutti).")
+
+    def handle(self, *args, professional, **options):
+        target = None
+        if professional:
+            try:
+                target = Professional.objects.get(id=professional)
+            except Professional.DoesNotExist:
+                raise CommandError(f"Professional {professional} inesistente.")
+
+        rows = BookingStatsService.rebuild(target)
+        # Le dashboard in cache leggono i contatori dal rollup
+        for pid in ([target.id] if target else Professional.objects.values_list('id', flat=True)):
+            ProfessionalCache.bump(pid)
+        self.stdout.write(self.style.SUCCESS(f"Rollup ricostruito: {rows} righe giorno/servizio."))
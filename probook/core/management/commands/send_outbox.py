@@ -0,0 +1,42 @@
+import time
+
+from django.core.management.base import BaseCommand
+
+from core.services.email_service import EmailOutboxService
+
+
+class Command(BaseCommand):
+    help = "Spedisce le email in coda nell'outbox, in batch su una sola connessione SMTP."
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--batch-size', type=int, default=EmailOutboxService.BATCH_SIZE,
+            help="Email spedite per ogni batch.",
+        )
+        parser.add_argument(
+            '--loop', action='store_true',
+            help="Resta in esecuzione anche a coda vuota (modalità worker).",
+        )
+        parser.add_argument(
+            '--interval', type=float, default=5.0,
+            help="Secondi di attesa quando la coda è vuota (solo con --loop).",
+        )
+
+    def handle(self, *args, batch_size, loop, interval, **options):
+        while True:
+            try:
+                sent, failed = EmailOutboxService.send_pending(batch_size=batch_size)
+            except Exception as exc:
+                # Es. database non raggiungibile: in modalità worker riprovo dopo l'attesa
+                if not loop:
+                    raise
+                self.stderr.write(f"Errore durante l'invio: {exc}")
+                sent, failed = 0, 0
+            if sent or failed:
+                self.stdout.write(f"Inviate: {sent}, fallite: {failed}")
+
+            # Coda svuotata o SMTP in errore: esco, oppure aspetto in modalità worker
+            if EmailOutboxService.queue_drained(sent, failed, batch_size):
+                if not loop:
+                    break
+                time.sleep(interval)
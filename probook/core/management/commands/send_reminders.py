@@ -0,0 +1,44 @@
+from datetime import date
+
+from django.core.management.base import BaseCommand, CommandError
+
+from core.services.notification_service import NotificationService
+
+
+class Command(BaseCommand):
+    help = (
+        "Accoda (e spedisce) i promemoria per gli appuntamenti di domani: una query "
+        "indicizzata, rendering a blocchi e ledger che impedisce i doppi invii."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--date', help="Giorno degli appuntamenti (YYYY-MM-DD, default domani).")
+        parser.add_argument(
+            '--batch-size', type=int, default=NotificationService.BATCH_SIZE,
+            help="Booking renderizzate e accodate per transazione.",
+        )
+        parser.add_argument(
+            '--no-send', action='store_true',
+            help="Accoda soltanto: la spedizione resta al worker send_outbox.",
+        )
+
+    def handle(self, *args, batch_size, no_send, **options):
+        try:
+            day = date.fromisoformat(options['date']) if options['date'] else None
+        except ValueError:
+            raise CommandError("--date deve essere nel formato YYYY-MM-DD.")
+
+        stats = NotificationService.schedule_reminders(
+            day=day, batch_size=batch_size, send=not no_send,
+            on_batch=lambda s: self.stdout.write(f"  {s['queued']} promemoria accodati"),
+        )
+        self.stdout.write(
+            f"Promemoria per il {stats['date']}: {stats['queued']} accodati, "
+            f"{stats['skipped']} già gestiti da un'altra esecuzione "
+            f"({stats['queued_per_second']} msg/s)."
+        )
+        if not no_send:
+            self.stdout.write(
+                f"Inviati: {stats['sent']}, falliti: {stats['failed']} "
+                f"({stats['sent_per_second']} msg/s)."
+            )
@@ -0,0 +1,94 @@
+import json
+import logging
+import random
+import threading
+from contextlib import ExitStack
+
+from django.conf import settings
+from django.core.exceptions import MiddlewareNotUsed
+from django.db import connections
+
+from core import instrumentation
+
+logger = logging.getLogger('probook.profiling')
+
+
+class RequestProfilingMiddleware:
+    """
+    Profilazione per richiesta: numero e tempo delle query SQL, query duplicate
+    (N+1), tempo di rendering dei template e span del service layer.
+
+    Configurazione in settings.PROBOOK_PROFILING:
+    - ENABLED: se False il middleware si toglie dallo stack (MiddlewareNotUsed)
+    - SAMPLE_RATE: frazione di richieste profilate (0.0 - 1.0)
+    - DUPLICATE_THRESHOLD: ripetizioni oltre cui una query è segnalata come duplicata
+    - LOG_FILE: file JSONL opzionale, una riga per richiesta profilata
+
+    I risultati vanno nell'header Server-Timing (visibile nei devtools del browser),
+    nel logger 'probook.profiling' e, se configurato, nel file JSONL.
+    """
+    _log_lock = threading.Lock()
+
+    def __init__(self, get_response):
+        config = getattr(settings, 'PROBOOK_PROFILING', {})
+        if not config.get('ENABLED'):
+            raise MiddlewareNotUsed
+        self.get_response = get_response
+        self.sample_rate = config.get('SAMPLE_RATE', 1.0)
+        self.duplicate_threshold = config.get('DUPLICATE_THRESHOLD', 3)
+        self.log_file = config.get('LOG_FILE')
+        instrumentation.install()
+
+    def __call__(self, request):
+        if self.sample_rate < 1.0 and random.random() >= self.sample_rate:
+            return self.get_response(request)
+
+        profile, token = instrumentation.start_profile()
+        try:
+            with ExitStack() as stack:
+                for connection in connections.all():
+                    stack.enter_context(connection.execute_wrapper(instrumentation.sql_wrapper))
+                response = self.get_response(request)
+        finally:
+            instrumentation.stop_profile(token)
+
+        self.report(request, response, profile)
+        return response
+
+    def report(self, request, response, profile):
+        total_ms = profile.total_time * 1000
+        sql_ms = profile.sql_time * 1000
+        template_ms = profile.template_time * 1000
+        duplicates = profile.duplicates(self.duplicate_threshold)
+
+        timings = [
+            f'total;dur={total_ms:.1f}',
+            f'sql;dur={sql_ms:.1f};desc="SQL ({profile.sql_count} query)"',
+            f'tpl;dur={template_ms:.1f};desc="Template"',
+        ]
+        timings += [f'{name};dur={seconds * 1000:.1f}' for name, seconds in profile.spans.items()]
+        if duplicates:
+            timings.append(f'dupq;desc="{sum(duplicates.values())} query duplicate"')
+        response['Server-Timing'] = ', '.join(timings)
+
+        record = {
+            'method': request.method,
+            'path': request.path,
+            'view': getattr(request.resolver_match, 'view_name', None),
+            'status': response.status_code,
+            'total_ms': round(total_ms, 2),
+            'sql_ms': round(sql_ms, 2),
+            'sql_count': profile.sql_count,
+            'template_ms': round(template_ms, 2),
+            'spans_ms': {name: round(seconds * 1000, 2) for name, seconds in profile.spans.items()},
+            'duplicate_queries': [{'sql': sql, 'count': count} for sql, count in duplicates.items()],
+        }
+        if duplicates:
+            logger.warning("Query duplicate (possibile N+1) in %s", request.path, extra={'profile': record})
+        else:
+            logger.debug("Richiesta profilata %s", request.path, extra={'profile': record})
+
+        if self.log_file:
+            line = json.dumps(record) + '\n'
+            with self._log_lock, open(self.log_file, 'a', encoding='utf-8') as f:
+                f.write(line)
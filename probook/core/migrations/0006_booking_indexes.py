@@ -0,0 +1,33 @@
+# Generated by Django 5.2.18 on 2026-10-18 17:02
+
+import django.db.models.deletion
+from django.conf import settings
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('core', '0005_booking'),
+    ]
+
+    operations = [
+        migrations.AlterField(
+            model_name='professional',
+            name='services',
+            field=models.TextField(blank=True, help_text="Descrizione libera dei servizi offerti (es. 'Taglio, Barba, Colore')."),
+        ),
+        migrations.AlterField(
+            model_name='professional',
+            name='user',
+            field=models.OneToOneField(on_delete=django.db.models.deletion.CASCADE, related_name='professional', to=settings.AUTH_USER_MODEL),
+        ),
+        migrations.AddIndex(
+            model_name='booking',
+            index=models.Index(fields=['professional', 'date', 'time'], name='booking_prof_date_time_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='booking',
+            index=models.Index(fields=['professional', '-date', '-time', '-id'], name='booking_prof_history_idx'),
+        ),
+    ]
@@ -0,0 +1,54 @@
+# Generated by Django 5.2.18 on 2026-10-18 17:04
+
+import logging
+
+from django.db import migrations, models
+from django.db.models import Count, Min
+
+logger = logging.getLogger('probook.migrations')
+
+BATCH_SIZE = 1000
+
+
+def remove_duplicate_slots(apps, schema_editor):
+    """
+    Prima del vincolo univoco: per ogni slot (professionista, data, ora)
+    prenotato più volte tiene la booking più vecchia (id minore, cioè la
+    prima arrivata) e cancella le altre a blocchi di BATCH_SIZE, registrando
+    nel log gli id cancellati.
+    """
+    Booking = apps.get_model('core', 'Booking')
+    groups = (
+        Booking.objects.values('professional_id', 'date', 'time')
+        .annotate(count=Count('id'), keep=Min('id')).filter(count__gt=1).order_by()
+    )
+    duplicates = []
+    for group in groups.iterator():
+        duplicates.extend(
+            Booking.objects.filter(
+                professional_id=group['professional_id'], date=group['date'], time=group['time'],
+            ).exclude(pk=group['keep']).values_list('id', flat=True)
+        )
+    for start in range(0, len(duplicates), BATCH_SIZE):
+        batch = duplicates[start:start + BATCH_SIZE]
+        Booking.objects.filter(pk__in=batch).delete()
+        logger.warning("Slot duplicati: cancellate le booking %s", ', '.join(map(str, batch)))
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('core', '0007_outboundemail'),
+    ]
+
+    operations = [
+        migrations.RunPython(remove_duplicate_slots, migrations.RunPython.noop),
+        migrations.AddConstraint(
+            model_name='booking',
+            constraint=models.UniqueConstraint(fields=('professional', 'date', 'time'), name='booking_unique_slot'),
+        ),
+        migrations.RemoveIndex(
+            model_name='booking',
+            name='booking_prof_date_time_idx',
+        ),
+    ]
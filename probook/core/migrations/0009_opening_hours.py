@@ -0,0 +1,33 @@
+# Generated by Django 5.2.18 on 2026-10-18 17:06
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('core', '0008_booking_unique_slot'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='professional',
+            name='slot_minutes',
+            field=models.PositiveSmallIntegerField(default=30, help_text='Durata di uno slot prenotabile, in minuti.'),
+        ),
+        migrations.CreateModel(
+            name='OpeningHours',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('weekday', models.PositiveSmallIntegerField(choices=[(0, 'Lunedì'), (1, 'Martedì'), (2, 'Mercoledì'), (3, 'Giovedì'), (4, 'Venerdì'), (5, 'Sabato'), (6, 'Domenica')])),
+                ('opens_at', models.TimeField()),
+                ('closes_at', models.TimeField()),
+                ('professional', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='opening_hours', to='core.professional')),
+            ],
+            options={
+                'verbose_name_plural': 'opening hours',
+                'ordering': ['weekday', 'opens_at'],
+            },
+        ),
+    ]
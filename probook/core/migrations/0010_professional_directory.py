@@ -0,0 +1,48 @@
+# Generated by Django 5.2.18 on 2026-10-18 17:12
+
+from django.db import migrations, models, OperationalError
+
+
+FTS_TABLE = 'core_professional_fts'
+
+
+def create_fts_index(apps, schema_editor):
+    """
+    Solo su SQLite: crea la tabella FTS5 della directory e la popola con i
+    Professional esistenti. Se FTS5 non è compilato in SQLite la ricerca
+    ripiega su icontains (vedi DirectoryService).
+    """
+    if schema_editor.connection.vendor != 'sqlite':
+        return
+    try:
+        schema_editor.execute(
+            f"CREATE VIRTUAL TABLE {FTS_TABLE} USING fts5("
+            f"business_name, services, tokenize = 'unicode61 remove_diacritics 2')"
+        )
+    except OperationalError:
+        return
+    schema_editor.execute(
+        f"INSERT INTO {FTS_TABLE} (rowid, business_name, services) "
+        f"SELECT id, business_name, services FROM core_professional"
+    )
+
+
+def drop_fts_index(apps, schema_editor):
+    if schema_editor.connection.vendor == 'sqlite':
+        schema_editor.execute(f"DROP TABLE IF EXISTS {FTS_TABLE}")
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('core', '0009_opening_hours'),
+    ]
+
+    operations = [
+        migrations.AlterField(
+            model_name='professional',
+            name='business_name',
+            field=models.CharField(db_index=True, max_length=200),
+        ),
+        migrations.RunPython(create_fts_index, drop_fts_index),
+    ]
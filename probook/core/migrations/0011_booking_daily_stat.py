@@ -0,0 +1,42 @@
+# Generated by Django 5.2.18 on 2026-10-18 17:25
+
+import django.db.models.deletion
+from django.db import migrations, models
+from django.db.models import Count
+
+
+def populate_daily_stats(apps, schema_editor):
+    """Rollup iniziale delle booking esistenti (una GROUP BY, inserita a blocchi)."""
+    Booking = apps.get_model('core', 'Booking')
+    BookingDailyStat = apps.get_model('core', 'BookingDailyStat')
+    rows = (
+        Booking.objects.values('professional_id', 'date', 'service')
+        .annotate(count=Count('id')).order_by().iterator()
+    )
+    BookingDailyStat.objects.bulk_create(
+        (BookingDailyStat(**row) for row in rows), batch_size=1000,
+    )
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('core', '0010_professional_directory'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='BookingDailyStat',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('date', models.DateField()),
+                ('service', models.CharField(max_length=100)),
+                ('count', models.PositiveIntegerField(default=0)),
+                ('professional', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='daily_stats', to='core.professional')),
+            ],
+            options={
+                'constraints': [models.UniqueConstraint(fields=('professional', 'date', 'service'), name='daily_stat_unique_day_service')],
+            },
+        ),
+        migrations.RunPython(populate_daily_stats, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,51 @@
+import django.db.models.deletion
+import django.db.models.functions.text
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+    """
+    Catalogo dei servizi, passo 1 di 3: nuova tabella e FK provvisoria (nullable)
+    sulle booking. Dati (0013) e schema finale (0014) stanno in migrazioni separate:
+    su PostgreSQL un ALTER TABLE dopo gli UPDATE sulla FK, nella stessa
+    transazione, fallirebbe per i trigger dei vincoli ancora in sospeso.
+    """
+
+    dependencies = [
+        ('core', '0011_booking_daily_stat'),
+    ]
+
+    operations = [
+        migrations.AlterField(
+            model_name='professional',
+            name='services',
+            field=models.TextField(blank=True, help_text="Descrizione libera dei servizi offerti (es. 'Taglio, Barba, Colore'). I nomi mancanti vengono aggiunti al catalogo dei servizi."),
+        ),
+        migrations.CreateModel(
+            name='Service',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('name', models.CharField(max_length=100)),
+                ('duration_minutes', models.PositiveSmallIntegerField(blank=True, help_text='Durata del servizio in minuti (vuoto = durata dello slot del professionista).', null=True)),
+                ('price', models.DecimalField(blank=True, decimal_places=2, max_digits=8, null=True)),
+                ('is_active', models.BooleanField(default=True, help_text='I servizi non attivi restano nello storico ma non sono più prenotabili.')),
+                ('professional', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='catalog', to='core.professional')),
+            ],
+            options={
+                'ordering': ['name'],
+                'constraints': [models.UniqueConstraint(models.F('professional'), django.db.models.functions.text.Lower('name'), name='service_unique_name')],
+            },
+        ),
+        # Default solo per poter tornare indietro: 0014 rimuove la colonna e,
+        # all'indietro, la ricrea vuota prima che 0013 ne ripristini i valori
+        migrations.AlterField(
+            model_name='booking',
+            name='service',
+            field=models.CharField(default='', max_length=100),
+        ),
+        migrations.AddField(
+            model_name='booking',
+            name='service_ref',
+            field=models.ForeignKey(null=True, on_delete=django.db.models.deletion.PROTECT, related_name='+', to='core.service'),
+        ),
+    ]
@@ -0,0 +1,84 @@
+from django.db import migrations
+
+# Coppie (professionista, stringa) elaborate per blocco
+BATCH_SIZE = 500
+
+
+def normalize(name):
+    """Spazi superflui via; le varianti di maiuscole/minuscole confluiscono nella stessa chiave."""
+    name = ' '.join(name.split()) or 'Altro'
+    return name[:100], name[:100].casefold()
+
+
+def build_catalog(apps, schema_editor):
+    """
+    Deduplica i servizi scritti a mano: le descrizioni dei Professional
+    ("Taglio, Barba") e le stringhe di Booking.service diventano voci di catalogo
+    (una per nome normalizzato), poi ogni booking punta alla voce corrispondente.
+    Si lavora a blocchi di coppie distinte (professionista, stringa): un
+    bulk_create per le voci nuove e un UPDATE per stringa, mai riga per riga.
+    """
+    Booking = apps.get_model('core', 'Booking')
+    Professional = apps.get_model('core', 'Professional')
+    Service = apps.get_model('core', 'Service')
+
+    catalog = {}  # (professional_id, chiave normalizzata) -> id del Service
+
+    def ensure(pairs):
+        missing = {}
+        for professional_id, raw in pairs:
+            name, key = normalize(raw)
+            if (professional_id, key) not in catalog:
+                missing.setdefault((professional_id, key), name)
+        if missing:
+            Service.objects.bulk_create([
+                Service(professional_id=professional_id, name=name)
+                for (professional_id, _), name in missing.items()
+            ])
+            ids = {pid for pid, _ in missing}
+            for service_id, professional_id, name in Service.objects.filter(
+                professional_id__in=ids,
+            ).values_list('id', 'professional_id', 'name'):
+                catalog[(professional_id, normalize(name)[1])] = service_id
+
+    descriptions = []
+    for professional_id, services in Professional.objects.values_list('id', 'services').iterator():
+        descriptions.extend((professional_id, part) for part in services.split(',') if part.strip())
+    for start in range(0, len(descriptions), BATCH_SIZE):
+        ensure(descriptions[start:start + BATCH_SIZE])
+
+    distinct = Booking.objects.values_list('professional_id', 'service').distinct().order_by()
+    batch = []
+    for pair in distinct.iterator():
+        batch.append(pair)
+        if len(batch) >= BATCH_SIZE:
+            link_bookings(Booking, catalog, batch, ensure)
+            batch = []
+    if batch:
+        link_bookings(Booking, catalog, batch, ensure)
+
+
+def link_bookings(Booking, catalog, pairs, ensure):
+    ensure(pairs)
+    for professional_id, raw in pairs:
+        Booking.objects.filter(professional_id=professional_id, service=raw).update(
+            service_ref_id=catalog[(professional_id, normalize(raw)[1])],
+        )
+
+
+def restore_strings(apps, schema_editor):
+    Booking = apps.get_model('core', 'Booking')
+    Service = apps.get_model('core', 'Service')
+    for service_id, name in Service.objects.values_list('id', 'name').iterator():
+        Booking.objects.filter(service_ref_id=service_id).update(service=name)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('core', '0012_service_catalog'),
+    ]
+
+    operations = [
+        migrations.RunPython(build_catalog, restore_strings),
+    ]
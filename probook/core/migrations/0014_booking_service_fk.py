@@ -0,0 +1,59 @@
+import django.db.models.deletion
+from django.db import migrations, models
+from django.db.models import Count
+
+
+def clear_daily_stats(apps, schema_editor):
+    # Il rollup cambia chiave (stringa -> FK): viene svuotato e ricalcolato in fondo
+    apps.get_model('core', 'BookingDailyStat').objects.all().delete()
+
+
+def populate_daily_stats(apps, schema_editor):
+    Booking = apps.get_model('core', 'Booking')
+    BookingDailyStat = apps.get_model('core', 'BookingDailyStat')
+    rows = (
+        Booking.objects.values('professional_id', 'date', 'service_id')
+        .annotate(count=Count('id')).order_by().iterator()
+    )
+    BookingDailyStat.objects.bulk_create(
+        (BookingDailyStat(**row) for row in rows), batch_size=1000,
+    )
+
+
+class Migration(migrations.Migration):
+    """Catalogo dei servizi, passo 3 di 3: Booking.service e il rollup diventano FK."""
+
+    dependencies = [
+        ('core', '0013_service_catalog_data'),
+    ]
+
+    operations = [
+        # Booking: la stringa lascia il posto alla FK popolata in 0013
+        migrations.RemoveField(model_name='booking', name='service'),
+        migrations.RenameField(model_name='booking', old_name='service_ref', new_name='service'),
+        migrations.AlterField(
+            model_name='booking',
+            name='service',
+            field=models.ForeignKey(on_delete=django.db.models.deletion.PROTECT, related_name='bookings', to='core.service'),
+        ),
+
+        # Rollup giornaliero: stessa chiave, ma sull'id del servizio
+        migrations.RunPython(clear_daily_stats, migrations.RunPython.noop),
+        migrations.RemoveConstraint(model_name='bookingdailystat', name='daily_stat_unique_day_service'),
+        migrations.RemoveField(model_name='bookingdailystat', name='service'),
+        migrations.AddField(
+            model_name='bookingdailystat',
+            name='service',
+            field=models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='daily_stats', to='core.service'),
+            preserve_default=False,
+        ),
+        migrations.AddConstraint(
+            model_name='bookingdailystat',
+            constraint=models.UniqueConstraint(fields=('professional', 'date', 'service'), name='daily_stat_unique_day_service'),
+        ),
+        migrations.AddIndex(
+            model_name='bookingdailystat',
+            index=models.Index(fields=['service', 'date'], name='daily_stat_service_date_idx'),
+        ),
+        migrations.RunPython(populate_daily_stats, clear_daily_stats),
+    ]
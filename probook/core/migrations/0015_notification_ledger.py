@@ -0,0 +1,40 @@
+# Generated by Django 5.2.18 on 2026-10-18 17:33
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('core', '0014_booking_service_fk'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='NotificationLedger',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('kind', models.CharField(choices=[('reminder', 'Promemoria appuntamento')], max_length=30)),
+                ('run_id', models.UUIDField()),
+                ('created_at', models.DateTimeField(auto_now_add=True)),
+            ],
+        ),
+        migrations.AddIndex(
+            model_name='booking',
+            index=models.Index(fields=['date', 'time'], name='booking_date_idx'),
+        ),
+        migrations.AddField(
+            model_name='notificationledger',
+            name='booking',
+            field=models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='notifications', to='core.booking'),
+        ),
+        migrations.AddIndex(
+            model_name='notificationledger',
+            index=models.Index(fields=['run_id'], name='notification_run_idx'),
+        ),
+        migrations.AddConstraint(
+            model_name='notificationledger',
+            constraint=models.UniqueConstraint(fields=('booking', 'kind'), name='notification_once'),
+        ),
+    ]
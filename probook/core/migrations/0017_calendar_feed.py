@@ -0,0 +1,62 @@
+import secrets
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+import core.models
+
+
+def populate_calendar_tokens(apps, schema_editor):
+    """Un token diverso per ogni professionista esistente (il default vale una volta sola per colonna)."""
+    Professional = apps.get_model('core', 'Professional')
+    professionals = list(Professional.objects.only('id'))
+    for professional in professionals:
+        professional.calendar_token = secrets.token_urlsafe(32)
+    Professional.objects.bulk_update(professionals, ['calendar_token'], batch_size=500)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('core', '0016_updated_at'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='professional',
+            name='calendar_token',
+            field=models.CharField(editable=False, max_length=64, null=True),
+        ),
+        migrations.RunPython(populate_calendar_tokens, migrations.RunPython.noop),
+        migrations.AlterField(
+            model_name='professional',
+            name='calendar_token',
+            field=models.CharField(default=core.models.new_calendar_token, editable=False, max_length=64, unique=True),
+        ),
+        migrations.AddIndex(
+            model_name='booking',
+            index=models.Index(fields=['professional', 'updated_at'], name='booking_prof_updated_idx'),
+        ),
+        migrations.AlterField(
+            model_name='booking',
+            name='service',
+            field=models.ForeignKey(on_delete=django.db.models.deletion.RESTRICT, related_name='bookings', to='core.service'),
+        ),
+        migrations.CreateModel(
+            name='BookingTombstone',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('booking_id', models.BigIntegerField()),
+                ('date', models.DateField()),
+                ('time', models.TimeField()),
+                ('deleted_at', models.DateTimeField(auto_now_add=True)),
+                ('professional', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='booking_tombstones', to='core.professional')),
+            ],
+            options={
+                'indexes': [
+                    models.Index(fields=['professional', 'deleted_at'], name='tombstone_prof_deleted_idx'),
+                    models.Index(fields=['deleted_at'], name='tombstone_deleted_idx'),
+                ],
+            },
+        ),
+    ]
@@ -0,0 +1,32 @@
+# Generated by Django 5.2.18 on 2026-10-18 17:55
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('core', '0017_calendar_feed'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='ArchivedBooking',
+            fields=[
+                ('id', models.BigIntegerField(primary_key=True, serialize=False)),
+                ('client_name', models.CharField(max_length=100)),
+                ('client_email', models.EmailField(max_length=254)),
+                ('date', models.DateField()),
+                ('time', models.TimeField()),
+                ('notes', models.TextField(blank=True)),
+                ('updated_at', models.DateTimeField()),
+                ('archived_at', models.DateTimeField(auto_now_add=True)),
+                ('professional', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='archived_bookings', to='core.professional')),
+                ('service', models.ForeignKey(on_delete=django.db.models.deletion.RESTRICT, related_name='archived_bookings', to='core.service')),
+            ],
+            options={
+                'indexes': [models.Index(fields=['professional', '-date', '-time', '-id'], name='archived_prof_history_idx')],
+            },
+        ),
+    ]
@@ -0,0 +1,51 @@
+# Generated by Django 5.2.18 on 2026-10-18 18:02
+
+import django.core.validators
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('core', '0018_archived_booking'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='RecurringBooking',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('client_name', models.CharField(max_length=100)),
+                ('client_email', models.EmailField(max_length=254)),
+                ('notes', models.TextField(blank=True)),
+                ('time', models.TimeField()),
+                ('start_date', models.DateField()),
+                ('frequency', models.CharField(choices=[('daily', 'Ogni giorno'), ('weekly', 'Ogni settimana'), ('monthly', 'Ogni mese')], default='weekly', max_length=10)),
+                ('interval', models.PositiveSmallIntegerField(default=1, validators=[django.core.validators.MinValueValidator(1)])),
+                ('count', models.PositiveIntegerField(blank=True, help_text='Numero di occorrenze (vuoto = senza limite).', null=True)),
+                ('until', models.DateField(blank=True, help_text='Ultima data possibile (vuoto = senza limite).', null=True)),
+                ('created_at', models.DateTimeField(auto_now_add=True)),
+                ('professional', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='recurring_bookings', to='core.professional')),
+                ('service', models.ForeignKey(on_delete=django.db.models.deletion.RESTRICT, related_name='recurring_bookings', to='core.service')),
+            ],
+        ),
+        migrations.CreateModel(
+            name='RecurrenceException',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('date', models.DateField()),
+                ('created_at', models.DateTimeField(auto_now_add=True)),
+                ('booking', models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.SET_NULL, related_name='+', to='core.booking')),
+                ('rule', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='exceptions', to='core.recurringbooking')),
+            ],
+        ),
+        migrations.AddIndex(
+            model_name='recurringbooking',
+            index=models.Index(fields=['professional', 'time'], name='recurring_prof_time_idx'),
+        ),
+        migrations.AddConstraint(
+            model_name='recurrenceexception',
+            constraint=models.UniqueConstraint(fields=('rule', 'date'), name='recurrence_exception_once'),
+        ),
+    ]
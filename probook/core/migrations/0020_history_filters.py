@@ -0,0 +1,82 @@
+# Generated by Django 5.2.18 on 2026-10-18 18:07
+
+import django.db.models.functions.text
+from django.db import migrations, models, OperationalError
+
+
+FTS_TABLE = 'core_booking_notes_fts'
+
+# Trigger invece dei signal: l'indice resta allineato anche con bulk_create,
+# update() e il DELETE diretto dell'archiviazione, che i signal non vedono
+TRIGGERS = {
+    'core_booking_notes_fts_ai': (
+        "AFTER INSERT ON core_booking WHEN new.notes <> '' BEGIN "
+        f"INSERT INTO {FTS_TABLE} (rowid, notes) VALUES (new.id, new.notes); END"
+    ),
+    'core_booking_notes_fts_ad': (
+        "AFTER DELETE ON core_booking WHEN old.notes <> '' BEGIN "
+        f"DELETE FROM {FTS_TABLE} WHERE rowid = old.id; END"
+    ),
+    'core_booking_notes_fts_au': (
+        "AFTER UPDATE OF notes ON core_booking BEGIN "
+        f"DELETE FROM {FTS_TABLE} WHERE rowid = old.id; "
+        f"INSERT INTO {FTS_TABLE} (rowid, notes) SELECT new.id, new.notes WHERE new.notes <> ''; END"
+    ),
+}
+
+
+def create_notes_fts(apps, schema_editor):
+    """
+    Solo su SQLite: tabella FTS5 sulle note delle booking (rowid = id della
+    booking), popolata con le righe esistenti e mantenuta dai trigger. Solo le
+    booking con note entrano nell'indice. Senza FTS5 la ricerca ripiega su
+    icontains (vedi HistoryQuery.notes).
+    """
+    if schema_editor.connection.vendor != 'sqlite':
+        return
+    try:
+        schema_editor.execute(
+            f"CREATE VIRTUAL TABLE {FTS_TABLE} USING fts5("
+            f"notes, tokenize = 'unicode61 remove_diacritics 2')"
+        )
+    except OperationalError:
+        return
+    schema_editor.execute(
+        f"INSERT INTO {FTS_TABLE} (rowid, notes) SELECT id, notes FROM core_booking WHERE notes <> ''"
+    )
+    for name, body in TRIGGERS.items():
+        schema_editor.execute(f"CREATE TRIGGER {name} {body}")
+
+
+def drop_notes_fts(apps, schema_editor):
+    if schema_editor.connection.vendor == 'sqlite':
+        for name in TRIGGERS:
+            schema_editor.execute(f"DROP TRIGGER IF EXISTS {name}")
+        schema_editor.execute(f"DROP TABLE IF EXISTS {FTS_TABLE}")
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('core', '0019_recurring_booking'),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='archivedbooking',
+            index=models.Index(models.F('professional'), django.db.models.functions.text.Lower('client_email'), name='archived_prof_email_ci_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='archivedbooking',
+            index=models.Index(models.F('professional'), django.db.models.functions.text.Lower('client_name'), name='archived_prof_name_ci_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='booking',
+            index=models.Index(models.F('professional'), django.db.models.functions.text.Lower('client_email'), name='booking_prof_email_ci_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='booking',
+            index=models.Index(models.F('professional'), django.db.models.functions.text.Lower('client_name'), name='booking_prof_name_ci_idx'),
+        ),
+        migrations.RunPython(create_notes_fts, drop_notes_fts),
+    ]
@@ -0,0 +1,48 @@
+# Generated by Django 5.2.18 on 2026-10-18 18:30
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('core', '0020_history_filters'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='bookingtombstone',
+            name='rule_id',
+            field=models.BigIntegerField(blank=True, null=True),
+        ),
+        migrations.AddField(
+            model_name='notificationledger',
+            name='date',
+            field=models.DateField(blank=True, null=True),
+        ),
+        migrations.AddField(
+            model_name='notificationledger',
+            name='rule',
+            field=models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.CASCADE, related_name='notifications', to='core.recurringbooking'),
+        ),
+        migrations.AddField(
+            model_name='recurringbooking',
+            name='updated_at',
+            field=models.DateTimeField(auto_now=True),
+        ),
+        migrations.AlterField(
+            model_name='bookingtombstone',
+            name='booking_id',
+            field=models.BigIntegerField(blank=True, null=True),
+        ),
+        migrations.AlterField(
+            model_name='notificationledger',
+            name='booking',
+            field=models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.CASCADE, related_name='notifications', to='core.booking'),
+        ),
+        migrations.AddConstraint(
+            model_name='notificationledger',
+            constraint=models.UniqueConstraint(fields=('rule', 'date', 'kind'), name='notification_occurrence_once'),
+        ),
+    ]
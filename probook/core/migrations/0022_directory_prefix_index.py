@@ -0,0 +1,48 @@
+# Generated by Django 5.2.18 on 2026-10-18 21:40
+
+from django.db import migrations
+
+
+FTS_TABLE = 'core_professional_fts'
+
+
+def rebuild_fts_index(schema_editor, options):
+    """Ricrea la tabella FTS5 della directory con le opzioni date e la ripopola (solo SQLite con FTS5)."""
+    connection = schema_editor.connection
+    if connection.vendor != 'sqlite' or FTS_TABLE not in connection.introspection.table_names():
+        return
+    schema_editor.execute(f"DROP TABLE {FTS_TABLE}")
+    schema_editor.execute(
+        f"CREATE VIRTUAL TABLE {FTS_TABLE} USING fts5("
+        f"business_name, services, tokenize = 'unicode61 remove_diacritics 2'{options})"
+    )
+    schema_editor.execute(
+        f"INSERT INTO {FTS_TABLE} (rowid, business_name, services) "
+        f"SELECT id, business_name, services FROM core_professional"
+    )
+    # Un solo b-tree per termine: le ricerche non fondono i segmenti dei singoli INSERT
+    schema_editor.execute(f"INSERT INTO {FTS_TABLE} ({FTS_TABLE}) VALUES ('optimize')")
+
+
+def add_prefix_index(apps, schema_editor):
+    """
+    Indici di prefisso a 2 e 3 caratteri: ogni parola cercata è un prefisso
+    ("barb"*), che senza indice FTS5 risolve scorrendo tutti i termini
+    dell'intervallo.
+    """
+    rebuild_fts_index(schema_editor, ", prefix = '2 3'")
+
+
+def remove_prefix_index(apps, schema_editor):
+    rebuild_fts_index(schema_editor, '')
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('core', '0021_recurring_calendar_reminders'),
+    ]
+
+    operations = [
+        migrations.RunPython(add_prefix_index, remove_prefix_index),
+    ]
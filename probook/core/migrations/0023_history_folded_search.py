@@ -0,0 +1,92 @@
+# Generated by Django 5.2.18 on 2026-10-18 18:43
+
+import importlib
+
+import core.models
+from django.db import migrations, models
+
+BATCH_SIZE = 1000
+
+# Trigger dell'indice FTS5 delle note (migrazione 0020)
+NOTES_FTS = importlib.import_module('core.migrations.0020_history_filters')
+
+
+def restore_notes_fts_triggers(apps, schema_editor):
+    """
+    Su SQLite AddField di una colonna NOT NULL ricrea core_booking (copia e
+    rename) e i trigger della tabella vanno persi: li rimetto, altrimenti
+    l'indice delle note smette di seguire inserimenti e modifiche.
+    """
+    connection = schema_editor.connection
+    if connection.vendor != 'sqlite' or NOTES_FTS.FTS_TABLE not in connection.introspection.table_names():
+        return
+    for name, body in NOTES_FTS.TRIGGERS.items():
+        schema_editor.execute(f"CREATE TRIGGER IF NOT EXISTS {name} {body}")
+
+
+def fill_folded_fields(apps, schema_editor):
+    """Nome e note normalizzati delle righe esistenti, a blocchi di id crescenti."""
+    for model_name in ('Booking', 'ArchivedBooking'):
+        model = apps.get_model('core', model_name)
+        last_id = 0
+        while True:
+            rows = list(
+                model.objects.filter(id__gt=last_id).order_by('id').only('id', 'client_name', 'notes')[:BATCH_SIZE]
+            )
+            if not rows:
+                break
+            for row in rows:
+                row.client_name_folded = core.models.fold(row.client_name)[:100]
+                row.notes_folded = core.models.fold_words(row.notes)
+            model.objects.bulk_update(rows, ['client_name_folded', 'notes_folded'])
+            last_id = rows[-1].id
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('core', '0022_directory_prefix_index'),
+    ]
+
+    operations = [
+        # All'indietro gira per ultima, dopo le RemoveField che ricreano di nuovo la tabella
+        migrations.RunPython(migrations.RunPython.noop, restore_notes_fts_triggers),
+        migrations.RemoveIndex(
+            model_name='archivedbooking',
+            name='archived_prof_name_ci_idx',
+        ),
+        migrations.RemoveIndex(
+            model_name='booking',
+            name='booking_prof_name_ci_idx',
+        ),
+        migrations.AddField(
+            model_name='archivedbooking',
+            name='client_name_folded',
+            field=core.models.FoldedCharField(default='', editable=False, max_length=100, source='client_name'),
+        ),
+        migrations.AddField(
+            model_name='archivedbooking',
+            name='notes_folded',
+            field=core.models.FoldedWordsField(default='', editable=False, source='notes'),
+        ),
+        migrations.AddField(
+            model_name='booking',
+            name='client_name_folded',
+            field=core.models.FoldedCharField(default='', editable=False, max_length=100, source='client_name'),
+        ),
+        migrations.AddField(
+            model_name='booking',
+            name='notes_folded',
+            field=core.models.FoldedWordsField(default='', editable=False, source='notes'),
+        ),
+        migrations.RunPython(restore_notes_fts_triggers, migrations.RunPython.noop),
+        migrations.RunPython(fill_folded_fields, migrations.RunPython.noop),
+        migrations.AddIndex(
+            model_name='archivedbooking',
+            index=models.Index(fields=['professional', 'client_name_folded'], name='archived_prof_name_folded_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='booking',
+            index=models.Index(fields=['professional', 'client_name_folded'], name='booking_prof_name_folded_idx'),
+        ),
+    ]
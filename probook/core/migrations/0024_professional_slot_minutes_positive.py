@@ -0,0 +1,30 @@
+# Generated by Django 5.2.18 on 2026-10-18 18:55
+
+import django.core.validators
+from django.db import migrations, models
+
+
+def reset_zero_slots(apps, schema_editor):
+    """Un profilo con slot da 0 minuti non aveva disponibilità: torna al default prima del vincolo."""
+    Professional = apps.get_model('core', 'Professional')
+    Professional.objects.filter(slot_minutes=0).update(slot_minutes=30)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('core', '0023_history_folded_search'),
+    ]
+
+    operations = [
+        migrations.AlterField(
+            model_name='professional',
+            name='slot_minutes',
+            field=models.PositiveSmallIntegerField(default=30, help_text='Durata di uno slot prenotabile, in minuti.', validators=[django.core.validators.MinValueValidator(1)]),
+        ),
+        migrations.RunPython(reset_zero_slots, migrations.RunPython.noop),
+        migrations.AddConstraint(
+            model_name='professional',
+            constraint=models.CheckConstraint(condition=models.Q(('slot_minutes__gte', 1)), name='professional_slot_minutes_positive'),
+        ),
+    ]
@@ -1,5 +1,13 @@
+import re
+import secrets
+import unicodedata
+
 from django.contrib.auth.models import AbstractUser
+from django.core.exceptions import ValidationError
+from django.core.validators import MinValueValidator
 from django.db import models
+from django.db.models.functions import Lower
+from django.utils import timezone
 
 
 class User(AbstractUser):
@@ -18,6 +26,60 @@ class User(AbstractUser):
         return self.username
 
 
+def new_calendar_token():
+    """Segreto dell'URL del feed calendario (vedi CalendarService)."""
+    return secrets.token_urlsafe(32)
+
+
+def fold(text):
+    """Forma confrontata dalle ricerche: minuscole e senza accenti ("Élodie" -> "elodie")."""
+    decomposed = unicodedata.normalize('NFKD', text)
+    return ''.join(char for char in decomposed if not unicodedata.combining(char)).casefold()
+
+
+def fold_words(text):
+    """
+    Le parole di `text` piegate con fold(), separate e precedute da uno spazio
+    (" porta la tinta"): "inizio di parola" diventa un contains(' ' + parola),
+    lo stesso su ogni database. Parole come nei token FTS5 (unicode61).
+    """
+    return ''.join(f' {word}' for word in re.findall(r'[^\W_]+', fold(text)))
+
+
+class FoldedFieldMixin:
+    """
+    Copia normalizzata del campo `source`, ricalcolata dall'ORM a ogni INSERT e
+    UPDATE, bulk_create compreso (che chiama pre_save su ogni campo). Non va
+    scritta a mano né passata a update().
+    """
+    normalize = staticmethod(fold)
+
+    def __init__(self, *args, source, **kwargs):
+        self.source = source
+        kwargs.setdefault('editable', False)
+        kwargs.setdefault('default', '')
+        super().__init__(*args, **kwargs)
+
+    def deconstruct(self):
+        name, path, args, kwargs = super().deconstruct()
+        kwargs['source'] = self.source
+        return name, path, args, kwargs
+
+    def pre_save(self, model_instance, add):
+        value = self.normalize(getattr(model_instance, self.source))[:self.max_length]
+        setattr(model_instance, self.attname, value)
+        return value
+
+
+class FoldedCharField(FoldedFieldMixin, models.CharField):
+    """fold() del campo `source` (prefissi senza maiuscole né accenti)."""
+
+
+class FoldedWordsField(FoldedFieldMixin, models.TextField):
+    """fold_words() del campo `source` (parole che iniziano con...)."""
+    normalize = staticmethod(fold_words)
+
+
 class Professional(models.Model):
     """
     Profilo del professionista (salone/studio) collegato 1‑a‑1 a un User.
@@ -28,17 +90,106 @@ class Professional(models.Model):
         on_delete=models.CASCADE,     # Se cancello l'utente, sparisce anche il profilo Professional
         related_name='professional',  # Permette di fare request.user.professional
     )
-    business_name = models.CharField(max_length=200)  # Nome commerciale del salone/studio
+    business_name = models.CharField(max_length=200, db_index=True)  # Nome commerciale del salone/studio (indicizzato per la directory)
     services = models.TextField(
         blank=True,
-        help_text="Descrizione libera dei servizi offerti (es. 'Taglio, Barba, Colore').",
+        help_text=(
+            "Descrizione libera dei servizi offerti (es. 'Taglio, Barba, Colore'). "
+            "I nomi mancanti vengono aggiunti al catalogo dei servizi."
+        ),
+    )
+    slot_minutes = models.PositiveSmallIntegerField(
+        default=30,
+        validators=[MinValueValidator(1)],   # 0 non genera slot (è il passo della griglia)
+        help_text="Durata di uno slot prenotabile, in minuti.",
     )
+    # Ultima modifica del profilo pubblico (anche del catalogo, vedi core.signals):
+    # base di ETag / Last-Modified e delle chiavi di fragment cache
+    updated_at = models.DateTimeField(auto_now=True)
+    # Autentica il feed iCalendar (/calendar/<token>.ics): i client calendario non fanno login
+    calendar_token = models.CharField(max_length=64, unique=True, default=new_calendar_token, editable=False)
+
+    class Meta:
+        constraints = [
+            # Anche fuori dai form (update(), shell): la griglia di disponibilità avanza di slot_minutes
+            models.CheckConstraint(condition=models.Q(slot_minutes__gte=1), name='professional_slot_minutes_positive'),
+        ]
 
     def __str__(self):
         # Mostro il nome del salone/studio ovunque serva una stringa
         return self.business_name
 
 
+class OpeningHours(models.Model):
+    """
+    Fascia oraria di apertura di un Professional in un giorno della settimana.
+    Più fasce nello stesso giorno permettono pause (es. 9-13 e 15-19).
+    Se un professionista non ne ha, valgono gli orari di default dell'AvailabilityService.
+    """
+    WEEKDAY_CHOICES = [
+        (0, 'Lunedì'),
+        (1, 'Martedì'),
+        (2, 'Mercoledì'),
+        (3, 'Giovedì'),
+        (4, 'Venerdì'),
+        (5, 'Sabato'),
+        (6, 'Domenica'),
+    ]
+
+    professional = models.ForeignKey(
+        Professional,
+        on_delete=models.CASCADE,
+        related_name='opening_hours',   # professional.opening_hours.all()
+    )
+    weekday = models.PositiveSmallIntegerField(choices=WEEKDAY_CHOICES)  # 0 = lunedì, come date.weekday()
+    opens_at = models.TimeField()
+    closes_at = models.TimeField()
+
+    class Meta:
+        ordering = ['weekday', 'opens_at']
+        verbose_name_plural = 'opening hours'
+
+    def __str__(self):
+        return f"{self.get_weekday_display()} {self.opens_at}-{self.closes_at}"
+
+
+class Service(models.Model):
+    """
+    Voce del catalogo di un Professional: nome, durata e prezzo.
+    Le booking la referenziano con una FK, così report e ricavi raggruppano
+    su un id indicizzato invece che su stringhe libere.
+    """
+    professional = models.ForeignKey(
+        Professional,
+        on_delete=models.CASCADE,
+        related_name='catalog',         # professional.catalog.all()
+    )
+    name = models.CharField(max_length=100)  # Es. "Taglio", "Taglio e barba"
+    duration_minutes = models.PositiveSmallIntegerField(
+        null=True, blank=True,
+        help_text="Durata del servizio in minuti (vuoto = durata dello slot del professionista).",
+    )
+    price = models.DecimalField(max_digits=8, decimal_places=2, null=True, blank=True)
+    is_active = models.BooleanField(
+        default=True,
+        help_text="I servizi non attivi restano nello storico ma non sono più prenotabili.",
+    )
+
+    class Meta:
+        ordering = ['name']
+        constraints = [
+            # Un nome per professionista, senza distinzione tra maiuscole e minuscole
+            models.UniqueConstraint(
+                'professional', Lower('name'),
+                name='service_unique_name',
+            ),
+        ]
+
+    def __str__(self):
+        # Nei template e nelle email una booking mostra direttamente il nome del servizio
+        return self.name
+
+
 class Booking(models.Model):
     """
     Singola prenotazione effettuata da un cliente per un determinato Professional.
@@ -53,9 +204,337 @@ class Booking(models.Model):
     client_email = models.EmailField()               # Email di contatto per conferme/notifiche
     date = models.DateField()                        # Data dell'appuntamento
     time = models.TimeField()                        # Orario dell'appuntamento
-    service = models.CharField(max_length=100)       # Servizio scelto (es. "Taglio", "Taglio e barba")
+    service = models.ForeignKey(
+        Service,
+        # Un servizio con prenotazioni si disattiva, non si cancella; RESTRICT (non PROTECT)
+        # lascia cancellare il professionista, che si porta via servizi e booking insieme
+        on_delete=models.RESTRICT,
+        related_name='bookings',
+    )
     notes = models.TextField(blank=True)             # Note opzionali del cliente (ritardo, richieste particolari, ecc.)
+    updated_at = models.DateTimeField(auto_now=True)  # Ultima modifica (validatori HTTP della pagina di conferma)
+    # Nome e note normalizzati per i filtri dello storico (vedi HistoryQuery)
+    client_name_folded = FoldedCharField(source='client_name', max_length=100)
+    notes_folded = FoldedWordsField(source='notes')
+
+    class Meta:
+        constraints = [
+            # Uno slot (professionista, data, ora) può essere prenotato una sola volta.
+            # L'indice univoco serve anche la dashboard: filtro per professional
+            # + range/ordinamento crescente su (date, time).
+            models.UniqueConstraint(
+                fields=['professional', 'date', 'time'],
+                name='booking_unique_slot',
+            ),
+        ]
+        indexes = [
+            # Storico: stesso filtro ma ordinamento decrescente, con id come tie-breaker
+            models.Index(
+                fields=['professional', '-date', '-time', '-id'],
+                name='booking_prof_history_idx',
+            ),
+            # Promemoria: tutte le booking di un giorno, di qualsiasi professionista
+            models.Index(fields=['date', 'time'], name='booking_date_idx'),
+            # Feed calendario incrementale: booking modificate dopo il sync token
+            models.Index(fields=['professional', 'updated_at'], name='booking_prof_updated_idx'),
+            # Filtri dello storico per prefisso del cliente, senza distinzione tra maiuscole
+            # e minuscole: range su LOWER(email) e sul nome normalizzato (vedi HistoryQuery.client)
+            models.Index('professional', Lower('client_email'), name='booking_prof_email_ci_idx'),
+            models.Index(fields=['professional', 'client_name_folded'], name='booking_prof_name_folded_idx'),
+        ]
 
     def __str__(self):
         # Ritorno una stringa compatta con salone, cliente e data/ora
         return f"{self.professional.business_name} - {self.client_name} - {self.date} {self.time}"
+
+    @classmethod
+    def from_db(cls, db, field_names, values):
+        """
+        Ricordo la chiave del rollup letta dal DB (professionista, giorno, servizio):
+        se il salvataggio la cambia, il signal sposta il conteggio senza rileggere la riga.
+        """
+        instance = super().from_db(db, field_names, values)
+        loaded = dict(zip(field_names, values))
+        if {'professional_id', 'date', 'service_id'} <= loaded.keys():
+            instance._loaded_stat_key = (loaded['professional_id'], loaded['date'], loaded['service_id'])
+        return instance
+
+    def refresh_from_db(self, *args, **kwargs):
+        # La chiave ricordata può non essere più quella nel DB: al prossimo salvataggio la rileggo
+        super().refresh_from_db(*args, **kwargs)
+        self.__dict__.pop('_loaded_stat_key', None)
+
+
+class BookingTombstone(models.Model):
+    """
+    Traccia di una booking (o di una regola ricorrente) cancellata, creata dai
+    signal: il feed calendario incrementale la pubblica come evento annullato,
+    così i client tolgono l'appuntamento o l'intera serie. Conservata per
+    CalendarService.TOMBSTONE_RETENTION (`manage.py prune_tombstones`).
+    """
+    professional = models.ForeignKey(
+        Professional,
+        on_delete=models.CASCADE,
+        related_name='booking_tombstones',
+    )
+    booking_id = models.BigIntegerField(null=True, blank=True)  # Id della booking cancellata (non più una FK)
+    rule_id = models.BigIntegerField(null=True, blank=True)     # ...oppure della regola ricorrente cancellata
+    date = models.DateField()                 # Data e ora dell'appuntamento cancellato (prima occorrenza per le regole)
+    time = models.TimeField()
+    deleted_at = models.DateTimeField(auto_now_add=True)
+
+    class Meta:
+        indexes = [
+            # Cancellazioni di un professionista dopo il sync token
+            models.Index(fields=['professional', 'deleted_at'], name='tombstone_prof_deleted_idx'),
+            # Pulizia dei tombstone scaduti
+            models.Index(fields=['deleted_at'], name='tombstone_deleted_idx'),
+        ]
+
+    def __str__(self):
+        target = f"booking {self.booking_id}" if self.booking_id else f"regola {self.rule_id}"
+        return f"{self.professional_id} {target} cancellata il {self.deleted_at}"
+
+
+class ArchivedBooking(models.Model):
+    """
+    Booking passata spostata fuori da core_booking dall'archiviazione
+    (`manage.py archive_bookings`): la tabella calda resta piccola e gli
+    indici di dashboard e storico contengono solo gli appuntamenti recenti.
+    Conserva l'id originale, quindi cursori dello storico e UID del feed non
+    cambiano; lo storico legge entrambe le tabelle (HistoryService).
+    """
+    id = models.BigIntegerField(primary_key=True)   # Id della booking originale
+    professional = models.ForeignKey(
+        Professional,
+        on_delete=models.CASCADE,
+        related_name='archived_bookings',
+    )
+    client_name = models.CharField(max_length=100)
+    client_email = models.EmailField()
+    date = models.DateField()
+    time = models.TimeField()
+    service = models.ForeignKey(
+        Service,
+        on_delete=models.RESTRICT,      # Come Booking: il servizio si disattiva, non si cancella
+        related_name='archived_bookings',
+    )
+    notes = models.TextField(blank=True)
+    updated_at = models.DateTimeField()                # Ultima modifica della booking originale
+    client_name_folded = FoldedCharField(source='client_name', max_length=100)
+    notes_folded = FoldedWordsField(source='notes')
+    archived_at = models.DateTimeField(auto_now_add=True)
+
+    class Meta:
+        indexes = [
+            # Stesso indice dello storico di Booking: le due sorgenti si leggono nello stesso ordine
+            models.Index(
+                fields=['professional', '-date', '-time', '-id'],
+                name='archived_prof_history_idx',
+            ),
+            # Stessi filtri per cliente dello storico di Booking
+            models.Index('professional', Lower('client_email'), name='archived_prof_email_ci_idx'),
+            models.Index(fields=['professional', 'client_name_folded'], name='archived_prof_name_folded_idx'),
+        ]
+
+    def __str__(self):
+        return f"{self.professional_id} - {self.client_name} - {self.date} {self.time} (archiviata)"
+
+
+class RecurringBooking(models.Model):
+    """
+    Appuntamento ricorrente di un cliente abituale: una regola in stile RRULE
+    (FREQ, INTERVAL, COUNT, UNTIL a partire da start_date) invece di una
+    Booking per ogni occorrenza. Le occorrenze si calcolano al volo, solo per
+    il periodo mostrato (RecurrenceService); le singole date si annullano o
+    si spostano con un RecurrenceException.
+    """
+    FREQ_DAILY = 'daily'
+    FREQ_WEEKLY = 'weekly'
+    FREQ_MONTHLY = 'monthly'
+    FREQ_CHOICES = [
+        (FREQ_DAILY, 'Ogni giorno'),
+        (FREQ_WEEKLY, 'Ogni settimana'),
+        (FREQ_MONTHLY, 'Ogni mese'),
+    ]
+
+    professional = models.ForeignKey(
+        Professional,
+        on_delete=models.CASCADE,
+        related_name='recurring_bookings',
+    )
+    client_name = models.CharField(max_length=100)
+    client_email = models.EmailField()
+    service = models.ForeignKey(
+        Service,
+        on_delete=models.RESTRICT,      # Come Booking: il servizio si disattiva, non si cancella
+        related_name='recurring_bookings',
+    )
+    notes = models.TextField(blank=True)
+    time = models.TimeField()                        # Orario di ogni occorrenza
+    start_date = models.DateField()                  # Prima occorrenza (DTSTART)
+    frequency = models.CharField(max_length=10, choices=FREQ_CHOICES, default=FREQ_WEEKLY)
+    interval = models.PositiveSmallIntegerField(default=1, validators=[MinValueValidator(1)])  # Ogni N giorni/settimane/mesi
+    count = models.PositiveIntegerField(null=True, blank=True, help_text="Numero di occorrenze (vuoto = senza limite).")
+    until = models.DateField(null=True, blank=True, help_text="Ultima data possibile (vuoto = senza limite).")
+    created_at = models.DateTimeField(auto_now_add=True)
+    # Ultima modifica della regola o delle sue eccezioni (feed calendario incrementale)
+    updated_at = models.DateTimeField(auto_now=True)
+
+    class Meta:
+        indexes = [
+            # Controllo dei conflitti: regole del professionista a quell'ora
+            models.Index(fields=['professional', 'time'], name='recurring_prof_time_idx'),
+        ]
+
+    def __str__(self):
+        return f"{self.client_name} - {self.get_frequency_display()} alle {self.time} dal {self.start_date}"
+
+    def clean(self):
+        # Dal 29 in poi alcuni mesi non avrebbero l'occorrenza (RecurrenceService.MAX_MONTHLY_DAY)
+        if self.frequency == self.FREQ_MONTHLY and self.start_date and self.start_date.day > 28:
+            raise ValidationError({'start_date': "Per le ricorrenze mensili scegli un giorno tra l'1 e il 28."})
+        if self.until and self.start_date and self.until < self.start_date:
+            raise ValidationError({'until': "La data di fine precede la prima occorrenza."})
+
+
+class RecurrenceException(models.Model):
+    """
+    Occorrenza di una regola ricorrente annullata (EXDATE). Se è stata spostata
+    o modificata, `booking` punta alla Booking concreta che la sostituisce.
+    """
+    rule = models.ForeignKey(
+        RecurringBooking,
+        on_delete=models.CASCADE,
+        related_name='exceptions',
+    )
+    date = models.DateField()                        # Data dell'occorrenza originale
+    booking = models.ForeignKey(
+        Booking,
+        on_delete=models.SET_NULL,
+        null=True, blank=True,
+        related_name='+',
+    )
+    created_at = models.DateTimeField(auto_now_add=True)
+
+    class Meta:
+        constraints = [
+            models.UniqueConstraint(fields=['rule', 'date'], name='recurrence_exception_once'),
+        ]
+
+    def __str__(self):
+        return f"{self.rule_id} {self.date}" + (f" -> booking {self.booking_id}" if self.booking_id else " annullata")
+
+
+class BookingDailyStat(models.Model):
+    """
+    Rollup delle prenotazioni: quante booking ha un Professional in un giorno per servizio.
+    Mantenuto in modo incrementale dai signal di Booking (vedi BookingStatsService)
+    e ricostruibile con `manage.py rebuild_daily_stats`: contatori e trend leggono
+    una riga per giorno/servizio invece di contare tutte le booking.
+    """
+    professional = models.ForeignKey(
+        Professional,
+        on_delete=models.CASCADE,
+        related_name='daily_stats',
+    )
+    date = models.DateField()
+    service = models.ForeignKey(Service, on_delete=models.CASCADE, related_name='daily_stats')
+    count = models.PositiveIntegerField(default=0)    # Booking di quel giorno e servizio
+
+    class Meta:
+        constraints = [
+            # Una riga per (professionista, giorno, servizio); l'indice serve i range per data
+            models.UniqueConstraint(
+                fields=['professional', 'date', 'service'],
+                name='daily_stat_unique_day_service',
+            ),
+        ]
+        indexes = [
+            # Aggregati per servizio (trend e ricavi di un servizio su un intervallo di date)
+            models.Index(fields=['service', 'date'], name='daily_stat_service_date_idx'),
+        ]
+
+    def __str__(self):
+        return f"{self.professional_id} {self.date} servizio {self.service_id}: {self.count}"
+
+
+class OutboundEmail(models.Model):
+    """
+    Email in uscita accodata nel DB (outbox).
+    Le view non parlano mai con il server SMTP: accodano qui il messaggio
+    e il comando `send_outbox` lo spedisce in batch, con retry e backoff.
+    """
+    STATUS_PENDING = 'pending'
+    STATUS_SENT = 'sent'
+    STATUS_FAILED = 'failed'
+    STATUS_CHOICES = [
+        (STATUS_PENDING, 'In coda'),
+        (STATUS_SENT, 'Inviata'),
+        (STATUS_FAILED, 'Fallita'),
+    ]
+
+    subject = models.CharField(max_length=255)
+    body = models.TextField()
+    from_email = models.CharField(max_length=254, blank=True)  # Vuoto = DEFAULT_FROM_EMAIL
+    to = models.EmailField()                                   # Un destinatario per messaggio
+    status = models.CharField(max_length=10, choices=STATUS_CHOICES, default=STATUS_PENDING)
+    attempts = models.PositiveSmallIntegerField(default=0)     # Tentativi di invio già fatti
+    next_attempt_at = models.DateTimeField(default=timezone.now)  # Prima data utile per il prossimo tentativo
+    last_error = models.TextField(blank=True)
+    created_at = models.DateTimeField(auto_now_add=True)
+    sent_at = models.DateTimeField(null=True, blank=True)
+
+    class Meta:
+        indexes = [
+            # Il worker cerca solo le email in coda già "mature" per l'invio
+            models.Index(fields=['status', 'next_attempt_at'], name='outbox_status_next_idx'),
+        ]
+
+    def __str__(self):
+        return f"{self.to} - {self.subject} ({self.status})"
+
+
+class NotificationLedger(models.Model):
+    """
+    Registro delle notifiche già accodate per una booking (es. il promemoria),
+    oppure per un'occorrenza ricorrente (regola + data, non ha righe in Booking).
+    I vincoli univoci (booking, kind) e (rule, date, kind) rendono il reminder
+    scheduler idempotente: rilanciarlo, o lanciarne due in parallelo, non
+    spedisce mai due volte la stessa notifica.
+    """
+    KIND_REMINDER = 'reminder'
+    KIND_CHOICES = [
+        (KIND_REMINDER, 'Promemoria appuntamento'),
+    ]
+
+    booking = models.ForeignKey(
+        Booking,
+        on_delete=models.CASCADE,
+        null=True, blank=True,
+        related_name='notifications',
+    )
+    rule = models.ForeignKey(
+        RecurringBooking,
+        on_delete=models.CASCADE,
+        null=True, blank=True,
+        related_name='notifications',
+    )
+    date = models.DateField(null=True, blank=True)   # Data dell'occorrenza (solo con rule)
+    kind = models.CharField(max_length=30, choices=KIND_CHOICES)
+    run_id = models.UUIDField()                 # Esecuzione dello scheduler che l'ha accodata
+    created_at = models.DateTimeField(auto_now_add=True)
+
+    class Meta:
+        constraints = [
+            models.UniqueConstraint(fields=['booking', 'kind'], name='notification_once'),
+            models.UniqueConstraint(fields=['rule', 'date', 'kind'], name='notification_occurrence_once'),
+        ]
+        indexes = [
+            models.Index(fields=['run_id'], name='notification_run_idx'),
+        ]
+
+    def __str__(self):
+        if self.rule_id:
+            return f"{self.kind} regola {self.rule_id} del {self.date}"
+        return f"{self.kind} booking {self.booking_id}"
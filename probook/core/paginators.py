@@ -0,0 +1,50 @@
+from django.core.paginator import Paginator
+from django.db import DatabaseError, connections
+from django.db.models import Max
+from django.utils.functional import cached_property
+
+
+class ApproximateCountPaginator(Paginator):
+    """
+    Paginator per le liste dell'admin su tabelle molto grandi.
+    Senza filtri il totale arriva dalle statistiche del database invece che da
+    un COUNT(*) che legge tutta la tabella:
+    - PostgreSQL: pg_class.reltuples (aggiornato da VACUUM/ANALYZE);
+    - SQLite: sqlite_stat1 (scritta da ANALYZE), altrimenti il massimo id.
+    Sotto EXACT_THRESHOLD righe stimate, o con un filtro attivo (che restringe
+    il conteggio a un range di indice), il totale resta esatto.
+    """
+    EXACT_THRESHOLD = 100_000
+
+    @cached_property
+    def count(self):
+        queryset = self.object_list
+        if not queryset.query.where:
+            estimate = self.estimate(queryset)
+            if estimate is not None and estimate > self.EXACT_THRESHOLD:
+                return estimate
+        return super().count
+
+    @staticmethod
+    def estimate(queryset):
+        """Righe stimate della tabella del queryset (None se la stima non è disponibile)."""
+        connection = connections[queryset.db]
+        table = queryset.model._meta.db_table
+        estimate = None
+        with connection.cursor() as cursor:
+            if connection.vendor == 'postgresql':
+                cursor.execute('SELECT reltuples::bigint FROM pg_class WHERE oid = %s::regclass', [table])
+                row = cursor.fetchone()
+                estimate = row[0] if row and row[0] >= 0 else None
+            elif connection.vendor == 'sqlite':
+                try:
+                    cursor.execute('SELECT stat FROM sqlite_stat1 WHERE tbl = %s LIMIT 1', [table])
+                    row = cursor.fetchone()
+                except DatabaseError:
+                    # Nessun ANALYZE ancora eseguito: la tabella sqlite_stat1 non esiste
+                    row = None
+                estimate = int(row[0].split()[0]) if row else None
+        if estimate is None:
+            # Id crescenti: il massimo (una lettura dell'indice della PK) approssima le righe
+            estimate = queryset.model._default_manager.using(queryset.db).aggregate(last=Max('pk'))['last']
+        return estimate
@@ -0,0 +1,83 @@
+import contextlib
+import functools
+from contextvars import ContextVar
+
+from asgiref.sync import iscoroutinefunction
+from django.conf import settings
+
+REPLICA_ALIAS = 'replica'
+
+_use_replica = ContextVar('probook_use_replica', default=False)
+
+
+def use_read_replica(view):
+    """
+    Decoratore per viste in sola lettura (storico, directory...): le letture
+    della richiesta vanno sulla replica, se configurata in DATABASES.
+    Le scritture restano sempre sul database principale.
+    Funziona sia con viste sincrone che async.
+    """
+    if iscoroutinefunction(view):
+        @functools.wraps(view)
+        async def async_wrapper(*args, **kwargs):
+            token = _use_replica.set(True)
+            try:
+                return await view(*args, **kwargs)
+            finally:
+                _use_replica.reset(token)
+        return async_wrapper
+
+    @functools.wraps(view)
+    def wrapper(*args, **kwargs):
+        token = _use_replica.set(True)
+        try:
+            return view(*args, **kwargs)
+        finally:
+            _use_replica.reset(token)
+    return wrapper
+
+
+def read_alias():
+    """
+    Alias del database da cui leggere adesso: la replica dentro una vista
+    @use_read_replica (se configurata), altrimenti il principale. Serve a chi
+    legge dopo la fine della vista, come il generatore di una
+    StreamingHttpResponse: il decoratore ha già ripristinato il ContextVar,
+    quindi l'alias va risolto nella vista e passato esplicitamente (using).
+    """
+    if _use_replica.get() and REPLICA_ALIAS in settings.DATABASES:
+        return REPLICA_ALIAS
+    return 'default'
+
+
+@contextlib.contextmanager
+def read_from_primary():
+    """
+    Letture sul database principale anche dentro una vista @use_read_replica.
+    Per i valori ricostruiti dopo un miss della cache: la loro chiave usa la
+    versione appena incrementata dai signal dopo la scrittura sul principale,
+    e una replica in ritardo vi salverebbe dati vecchi come "freschi" fino al
+    prossimo incremento.
+    """
+    token = _use_replica.set(False)
+    try:
+        yield
+    finally:
+        _use_replica.reset(token)
+
+
+class ReadReplicaRouter:
+    """Instrada le letture sulla replica solo dentro le viste marcate con @use_read_replica."""
+
+    def db_for_read(self, model, **hints):
+        return read_alias()
+
+    def db_for_write(self, model, **hints):
+        return 'default'
+
+    def allow_relation(self, obj1, obj2, **hints):
+        # Replica e principale contengono gli stessi dati
+        return True
+
+    def allow_migrate(self, db, app_label, model_name=None, **hints):
+        return db == 'default'
@@ -0,0 +1,69 @@
+from datetime import timedelta
+
+from django.db import router, transaction
+from django.utils import timezone
+
+from core.models import ArchivedBooking, Booking, NotificationLedger, RecurrenceException
+from core.services.cache_service import ProfessionalCache
+
+
+class ArchiveService:
+    """
+    Archiviazione delle booking passate: le sposta da core_booking ad
+    ArchivedBooking a blocchi di BATCH_SIZE, una transazione per blocco
+    (lock brevi, memoria costante, interrompibile e rilanciabile).
+
+    Lo spostamento non è una cancellazione: niente signal di Booking, quindi
+    il rollup BookingDailyStat resta com'è e il feed calendario non riceve
+    tombstone (gli appuntamenti passati restano sui telefoni).
+    """
+    # Booking passate più vecchie di così vengono archiviate (default del comando)
+    HORIZON_DAYS = 365
+    BATCH_SIZE = 1000
+    # Colonne copiate così come sono (id compreso)
+    FIELDS = (
+        'id', 'professional_id', 'client_name', 'client_email', 'date', 'time', 'service_id', 'notes',
+        'updated_at',
+    )
+
+    @classmethod
+    def cutoff(cls, days=None, today=None):
+        """Prima data NON archiviata: oggi meno l'orizzonte (mai nel futuro)."""
+        days = cls.HORIZON_DAYS if days is None else days
+        if days < 0:
+            raise ValueError(f"L'orizzonte di archiviazione non può essere negativo ({days} giorni).")
+        return (today or timezone.localdate()) - timedelta(days=days)
+
+    @classmethod
+    def archive_before(cls, cutoff, batch_size=None, professional=None):
+        """
+        Sposta in archivio le booking con data precedente a cutoff (di un
+        professionista o di tutti). Ritorna il numero di booking archiviate.
+        """
+        batch_size = batch_size or cls.BATCH_SIZE
+        candidates = Booking.objects.filter(date__lt=cutoff)
+        if professional is not None:
+            candidates = candidates.filter(professional=professional)
+        # Ordine dell'indice booking_date_idx: ogni blocco è un range dell'indice
+        candidates = candidates.order_by('date', 'time', 'id')
+
+        archived = 0
+        while True:
+            with transaction.atomic():
+                rows = list(candidates.values_list(*cls.FIELDS)[:batch_size])
+                if not rows:
+                    return archived
+                ids = [row[0] for row in rows]
+                ArchivedBooking.objects.bulk_create(
+                    [ArchivedBooking(**dict(zip(cls.FIELDS, row))) for row in rows],
+                )
+                # I promemoria già registrati non servono più (e la FK li legherebbe alla booking)
+                NotificationLedger.objects.filter(booking_id__in=ids).delete()
+                # Occorrenze spostate (override_occurrence): l'eccezione resta e continua a
+                # nascondere l'occorrenza, la booking che la sostituiva ora è nell'archivio
+                RecurrenceException.objects.filter(booking_id__in=ids).update(booking=None)
+                # DELETE diretto, senza collector né signal (vedi docstring della classe)
+                Booking.objects.filter(pk__in=ids)._raw_delete(router.db_for_write(Booking))
+            for professional_id in {row[1] for row in rows}:
+                ProfessionalCache.bump(professional_id)
+            archived += len(rows)
@@ -0,0 +1,181 @@
+from bisect import bisect_right
+from collections import defaultdict
+from datetime import date, time, timedelta
+
+from django.db.models import Value
+from django.db.models.functions import Coalesce
+from django.utils import timezone
+
+from core.models import Booking
+from core.services.cache_service import ProfessionalCache
+from core.services.recurrence_service import RecurrenceService
+
+
+def _to_minutes(t):
+    """Orario -> minuti dalla mezzanotte (comodo per confronti e bisect)."""
+    return t.hour * 60 + t.minute
+
+
+def _from_minutes(minutes):
+    return time(minutes // 60, minutes % 60)
+
+
+class AvailabilityService:
+    # Giorni mostrati di default nella griglia di disponibilità (e massimo consentito)
+    DEFAULT_DAYS = 30
+    MAX_DAYS = 90
+    # Orari usati se il professionista non ha configurato OpeningHours: lun-sab 9-19
+    DEFAULT_OPENING_HOURS = {weekday: [(time(9, 0), time(19, 0))] for weekday in range(6)}
+    @classmethod
+    def get_opening_hours(cls, professional):
+        """Fasce di apertura per giorno della settimana: {weekday: [(apre, chiude), ...]}."""
+        hours = defaultdict(list)
+        for opening in professional.opening_hours.all():
+            hours[opening.weekday].append((opening.opens_at, opening.closes_at))
+        return dict(hours) or cls.DEFAULT_OPENING_HOURS
+
+    @staticmethod
+    def busy_intervals(bookings):
+        """
+        Intervalli occupati di un giorno: da [(inizio, durata), ...] in minuti,
+        ordinati per inizio, alla lista di intervalli [inizio, fine) disgiunti
+        (le booking che si sovrappongono vengono fuse).
+        """
+        merged = []
+        for begin, duration in bookings:
+            end = begin + duration
+            if merged and begin < merged[-1][1]:
+                merged[-1][1] = max(merged[-1][1], end)
+            else:
+                merged.append([begin, end])
+        return merged
+
+    @staticmethod
+    def free_slots_for_day(windows, slot_minutes, busy, length=None):
+        """
+        Slot liberi di un giorno.
+        - windows: fasce di apertura [(apre, chiude), ...]
+        - busy: intervalli occupati [inizio, fine) disgiunti e ordinati (vedi busy_intervals)
+        - length: durata del servizio da prenotare (default: uno slot)
+        Gli slot candidati partono ogni slot_minutes; uno è libero se
+        [slot, slot + length) non tocca nessun intervallo occupato, verificato
+        con una bisect sulle fine invece che con una query per slot.
+        """
+        length = length or slot_minutes
+        ends = [end for _, end in busy]
+        free = []
+        for opens_at, closes_at in windows:
+            start = _to_minutes(opens_at)
+            end = _to_minutes(closes_at)
+            for slot in range(start, end - length + 1, slot_minutes):
+                # Primo intervallo occupato che finisce dopo l'inizio dello slot
+                i = bisect_right(ends, slot)
+                if i == len(busy) or busy[i][0] >= slot + length:
+                    free.append(_from_minutes(slot))
+        return free
+
+    @staticmethod
+    def _booked_rows(professional, start, days):
+        """Query (date, time, durata) delle booking nell'intervallo, ordinate."""
+        end = start + timedelta(days=days - 1)
+        return Booking.objects.filter(
+            professional=professional, date__range=(start, end),
+        ).order_by('date', 'time').values_list(
+            # Durata del servizio prenotato, o quella dello slot se il servizio non la specifica
+            'date', 'time', Coalesce('service__duration_minutes', Value(professional.slot_minutes)),
+        )
+
+    @staticmethod
+    def _occurrence_rows(professional, recurrences, start, days):
+        """Righe (date, time, durata) delle occorrenze ricorrenti nell'intervallo, come _booked_rows."""
+        end = start + timedelta(days=days - 1)
+        return [
+            (occurrence.date, occurrence.time, occurrence.service.duration_minutes or professional.slot_minutes)
+            for occurrence in RecurrenceService.expand(recurrences, start, end)
+        ]
+
+    @classmethod
+    def _grid_from_rows(cls, professional, start, days, rows, length):
+        """Griglia {date: [slot liberi]} a partire dalle righe (date, time, durata) già lette."""
+        booked = defaultdict(list)
+        for day, at, duration in rows:
+            booked[day].append((_to_minutes(at), duration))
+        # Booking concrete e occorrenze arrivano da due sorgenti: busy_intervals vuole gli inizi in ordine
+        for intervals in booked.values():
+            intervals.sort()
+
+        opening_hours = cls.get_opening_hours(professional)
+        grid = {}
+        for offset in range(days):
+            day = start + timedelta(days=offset)
+            windows = opening_hours.get(day.weekday(), [])
+            grid[day] = cls.free_slots_for_day(
+                windows, professional.slot_minutes, cls.busy_intervals(booked[day]), length,
+            )
+        return grid
+
+    @classmethod
+    def _build_grid(cls, professional, start, days, length):
+        """
+        Griglia {date: [slot liberi]} calcolata con una sola query sulle booking,
+        più le occorrenze delle regole ricorrenti espanse per l'intervallo.
+        """
+        end = start + timedelta(days=days - 1)
+        rows = list(cls._booked_rows(professional, start, days))
+        rows += cls._occurrence_rows(professional, RecurrenceService.load(professional, start, end), start, days)
+        return cls._grid_from_rows(professional, start, days, rows, length)
+
+    @classmethod
+    async def _abuild_grid(cls, professional, start, days, length):
+        end = start + timedelta(days=days - 1)
+        rows = [row async for row in cls._booked_rows(professional, start, days)]
+        rows += cls._occurrence_rows(professional, await RecurrenceService.aload(professional, start, end), start, days)
+        return cls._grid_from_rows(professional, start, days, rows, length)
+
+    @staticmethod
+    def service_length(professional, service=None):
+        """Minuti da trovare liberi: la durata del servizio scelto, altrimenti uno slot."""
+        return (service.duration_minutes if service else None) or professional.slot_minutes
+
+    @classmethod
+    def _window(cls, start, days):
+        """Intervallo richiesto, limitato a oggi in avanti e a MAX_DAYS giorni."""
+        today = date.today()
+        return max(start or today, today), min(days or cls.DEFAULT_DAYS, cls.MAX_DAYS)
+
+    @staticmethod
+    def _drop_past_slots(grid):
+        """Toglie gli slot di oggi già passati (la griglia in cache non dipende dall'ora)."""
+        today = date.today()
+        if today in grid:
+            now = timezone.localtime().time()
+            grid = {**grid, today: [slot for slot in grid[today] if slot > now]}
+        return grid
+
+    @classmethod
+    def get_availability(cls, professional, start=None, days=None, service=None):
+        """
+        Slot liberi del professionista da `start` per `days` giorni, abbastanza
+        lunghi per `service` (opzionale: senza, per uno slot).
+        La griglia è nella ProfessionalCache per (start, days, durata): non dipende
+        dall'ora corrente, quindi gli slot già passati di oggi vengono tolti
+        dopo la lettura dalla cache.
+        """
+        start, days = cls._window(start, days)
+        length = cls.service_length(professional, service)
+        grid = ProfessionalCache.get_or_set(
+            'availability', professional.id, (start.isoformat(), days, length),
+            lambda: cls._build_grid(professional, start, days, length),
+        )
+        return cls._drop_past_slots(grid)
+
+    @classmethod
+    async def aget_availability(cls, professional, start=None, days=None, service=None):
+        """Versione async di get_availability. Gli orari di apertura vanno prefetchati."""
+        start, days = cls._window(start, days)
+        length = cls.service_length(professional, service)
+        grid = await ProfessionalCache.aget_or_set(
+            'availability', professional.id, (start.isoformat(), days, length),
+            lambda: cls._abuild_grid(professional, start, days, length),
+        )
+        return cls._drop_past_slots(grid)
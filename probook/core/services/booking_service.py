@@ -1,53 +1,167 @@
-from django.core.mail import send_mail
-from core.models import Booking, Professional
+from asgiref.sync import sync_to_async
+from django.db import IntegrityError, transaction
+
+from core.models import Booking, Professional, RecurrenceException
+from core.services.notification_service import NotificationService
+from core.services.recurrence_service import RecurrenceService
+
+
+class SlotTakenError(Exception):
+    """Lo slot richiesto (professionista, data, ora e durata del servizio) si sovrappone a un appuntamento già preso."""
 
 
 class BookingService:
+    # Booking cancellate (ed email accodate) per transazione da cancel_bookings
+    CANCEL_BATCH_SIZE = 500
+
     @staticmethod
+    @transaction.atomic
     def create_booking(professional_id, form):
         """
         Logica estratta da public_booking:
         - crea la Booking collegata al Professional
-        - invia email a professionista e cliente
+          (solleva SlotTakenError se lo slot è già occupato)
+        - accoda le email per professionista e cliente (spedite dal comando send_outbox)
         - restituisce l'oggetto booking
         """
-        professional = Professional.objects.get(id=professional_id)
+        professional = Professional.objects.select_related('user').get(id=professional_id)
 
         # Creo la prenotazione collegandola al professional corrente
         booking = form.save(commit=False)
         booking.professional = professional
-        booking.save()
-
-        # Email di notifica al professionista
-        subject = f"Nuova prenotazione per {professional.business_name}"
-        message = (
-            f"Hai una nuova prenotazione.\n\n"
-            f"Cliente: {booking.client_name} ({booking.client_email})\n"
-            f"Servizio: {booking.service}\n"
-            f"Data: {booking.date} alle {booking.time}\n"
-        )
-        send_mail(
-            subject,
-            message,
-            None,  # usa DEFAULT_FROM_EMAIL dalle settings
-            [professional.user.email],
-            fail_silently=True,
-        )
-
-        # Email di conferma al cliente
-        subject_client = f"Conferma prenotazione da {professional.business_name}"
-        message_client = (
-            f"Ciao {booking.client_name},\n\n"
-            f"la tua prenotazione è confermata per il {booking.date} alle {booking.time}.\n"
-            f"Servizio: {booking.service}\n"
-            f"Professionista: {professional.business_name}\n"
-        )
-        send_mail(
-            subject_client,
-            message_client,
-            None,
-            [booking.client_email],
-            fail_silently=True,
-        )
+        BookingService.reserve_slot(booking)
+
+        # Notifica al professionista e conferma al cliente (template in core/templates/core/emails/)
+        NotificationService.enqueue_booking_created(booking)
+
+        return booking
+
+    @staticmethod
+    async def acreate_booking(professional_id, form):
+        """
+        Versione per le viste async: la transazione (prenotazione + outbox email)
+        gira per intero nel thread dedicato all'ORM, così on_commit resta legato
+        alla stessa connessione e l'event loop non si blocca.
+        """
+        return await sync_to_async(BookingService.create_booking)(professional_id, form)
 
+    @staticmethod
+    def lock_professional(professional_id):
+        """
+        Serializza le prenotazioni di un professionista per la transazione in
+        corso: SELECT ... FOR UPDATE sulla sua riga (PostgreSQL). Su SQLite le
+        transazioni sono IMMEDIATE (settings), quindi già serializzate in scrittura.
+        """
+        return Professional.objects.select_for_update().get(pk=professional_id)
+
+    @staticmethod
+    def find_overlap(professional, day, at, length):
+        """
+        Inizio del primo appuntamento del giorno (Booking concreta od occorrenza
+        ricorrente) che si sovrappone a [at, at + length), o None se libero.
+        """
+        # Booking che iniziano prima della fine dell'intervallo: range dell'indice (professional, date, time)
+        booked = Booking.objects.filter(
+            professional=professional, date=day, time__lt=RecurrenceService.clock(RecurrenceService.minutes(at) + length),
+        ).values_list('time', 'service__duration_minutes')
+        for other_at, duration in booked:
+            if RecurrenceService.overlaps(other_at, duration or professional.slot_minutes, at, length):
+                return other_at
+        if RecurrenceService.is_occupied(professional, day, at, length):
+            return at
+        return None
+
+    @classmethod
+    def reserve_slot(cls, booking):
+        """
+        Salva la booking se il suo intervallo [ora, ora + durata del servizio)
+        non si sovrappone ad altri appuntamenti, Booking concrete od occorrenze
+        ricorrenti (che non hanno righe in Booking); altrimenti SlotTakenError.
+        Il controllo e il salvataggio stanno nella stessa transazione, con le
+        prenotazioni del professionista serializzate (lock_professional).
+        Il vincolo univoco (professional, date, time) resta l'ultima difesa per
+        lo stesso slot: il savepoint permette di proseguire la transazione
+        esterna dopo l'IntegrityError, che viene tradotto in SlotTakenError.
+        """
+        with transaction.atomic():
+            professional = cls.lock_professional(booking.professional_id)
+            length = RecurrenceService.length(booking.service, professional.slot_minutes)
+            if cls.find_overlap(professional, booking.date, booking.time, length) is not None:
+                raise SlotTakenError(booking.date, booking.time)
+            try:
+                with transaction.atomic():
+                    booking.save()
+            except IntegrityError:
+                if Booking.objects.filter(
+                    professional_id=booking.professional_id, date=booking.date, time=booking.time,
+                ).exists():
+                    raise SlotTakenError(booking.date, booking.time)
+                raise
+        return booking
+
+    @classmethod
+    def cancel_bookings(cls, queryset, notify=True, batch_size=None):
+        """
+        Annulla le booking del queryset a blocchi di batch_size, una transazione
+        per blocco: la cancellazione passa dai signal (rollup, tombstone del feed
+        calendario, cache) e con notify=True accoda l'avviso al cliente.
+        Ritorna il numero di booking annullate.
+        """
+        batch_size = batch_size or cls.CANCEL_BATCH_SIZE
+        cancelled = 0
+        while True:
+            with transaction.atomic():
+                # Il queryset si rivaluta ad ogni giro: le booking già cancellate non ci sono più
+                batch = list(queryset.select_related('professional', 'service').order_by('pk')[:batch_size])
+                if not batch:
+                    return cancelled
+                if notify:
+                    NotificationService.enqueue_cancellations(batch)
+                Booking.objects.filter(pk__in=[booking.pk for booking in batch]).delete()
+            cancelled += len(batch)
+
+    # --- appuntamenti ricorrenti ---------------------------------------------------
+
+    @staticmethod
+    @transaction.atomic
+    def create_recurring(rule):
+        """
+        Valida e salva una regola ricorrente (ValidationError come nell'admin,
+        es. giorno del mese oltre il 28) se nessuna sua occorrenza si
+        sovrappone a un appuntamento; altrimenti SlotTakenError con la prima data
+        in conflitto. Come reserve_slot, controllo e salvataggio sono serializzati.
+        """
+        rule.full_clean()
+        BookingService.lock_professional(rule.professional_id)
+        conflict = RecurrenceService.find_conflict(rule)
+        if conflict:
+            raise SlotTakenError(conflict, rule.time)
+        rule.save()
+        return rule
+
+    @staticmethod
+    def cancel_occurrence(rule, day):
+        """Annulla una singola occorrenza (ValueError se in quel giorno la regola non cade)."""
+        if not RecurrenceService.occurs_on(rule, day):
+            raise ValueError(f"La regola {rule.id} non ha occorrenze il {day}.")
+        exception, _ = RecurrenceException.objects.get_or_create(rule=rule, date=day)
+        return exception
+
+    @classmethod
+    @transaction.atomic
+    def override_occurrence(cls, rule, day, **changes):
+        """
+        Sposta o modifica una singola occorrenza: la data originale diventa
+        un'eccezione e l'appuntamento diventa una Booking concreta con i dati
+        della regola più `changes` (es. date, time, notes). Solo quella riga
+        viene materializzata; SlotTakenError se il nuovo slot è occupato.
+        """
+        exception = cls.cancel_occurrence(rule, day)
+        fields = {
+            'client_name': rule.client_name, 'client_email': rule.client_email, 'service': rule.service,
+            'notes': rule.notes, 'date': day, 'time': rule.time, **changes,
+        }
+        booking = cls.reserve_slot(Booking(professional_id=rule.professional_id, **fields))
+        exception.booking = booking
+        exception.save(update_fields=['booking'])
         return booking
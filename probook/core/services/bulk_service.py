@@ -0,0 +1,169 @@
+import csv
+import itertools
+import json
+import time
+
+from django.core.exceptions import ValidationError
+from django.db import transaction
+
+from core.forms import BookingForm
+from core.models import Booking, Service
+from core.services.cache_service import ProfessionalCache
+from core.services.catalog_service import ServiceCatalogService
+from core.services.stats_service import BookingStatsService
+
+
+class _Echo:
+    """Pseudo-buffer per csv.writer: restituisce la riga invece di scriverla."""
+    def write(self, value):
+        return value
+
+
+class BulkBookingService:
+    # Colonne lette/scritte da import ed export (stesso formato: l'export è reimportabile)
+    FIELDS = ('client_name', 'client_email', 'service', 'date', 'time', 'notes')
+    FORMATS = ('csv', 'jsonl')
+    BATCH_SIZE = 1000
+    # Nei file il servizio è un nome (non l'id del catalogo): si valida come Service.name
+    SERVICE_NAME_FIELD = Service._meta.get_field('name').formfield()
+
+    @staticmethod
+    def detect_format(path, fmt=None):
+        """Formato esplicito oppure dedotto dall'estensione del file (default csv)."""
+        if fmt:
+            return fmt
+        return 'jsonl' if str(path).endswith(('.jsonl', '.ndjson')) else 'csv'
+
+    @staticmethod
+    def read_rows(stream, fmt):
+        """
+        Legge le righe una alla volta (dict), senza caricare il file in memoria.
+        Una riga JSONL non decodificabile diventa la sua ValidationError: la
+        scarta validate_row come ogni riga non valida, senza fermare l'import.
+        """
+        if fmt == 'csv':
+            yield from csv.DictReader(stream)
+        else:
+            for line in stream:
+                if line.strip():
+                    try:
+                        yield json.loads(line)
+                    except json.JSONDecodeError as exc:
+                        yield ValidationError(f"JSON non valido: {exc.msg} (colonna {exc.colno}).")
+
+    @classmethod
+    def validate_row(cls, row):
+        """
+        Valida una riga con le stesse regole dei campi di BookingForm (lunghezze,
+        formato email, parsing di data/ora) ma senza istanziare un form per riga.
+        Le date passate sono ammesse: l'import riguarda soprattutto lo storico.
+        Il servizio resta un nome: lo risolve import_rows sul catalogo, a blocchi.
+        Ritorna il dict dei valori puliti o solleva ValidationError.
+        """
+        if isinstance(row, ValidationError):
+            raise row
+        if not isinstance(row, dict):
+            raise ValidationError("La riga deve essere un oggetto JSON con i campi della prenotazione.")
+        cleaned = {}
+        errors = {}
+        for name in cls.FIELDS:
+            field = cls.SERVICE_NAME_FIELD if name == 'service' else BookingForm.base_fields[name]
+            try:
+                cleaned[name] = field.clean(row.get(name) or '')
+            except ValidationError as exc:
+                errors[name] = exc.messages
+        if errors:
+            raise ValidationError(errors)
+        return cleaned
+
+    @classmethod
+    def import_rows(cls, professional, rows, batch_size=None, on_error=None, on_batch=None):
+        """
+        Importa le righe a blocchi con bulk_create.
+        - Nessuna email e nessun signal per riga (bulk_create non li emette):
+          rollup giornaliero e cache del professionista vengono aggiornati una sola volta alla fine.
+        - Gli slot già occupati vengono ignorati (ignore_conflicts sul vincolo univoco).
+        - I nomi dei servizi diventano voci del catalogo (create se mancano), una
+          query per blocco.
+        - on_error(numero_riga, errore) e on_batch(statistiche) servono al comando
+          per riportare errori e throughput.
+        Ritorna le statistiche finali: righe lette, valide, non valide, importate,
+        saltate (valide ma su uno slot già occupato), secondi.
+        """
+        batch_size = batch_size or cls.BATCH_SIZE
+        stats = {'read': 0, 'valid': 0, 'invalid': 0, 'imported': 0, 'skipped': 0, 'seconds': 0.0}
+        started = time.monotonic()
+        numbered = enumerate(rows, start=1)
+
+        try:
+            while True:
+                chunk = list(itertools.islice(numbered, batch_size))
+                if not chunk:
+                    break
+                valid = []
+                for line_number, row in chunk:
+                    try:
+                        valid.append(cls.validate_row(row))
+                    except ValidationError as exc:
+                        stats['invalid'] += 1
+                        if on_error:
+                            on_error(line_number, exc)
+                with transaction.atomic():
+                    services = ServiceCatalogService.resolve(professional, {row['service'] for row in valid})
+                    bookings = [
+                        Booking(professional=professional, **{**row, 'service': services[row['service']]})
+                        for row in valid
+                    ]
+                    # ignore_conflicts non dice quante righe ha scartato: conto le booking dei
+                    # giorni del blocco prima e dopo, nella stessa transazione
+                    slots = Booking.objects.filter(professional=professional, date__in={row['date'] for row in valid})
+                    before = slots.count() if valid else 0
+                    Booking.objects.bulk_create(bookings, batch_size=batch_size, ignore_conflicts=True)
+                    imported = slots.count() - before if valid else 0
+
+                stats['read'] += len(chunk)
+                stats['valid'] += len(bookings)
+                stats['imported'] += imported
+                stats['skipped'] += len(bookings) - imported
+                stats['seconds'] = time.monotonic() - started
+                if on_batch:
+                    on_batch(stats)
+        finally:
+            # Anche dopo un errore a metà: i blocchi già salvati restano e vanno contati
+            BookingStatsService.rebuild(professional)
+            ProfessionalCache.bump(professional.id)
+        return stats
+
+    @classmethod
+    def iter_export(cls, queryset, fmt, fields=None, chunk_size=None):
+        """
+        Righe di testo dell'export (CSV con intestazione, oppure JSONL) delle
+        booking del queryset, lette a blocchi dal DB: per file e risposte in streaming.
+        `fields` aggiunge colonne a FIELDS (es. 'id'); la riga di intestazione non conta.
+        """
+        fields = tuple(fields or cls.FIELDS)
+        rows = queryset.order_by('date', 'time', 'id').values_list(
+            *ServiceCatalogService.value_lookups(fields)
+        ).iterator(
+            chunk_size=chunk_size or cls.BATCH_SIZE,
+        )
+        if fmt == 'csv':
+            writer = csv.writer(_Echo())
+            yield writer.writerow(fields)
+            for row in rows:
+                yield writer.writerow(row)
+        else:
+            for row in rows:
+                yield json.dumps(dict(zip(fields, row)), default=str) + '\n'
+
+    @classmethod
+    def export_rows(cls, queryset, stream, fmt, chunk_size=None):
+        """Scrive le booking del queryset sullo stream, leggendole a blocchi dal DB."""
+        lines = cls.iter_export(queryset, fmt, chunk_size=chunk_size)
+        if fmt == 'csv':
+            stream.write(next(lines))
+        count = 0
+        for line in lines:
+            stream.write(line)
+            count += 1
+        return count
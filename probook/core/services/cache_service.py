@@ -0,0 +1,155 @@
+from datetime import date, datetime, time, timedelta
+from time import time_ns
+
+from django.core.cache import cache
+
+from core.routers import read_from_primary
+
+
+def incr_counter(key, initial=1):
+    """Incremento atomico di un contatore senza scadenza, creandolo se manca."""
+    if not cache.add(key, initial, None):
+        try:
+            cache.incr(key)
+        except ValueError:
+            # Chiave espulsa dalla cache tra add e incr
+            cache.set(key, initial, None)
+
+
+def get_version(key):
+    """
+    Valore corrente di un contatore di versione. Se la chiave manca (mai creata
+    o espulsa dalla cache) riparte da un valore basato sull'orologio, così non
+    torna mai a una versione già usata (chiavi ed ETag vecchi restano invalidi).
+    """
+    version = cache.get(key)
+    if version is None:
+        cache.add(key, time_ns() // 1000, None)
+        version = cache.get(key)
+    return version
+
+
+async def aincr_counter(key, initial=1):
+    """Versione async di incr_counter."""
+    if not await cache.aadd(key, initial, None):
+        try:
+            await cache.aincr(key)
+        except ValueError:
+            await cache.aset(key, initial, None)
+
+
+async def aget_version(key):
+    """Versione async di get_version."""
+    version = await cache.aget(key)
+    if version is None:
+        await cache.aadd(key, time_ns() // 1000, None)
+        version = await cache.aget(key)
+    return version
+
+
+def bump_version(key):
+    """Nuova versione: tutte le chiavi costruite con la precedente diventano irraggiungibili."""
+    incr_counter(key, initial=time_ns() // 1000)
+
+
+class ProfessionalCache:
+    """
+    Cache versionata per professionista, sopra il cache framework di Django
+    (backend configurabile in settings.CACHES, locmem nei test).
+
+    Ogni chiave contiene la versione corrente del professionista: i signal su
+    Booking (e sugli altri dati che cambiano le viste) chiamano bump() e tutte
+    le voci precedenti diventano irraggiungibili, senza doverle cercare e cancellare.
+    """
+    # Durata massima di una voce (le voci "del giorno" scadono comunque a mezzanotte)
+    DEFAULT_TIMEOUT = 60 * 60
+    # Namespace per cui esponiamo i contatori hit/miss
+    NAMESPACES = ('dashboard', 'history', 'availability')
+
+    @staticmethod
+    def _version_key(professional_id):
+        return f'professional:{professional_id}:version'
+
+    @classmethod
+    def version(cls, professional_id):
+        return get_version(cls._version_key(professional_id))
+
+    @classmethod
+    def bump(cls, professional_id):
+        """Invalida in O(1) tutte le voci in cache del professionista."""
+        bump_version(cls._version_key(professional_id))
+
+    @staticmethod
+    def seconds_until_midnight():
+        """Secondi mancanti alla mezzanotte (stesso orologio di date.today() usato dai service)."""
+        now = datetime.now()
+        midnight = datetime.combine(now.date() + timedelta(days=1), time.min)
+        return max(int((midnight - now).total_seconds()), 1)
+
+    @staticmethod
+    def _count(namespace, outcome):
+        incr_counter(f'professional_cache:{outcome}:{namespace}')
+
+    @classmethod
+    def _key(cls, namespace, professional_id, version, parts, day_scoped):
+        """Chiave e TTL di una voce (vedi get_or_set)."""
+        key_parts = [namespace, str(professional_id), str(version)]
+        timeout = cls.DEFAULT_TIMEOUT
+        if day_scoped:
+            key_parts.append(date.today().isoformat())
+            timeout = min(timeout, cls.seconds_until_midnight())
+        key_parts.extend(str(part) for part in parts)
+        return ':'.join(key_parts), timeout
+
+    @classmethod
+    def get_or_set(cls, namespace, professional_id, parts, builder, day_scoped=False):
+        """
+        Ritorna il valore in cache per (namespace, professionista, parts) o lo
+        calcola con builder() e lo salva.
+        Con day_scoped=True la voce vale solo per la data corrente: la data entra
+        nella chiave e il TTL non supera la mezzanotte (contatori "oggi" corretti).
+        """
+        key, timeout = cls._key(
+            namespace, professional_id, cls.version(professional_id), parts, day_scoped,
+        )
+        value = cache.get(key)
+        if value is None:
+            cls._count(namespace, 'misses')
+            # Ricostruzione dal principale: la versione nella chiave è quella della sua ultima scrittura
+            with read_from_primary():
+                value = builder()
+            cache.set(key, value, timeout)
+        else:
+            cls._count(namespace, 'hits')
+        return value
+
+    @classmethod
+    async def aget_or_set(cls, namespace, professional_id, parts, abuilder, day_scoped=False):
+        """Come get_or_set, per le viste async: abuilder è una coroutine function."""
+        version = await aget_version(cls._version_key(professional_id))
+        key, timeout = cls._key(namespace, professional_id, version, parts, day_scoped)
+        value = await cache.aget(key)
+        if value is None:
+            await aincr_counter(f'professional_cache:misses:{namespace}')
+            with read_from_primary():
+                value = await abuilder()
+            await cache.aset(key, value, timeout)
+        else:
+            await aincr_counter(f'professional_cache:hits:{namespace}')
+        return value
+
+    @classmethod
+    def stats(cls):
+        """Contatori hit/miss per namespace, per il monitoraggio."""
+        keys = [
+            f'professional_cache:{outcome}:{namespace}'
+            for namespace in cls.NAMESPACES for outcome in ('hits', 'misses')
+        ]
+        values = cache.get_many(keys)
+        return {
+            namespace: {
+                outcome: values.get(f'professional_cache:{outcome}:{namespace}', 0)
+                for outcome in ('hits', 'misses')
+            }
+            for namespace in cls.NAMESPACES
+        }
@@ -0,0 +1,280 @@
+import hashlib
+from datetime import datetime, timedelta, timezone as dt_timezone
+
+from django.utils import timezone
+
+from core.models import Booking, BookingTombstone, RecurringBooking, new_calendar_token
+from core.services.cache_service import ProfessionalCache
+from core.services.recurrence_service import RecurrenceService
+
+
+class CalendarService:
+    """
+    Feed iCalendar (RFC 5545) delle prenotazioni di un professionista, per i
+    client calendario del telefono (URL segreto /calendar/<token>.ics).
+
+    Il feed si genera in streaming: le booking si leggono a blocchi con
+    iterator() e ogni evento è scritto appena letto, a memoria costante.
+    In modalità incrementale (sync token o updated_since) escono solo le
+    booking modificate dopo quell'istante, più le cancellate come eventi
+    STATUS:CANCELLED (dai BookingTombstone): il client aggiorna gli eventi
+    per UID.
+
+    Ogni appuntamento ricorrente è un solo evento con RRULE (più EXDATE per
+    le date annullate o spostate, che diventano booking concrete): il telefono
+    espande la serie da sé, senza limiti di orizzonte. Modificare la regola o
+    una sua eccezione aggiorna RecurringBooking.updated_at, quindi la serie
+    rientra nel feed incrementale; cancellarla lascia un tombstone.
+    """
+    PRODID = '-//ProBook//Calendario prenotazioni//IT'
+    CHUNK_SIZE = 2000
+    # Il sync token arretra di questo margine: una booking salvata da una transazione
+    # ancora aperta mentre si genera il feed ha updated_at precedente al token
+    SYNC_LEEWAY = timedelta(minutes=5)
+    # Tombstone conservati: un sync token più vecchio riceve il feed completo
+    TOMBSTONE_RETENTION = timedelta(days=90)
+
+    # --- formato iCalendar ------------------------------------------------------
+
+    @staticmethod
+    def escape(text):
+        """Testo di una proprietà (TEXT, RFC 5545 §3.3.11)."""
+        return (
+            str(text).replace('\\', '\\\\').replace(';', '\\;').replace(',', '\\,')
+            .replace('\r\n', '\\n').replace('\n', '\\n')
+        )
+
+    @staticmethod
+    def fold(line):
+        """
+        Riga terminata da CRLF, spezzata a 75 ottetti (le righe di continuazione
+        iniziano con uno spazio) senza dividere i caratteri UTF-8.
+        """
+        parts = []
+        current, size = '', 0
+        for char in line:
+            length = len(char.encode())
+            if size + length > 75:
+                parts.append(current)
+                current, size = ' ', 1
+            current += char
+            size += length
+        parts.append(current)
+        return '\r\n'.join(parts) + '\r\n'
+
+    @staticmethod
+    def _utc(moment):
+        return moment.astimezone(dt_timezone.utc).strftime('%Y%m%dT%H%M%SZ')
+
+    @staticmethod
+    def _floating(moment):
+        # Ora "floating": l'appuntamento è all'ora locale del salone, ovunque sia il telefono
+        return moment.strftime('%Y%m%dT%H%M%S')
+
+    @staticmethod
+    def uid(booking_id):
+        return f'booking-{booking_id}@probook'
+
+    @staticmethod
+    def rule_uid(rule_id):
+        return f'rule-{rule_id}@probook'
+
+    RRULE_FREQ = {
+        RecurringBooking.FREQ_DAILY: 'DAILY',
+        RecurringBooking.FREQ_WEEKLY: 'WEEKLY',
+        RecurringBooking.FREQ_MONTHLY: 'MONTHLY',
+    }
+
+    @classmethod
+    def rrule(cls, rule):
+        """
+        RRULE della regola. COUNT e UNTIL non possono comparire insieme
+        (RFC 5545 §3.3.10): il limite si esprime sempre come COUNT, l'indice
+        dell'ultima occorrenza calcolato da RecurrenceService.
+        None se la regola non ha occorrenze.
+        """
+        value = f'FREQ={cls.RRULE_FREQ[rule.frequency]};INTERVAL={rule.interval}'
+        last = RecurrenceService._last_index(rule)
+        if last is not None:
+            if last < 0:
+                return None
+            value += f';COUNT={last + 1}'
+        return value
+
+    # --- sync token -------------------------------------------------------------
+
+    @staticmethod
+    def sync_token(moment):
+        """Token opaco per la prossima richiesta incrementale (microsecondi UTC)."""
+        return str(int(moment.timestamp() * 1_000_000))
+
+    @staticmethod
+    def parse_since(sync_token=None, updated_since=None):
+        """
+        Istante da cui leggere le modifiche, da sync_token o da updated_since
+        (ISO 8601; senza fuso vale UTC). None = feed completo. ValueError se non validi.
+        """
+        if sync_token:
+            return datetime.fromtimestamp(int(sync_token) / 1_000_000, tz=dt_timezone.utc)
+        if updated_since:
+            since = datetime.fromisoformat(updated_since)
+            if timezone.is_naive(since):
+                since = timezone.make_aware(since, dt_timezone.utc)
+            return since
+        return None
+
+    @staticmethod
+    def etag(professional, since=None):
+        """
+        ETag del feed: versione in cache del professionista (cambia con ogni
+        booking, servizio o modifica del profilo) e finestra richiesta. Un
+        feed invariato risponde 304 senza leggere le booking.
+        """
+        parts = [professional.id, ProfessionalCache.version(professional.id), since.isoformat() if since else '']
+        return '"%s"' % hashlib.md5(':'.join(map(str, parts)).encode()).hexdigest()
+
+    # --- feed -------------------------------------------------------------------
+
+    @classmethod
+    def feed(cls, professional, since=None, now=None):
+        """
+        Generatore delle righe del feed (già piegate e con CRLF).
+        Con `since` solo modifiche e cancellazioni successive (meno SYNC_LEEWAY);
+        un `since` oltre TOMBSTONE_RETENTION ripiega sul feed completo.
+        """
+        now = now or timezone.now()
+        if since is not None and since < now - cls.TOMBSTONE_RETENTION:
+            since = None
+
+        yield from map(cls.fold, [
+            'BEGIN:VCALENDAR',
+            'VERSION:2.0',
+            f'PRODID:{cls.PRODID}',
+            'CALSCALE:GREGORIAN',
+            'METHOD:PUBLISH',
+            f'X-WR-CALNAME:{cls.escape(professional.business_name)}',
+        ])
+
+        bookings = Booking.objects.filter(professional=professional).values_list(
+            'id', 'date', 'time', 'client_name', 'client_email', 'notes', 'updated_at',
+            'service__name', 'service__duration_minutes',
+        )
+        if since is None:
+            # Stesso ordine dell'indice univoco (professional, date, time)
+            bookings = bookings.order_by('date', 'time')
+        else:
+            bookings = bookings.filter(updated_at__gte=since - cls.SYNC_LEEWAY).order_by('updated_at')
+
+        for row in bookings.iterator(chunk_size=cls.CHUNK_SIZE):
+            yield from map(cls.fold, cls._event(professional, *row))
+
+        # Regole ricorrenti: poche per professionista, una sola query con le date annullate
+        rules = RecurringBooking.objects.filter(professional=professional).select_related('service')
+        if since is not None:
+            rules = rules.filter(updated_at__gte=since - cls.SYNC_LEEWAY)
+        for rule in rules.prefetch_related('exceptions').order_by('id'):
+            exceptions = sorted(exception.date for exception in rule.exceptions.all())
+            yield from map(cls.fold, cls._recurring_event(professional, rule, exceptions))
+
+        if since is not None:
+            tombstones = BookingTombstone.objects.filter(
+                professional=professional, deleted_at__gte=since - cls.SYNC_LEEWAY,
+            ).values_list('booking_id', 'rule_id', 'date', 'time', 'deleted_at').order_by('deleted_at')
+            for booking_id, rule_id, *row in tombstones.iterator(chunk_size=cls.CHUNK_SIZE):
+                uid = cls.uid(booking_id) if booking_id is not None else cls.rule_uid(rule_id)
+                yield from map(cls.fold, cls._cancelled_event(uid, *row))
+
+        yield cls.fold('END:VCALENDAR')
+
+    @classmethod
+    def _event(cls, professional, booking_id, day, at, client_name, client_email, notes, updated_at,
+               service_name, duration_minutes):
+        start = datetime.combine(day, at)
+        end = start + timedelta(minutes=duration_minutes or professional.slot_minutes)
+        description = client_email + (f'\n{notes}' if notes else '')
+        return [
+            'BEGIN:VEVENT',
+            f'UID:{cls.uid(booking_id)}',
+            f'DTSTAMP:{cls._utc(updated_at)}',
+            f'LAST-MODIFIED:{cls._utc(updated_at)}',
+            f'DTSTART:{cls._floating(start)}',
+            f'DTEND:{cls._floating(end)}',
+            f'SUMMARY:{cls.escape(f"{service_name} - {client_name}")}',
+            f'DESCRIPTION:{cls.escape(description)}',
+            'STATUS:CONFIRMED',
+            'END:VEVENT',
+        ]
+
+    @classmethod
+    def _recurring_event(cls, professional, rule, exceptions):
+        """Evento della serie: DTSTART alla prima occorrenza, RRULE ed EXDATE (ore floating come DTSTART)."""
+        rrule = cls.rrule(rule)
+        if rrule is None:
+            return []
+        start = datetime.combine(rule.start_date, rule.time)
+        end = start + timedelta(minutes=RecurrenceService.length(rule.service, professional.slot_minutes))
+        description = rule.client_email + (f'\n{rule.notes}' if rule.notes else '')
+        lines = [
+            'BEGIN:VEVENT',
+            f'UID:{cls.rule_uid(rule.id)}',
+            f'DTSTAMP:{cls._utc(rule.updated_at)}',
+            f'LAST-MODIFIED:{cls._utc(rule.updated_at)}',
+            f'DTSTART:{cls._floating(start)}',
+            f'DTEND:{cls._floating(end)}',
+            f'RRULE:{rrule}',
+        ]
+        if exceptions:
+            lines.append('EXDATE:' + ','.join(cls._floating(datetime.combine(day, rule.time)) for day in exceptions))
+        return lines + [
+            f'SUMMARY:{cls.escape(f"{rule.service.name} - {rule.client_name}")}',
+            f'DESCRIPTION:{cls.escape(description)}',
+            'STATUS:CONFIRMED',
+            'END:VEVENT',
+        ]
+
+    @classmethod
+    def _cancelled_event(cls, uid, day, at, deleted_at):
+        return [
+            'BEGIN:VEVENT',
+            f'UID:{uid}',
+            f'DTSTAMP:{cls._utc(deleted_at)}',
+            f'DTSTART:{cls._floating(datetime.combine(day, at))}',
+            'STATUS:CANCELLED',
+            'END:VEVENT',
+        ]
+
+    # --- tombstone e token --------------------------------------------------------
+
+    @staticmethod
+    def record_deletion(booking):
+        """Tombstone di una booking appena cancellata (chiamato dal signal post_delete)."""
+        BookingTombstone.objects.create(
+            professional_id=booking.professional_id, booking_id=booking.id,
+            date=booking.date, time=booking.time,
+        )
+
+    @staticmethod
+    def record_rule_deletion(rule):
+        """Tombstone di una regola ricorrente appena cancellata: il client toglie l'intera serie."""
+        BookingTombstone.objects.create(
+            professional_id=rule.professional_id, rule_id=rule.id, date=rule.start_date, time=rule.time,
+        )
+
+    @staticmethod
+    def touch_rule(rule_id):
+        """Una data annullata o spostata cambia gli EXDATE: la serie rientra nel feed incrementale."""
+        RecurringBooking.objects.filter(pk=rule_id).update(updated_at=timezone.now())
+
+    @classmethod
+    def prune_tombstones(cls, now=None):
+        """Cancella i tombstone più vecchi di TOMBSTONE_RETENTION; ritorna quanti."""
+        cutoff = (now or timezone.now()) - cls.TOMBSTONE_RETENTION
+        deleted, _ = BookingTombstone.objects.filter(deleted_at__lt=cutoff).delete()
+        return deleted
+
+    @staticmethod
+    def rotate_token(professional):
+        """Nuovo URL del feed: quello vecchio smette subito di funzionare."""
+        professional.calendar_token = new_calendar_token()
+        professional.save(update_fields=['calendar_token', 'updated_at'])
+        return professional.calendar_token
@@ -0,0 +1,93 @@
+from django.db.models import DecimalField, F, Sum
+from django.db.models.functions import Coalesce
+from django.utils import timezone
+
+from core.models import BookingDailyStat, Professional, Service
+
+
+class ServiceCatalogService:
+    """
+    Catalogo dei servizi di un Professional (modello Service).
+    I nomi si confrontano normalizzati (spazi compattati, senza distinzione
+    tra maiuscole e minuscole), come nel vincolo univoco del modello.
+    """
+    # Lookup ORM del nome servizio, per values()/values_list() su Booking
+    NAME_LOOKUP = 'service__name'
+
+    @staticmethod
+    def normalize_name(name):
+        return ' '.join(str(name).split())[:Service._meta.get_field('name').max_length]
+
+    @classmethod
+    def _key(cls, name):
+        return cls.normalize_name(name).casefold()
+
+    @classmethod
+    def value_lookups(cls, fields):
+        """Campi di Booking -> lookup da leggere: il servizio si esporta per nome."""
+        return [cls.NAME_LOOKUP if field == 'service' else field for field in fields]
+
+    @staticmethod
+    def touch(professional_id):
+        """
+        Segna il profilo come modificato: il listino compare nelle pagine del
+        professionista, la cui fragment cache ed ETag seguono updated_at.
+        UPDATE diretto, senza signal né ri-sincronizzazione del catalogo.
+        """
+        Professional.objects.filter(pk=professional_id).update(updated_at=timezone.now())
+
+    @staticmethod
+    def bookable(professional):
+        """Servizi prenotabili dal form pubblico e dalle API."""
+        return professional.catalog.filter(is_active=True)
+
+    @classmethod
+    def resolve(cls, professional, names, create=True):
+        """
+        Nomi -> Service del professionista, con una query per tutto il blocco
+        (più un bulk_create per i nomi nuovi se create=True).
+        Ritorna {nome come passato: Service}; i nomi sconosciuti senza create mancano.
+        """
+        catalog = {cls._key(service.name): service for service in professional.catalog.all()}
+        missing = {}
+        for name in names:
+            key = cls._key(name)
+            if key and key not in catalog:
+                missing.setdefault(key, cls.normalize_name(name))
+        if missing and create:
+            Service.objects.bulk_create(
+                [Service(professional=professional, name=name) for name in missing.values()],
+                ignore_conflicts=True,
+            )
+            # bulk_create non emette signal: aggiorno io il profilo
+            cls.touch(professional.pk)
+            # Rileggo: con ignore_conflicts le righe nuove non hanno l'id
+            catalog = {cls._key(service.name): service for service in professional.catalog.all()}
+        return {name: catalog[cls._key(name)] for name in names if cls._key(name) in catalog}
+
+    @classmethod
+    def sync_from_description(cls, professional):
+        """Aggiunge al catalogo i servizi elencati nella descrizione libera ("Taglio, Barba")."""
+        names = [part for part in professional.services.split(',') if part.strip()]
+        if names:
+            cls.resolve(professional, names)
+
+    @staticmethod
+    def revenue(professional, start, end):
+        """
+        Prenotazioni e ricavo per servizio nell'intervallo, dal rollup giornaliero:
+        il costo dipende da giorni x servizi, non dal numero di booking.
+        I servizi senza prezzo contano zero.
+        """
+        return list(
+            BookingDailyStat.objects.filter(professional=professional, date__range=(start, end))
+            .values('service_id', name=F('service__name'))
+            .annotate(
+                bookings=Sum('count'),
+                revenue=Coalesce(
+                    Sum(F('count') * F('service__price'), output_field=DecimalField(max_digits=12, decimal_places=2)),
+                    0, output_field=DecimalField(max_digits=12, decimal_places=2),
+                ),
+            )
+            .order_by('-bookings', 'name')
+        )
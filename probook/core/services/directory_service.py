@@ -0,0 +1,195 @@
+import hashlib
+import math
+import re
+
+from django.core.cache import cache
+from django.core.paginator import Paginator
+from django.db import connection, connections, router
+from django.db.models import Max, Q
+from django.utils import timezone
+
+from core.models import Professional
+from core.routers import read_from_primary
+from core.services.cache_service import bump_version, get_version
+
+
+class DirectoryService:
+    """
+    Directory pubblica dei professionisti con ricerca full-text su
+    business_name e services.
+    Su SQLite usa una tabella virtuale FTS5 (core_professional_fts, rowid = id
+    del Professional) tenuta allineata dai signal; sugli altri backend, o se
+    FTS5 non è disponibile, ripiega su icontains.
+    """
+    FTS_TABLE = 'core_professional_fts'
+    PAGE_SIZE = 20
+    # Oltre questo numero di risultati l'ordinamento per rilevanza (bm25 calcolato
+    # su ogni riga trovata) costa più della ricerca: si ordina per id, come l'indice
+    RANK_LIMIT = 500
+    CACHE_TIMEOUT = 60 * 10
+    VERSION_KEY = 'directory:version'
+    LAST_MODIFIED_KEY = 'directory:last_modified'
+
+    # Database su cui la tabella FTS5 esiste (evita una query a ricerca). Solo l'esito
+    # positivo è memorizzato: una tabella mancante all'avvio (migrate ancora da
+    # eseguire) viene vista appena creata, senza riavviare il processo
+    _fts_checked = set()
+
+    @classmethod
+    def fts_available(cls, using=None):
+        """True se il database (default: principale) ha la tabella FTS5 della directory."""
+        conn = connections[using] if using else connection
+        if conn.vendor != 'sqlite':
+            return False
+        name = str(conn.settings_dict['NAME'])
+        if name not in cls._fts_checked:
+            if cls.FTS_TABLE not in conn.introspection.table_names():
+                return False
+            cls._fts_checked.add(name)
+        return True
+
+    @staticmethod
+    def build_fts_query(text):
+        """
+        Trasforma il testo dell'utente in una query FTS5 sicura: ogni parola
+        diventa un termine tra virgolette con match per prefisso, tutte in AND.
+        """
+        words = re.findall(r'\w+', text)
+        return ' '.join(f'"{word}"*' for word in words)
+
+    # --- sincronizzazione dell'indice (chiamata dai signal) -------------------
+
+    @classmethod
+    def index_professional(cls, professional):
+        """Aggiorna (o inserisce) il Professional nell'indice e invalida la directory in cache."""
+        if cls.fts_available():
+            with connection.cursor() as cursor:
+                cursor.execute(f'DELETE FROM {cls.FTS_TABLE} WHERE rowid = %s', [professional.id])
+                cursor.execute(
+                    f'INSERT INTO {cls.FTS_TABLE} (rowid, business_name, services) VALUES (%s, %s, %s)',
+                    [professional.id, professional.business_name, professional.services],
+                )
+        cls.invalidate()
+
+    @classmethod
+    def remove_professional(cls, professional_id):
+        """Toglie il Professional dall'indice e invalida la directory in cache."""
+        if cls.fts_available():
+            with connection.cursor() as cursor:
+                cursor.execute(f'DELETE FROM {cls.FTS_TABLE} WHERE rowid = %s', [professional_id])
+        cls.invalidate()
+
+    @classmethod
+    def rebuild_index(cls):
+        """Ricostruisce l'indice da zero (dopo un bulk_create, che non emette signal)."""
+        if cls.fts_available():
+            with connection.cursor() as cursor:
+                cursor.execute(f'DELETE FROM {cls.FTS_TABLE}')
+                cursor.execute(
+                    f'INSERT INTO {cls.FTS_TABLE} (rowid, business_name, services) '
+                    f'SELECT id, business_name, services FROM {Professional._meta.db_table}'
+                )
+                cursor.execute(f"INSERT INTO {cls.FTS_TABLE} ({cls.FTS_TABLE}) VALUES ('optimize')")
+        cls.invalidate()
+
+    @classmethod
+    def invalidate(cls):
+        """Rende obsolete tutte le pagine della directory in cache."""
+        bump_version(cls.VERSION_KEY)
+        cache.set(cls.LAST_MODIFIED_KEY, timezone.now(), None)
+
+    @classmethod
+    def version(cls):
+        """Versione corrente della directory (parte delle chiavi e dell'ETag della home)."""
+        return get_version(cls.VERSION_KEY)
+
+    @classmethod
+    def last_modified(cls):
+        """
+        Ultima modifica della directory, per il Last-Modified della home:
+        la registra invalidate(); se manca dalla cache la ricavo dal DB.
+        """
+        value = cache.get(cls.LAST_MODIFIED_KEY)
+        if value is None:
+            with read_from_primary():
+                value = Professional.objects.aggregate(last=Max('updated_at'))['last']
+            if value is not None:
+                cache.add(cls.LAST_MODIFIED_KEY, value, None)
+        return value
+
+    # --- ricerca ----------------------------------------------------------------
+
+    @classmethod
+    def _search_ids(cls, query, page_number):
+        """
+        Ricerca FTS5: ritorna (id della pagina ordinati per rilevanza, totale
+        risultati, numero di pagina). Come Paginator.get_page, una pagina oltre
+        l'ultima diventa l'ultima. Le ricerche molto generiche (oltre RANK_LIMIT
+        risultati) non sono ordinate per rilevanza.
+        """
+        fts_query = cls.build_fts_query(query)
+        if not fts_query:
+            return [], 0, 1
+        # Lettura: segue il router (replica, se la vista la usa)
+        with connections[router.db_for_read(Professional)].cursor() as cursor:
+            cursor.execute(
+                f'SELECT count(*) FROM {cls.FTS_TABLE} WHERE {cls.FTS_TABLE} MATCH %s',
+                [fts_query],
+            )
+            total = cursor.fetchone()[0]
+            page_number = min(page_number, max(math.ceil(total / cls.PAGE_SIZE), 1))
+            order = 'rank' if total <= cls.RANK_LIMIT else 'rowid'
+            cursor.execute(
+                f'SELECT rowid FROM {cls.FTS_TABLE} WHERE {cls.FTS_TABLE} MATCH %s '
+                f'ORDER BY {order} LIMIT %s OFFSET %s',
+                [fts_query, cls.PAGE_SIZE, (page_number - 1) * cls.PAGE_SIZE],
+            )
+            ids = [row[0] for row in cursor.fetchall()]
+        return ids, total, page_number
+
+    @classmethod
+    def _build_page(cls, query, page_number, use_fts):
+        page_number = max(page_number, 1)
+        fields = ('id', 'business_name', 'services')
+
+        if query and use_fts:
+            ids, total, page_number = cls._search_ids(query, page_number)
+            by_id = Professional.objects.only(*fields).in_bulk(ids)
+            professionals = [by_id[pk] for pk in ids if pk in by_id]
+        else:
+            queryset = Professional.objects.only(*fields).order_by('business_name', 'id')
+            if query:
+                queryset = queryset.filter(
+                    Q(business_name__icontains=query) | Q(services__icontains=query)
+                )
+            page = Paginator(queryset, cls.PAGE_SIZE).get_page(page_number)
+            professionals, total, page_number = list(page), page.paginator.count, page.number
+
+        return {
+            'professionals': professionals,
+            'page': page_number,
+            'total': total,
+            'has_previous': page_number > 1,
+            'has_next': page_number * cls.PAGE_SIZE < total,
+        }
+
+    @classmethod
+    def search(cls, query='', page_number=1, use_fts=None):
+        """
+        Una pagina della directory, eventualmente filtrata dalla ricerca `query`.
+        I risultati sono in cache per (versione directory, query, pagina).
+        """
+        query = ' '.join(query.split())
+        if use_fts is None:
+            use_fts = cls.fts_available(router.db_for_read(Professional))
+        # La query dell'utente entra nella chiave come hash (lunghezza e caratteri sicuri)
+        query_hash = hashlib.md5(query.lower().encode()).hexdigest()
+        key = f'directory:{cls.version()}:{int(use_fts)}:{page_number}:{query_hash}'
+        # Un miss si ricostruisce dal principale (vedi routers.read_from_primary): la home
+        # salva l'HTML sotto la stessa versione della directory
+        value = cache.get(key)
+        if value is None:
+            with read_from_primary():
+                value = cls._build_page(query, page_number, use_fts)
+            cache.set(key, value, cls.CACHE_TIMEOUT)
+        return value
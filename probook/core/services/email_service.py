@@ -0,0 +1,120 @@
+from datetime import timedelta
+
+from django.core.mail import EmailMessage, get_connection
+from django.db import transaction
+from django.utils import timezone
+
+from core.models import OutboundEmail
+
+
+class EmailOutboxService:
+    # Dopo questo numero di tentativi falliti l'email viene marcata come "failed"
+    MAX_ATTEMPTS = 5
+    # Backoff esponenziale: 1, 2, 4, 8... minuti tra un tentativo e l'altro
+    BACKOFF_BASE = timedelta(minutes=1)
+    # Email spedite per ogni batch (stessa connessione SMTP)
+    BATCH_SIZE = 100
+    # Lease delle email prese in carico da un worker (vedi claim)
+    CLAIM_TIMEOUT = timedelta(minutes=10)
+
+    @staticmethod
+    def enqueue(subject, body, to, from_email=''):
+        """
+        Accoda un'email nell'outbox.
+        L'inserimento avviene solo dopo il commit della transazione corrente,
+        così non restano email orfane se la prenotazione va in rollback.
+        """
+        transaction.on_commit(lambda: OutboundEmail.objects.create(
+            subject=subject, body=body, to=to, from_email=from_email,
+        ))
+
+    @classmethod
+    def claim(cls, batch_size=None, now=None):
+        """
+        Prende in carico un batch di email mature, in una transazione breve:
+        le righe bloccate (skip_locked, così più worker non si contendono le
+        stesse) ricevono un lease di CLAIM_TIMEOUT su next_attempt_at e il lock
+        si rilascia subito, prima di parlare con il server SMTP. Se il worker
+        muore a metà, le email tornano disponibili alla scadenza del lease.
+        """
+        batch_size = batch_size or cls.BATCH_SIZE
+        now = now or timezone.now()
+        with transaction.atomic():
+            batch = list(
+                OutboundEmail.objects.select_for_update(skip_locked=True).filter(
+                    status=OutboundEmail.STATUS_PENDING, next_attempt_at__lte=now,
+                ).order_by('next_attempt_at', 'id')[:batch_size]
+            )
+            OutboundEmail.objects.filter(pk__in=[email.pk for email in batch]).update(
+                next_attempt_at=now + cls.CLAIM_TIMEOUT,
+            )
+        return batch
+
+    @classmethod
+    def _record_failure(cls, email, error, now):
+        email.last_error = error
+        if email.attempts >= cls.MAX_ATTEMPTS:
+            email.status = OutboundEmail.STATUS_FAILED
+        else:
+            email.next_attempt_at = now + cls.BACKOFF_BASE * 2 ** (email.attempts - 1)
+
+    @classmethod
+    def send_pending(cls, batch_size=None, connection=None):
+        """
+        Spedisce un batch di email in coda riusando una sola connessione SMTP,
+        fuori da ogni transazione (vedi claim).
+        Ogni messaggio fallito viene ripianificato con backoff esponenziale; se
+        la connessione non si apre il tentativo fallisce per tutto il batch.
+        Ritorna la tupla (inviate, fallite).
+        """
+        now = timezone.now()
+        batch = cls.claim(batch_size, now)
+        sent = failed = 0
+        if not batch:
+            return sent, failed
+
+        for email in batch:
+            email.attempts += 1
+        connection = connection or get_connection(fail_silently=False)
+        try:
+            connection.open()
+        except Exception as exc:
+            # Server SMTP irraggiungibile: nessun invio, tentativo e backoff registrati per tutte
+            for email in batch:
+                cls._record_failure(email, str(exc), now)
+            failed = len(batch)
+        else:
+            try:
+                for email in batch:
+                    message = EmailMessage(
+                        email.subject, email.body, email.from_email or None, [email.to],
+                        connection=connection,
+                    )
+                    # Un invio per messaggio sulla stessa connessione: un destinatario
+                    # rifiutato fallisce da solo, senza far ripetere il resto del batch
+                    try:
+                        connection.send_messages([message])
+                    except Exception as exc:
+                        failed += 1
+                        cls._record_failure(email, str(exc), now)
+                    else:
+                        sent += 1
+                        email.status = OutboundEmail.STATUS_SENT
+                        email.sent_at = timezone.now()
+                        email.last_error = ''
+            finally:
+                connection.close()
+
+        OutboundEmail.objects.bulk_update(
+            batch, ['status', 'attempts', 'next_attempt_at', 'last_error', 'sent_at'],
+        )
+        return sent, failed
+
+    @staticmethod
+    def queue_drained(sent, failed, batch_size):
+        """
+        True quando conviene smettere di chiamare send_pending: batch incompleto
+        (coda svuotata) oppure nessun invio riuscito (server SMTP in errore,
+        meglio aspettare il backoff che consumare subito i tentativi del resto).
+        """
+        return sent + failed < batch_size or not sent
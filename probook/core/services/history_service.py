@@ -1,13 +1,400 @@
-from core.models import Booking
+import base64
+import hashlib
+import heapq
+import itertools
+import sys
+from datetime import date, time, timedelta
+
+from django.db import connections
+from django.db.models import Q, QuerySet
+from django.db.models.expressions import RawSQL
+from django.db.models.functions import Lower
+
+from core.models import ArchivedBooking, Booking, Service, fold, fold_words
+from core.services.cache_service import ProfessionalCache
+from core.services.catalog_service import ServiceCatalogService
+from core.services.recurrence_service import RecurrenceService
+
+
+class HistoryQuery:
+    """
+    Filtri dello storico componibili a catena (HistoryService.query):
+
+        HistoryService.query(professional).client('ros').dates(start, end).notes('allergia')
+
+    Ogni filtro vale per tutte le sorgenti (booking, archivio) e, come
+    predicato in Python, per le occorrenze ricorrenti. I filtri vuoti sono
+    ignorati, così si possono passare direttamente i campi di un form.
+    Nomi e note si confrontano piegati con fold() (né maiuscole né accenti:
+    "élo" trova "Élodie") allo stesso modo su ogni sorgente e database.
+    """
+    # Tabella FTS5 delle note (migrazione 0020, mantenuta da trigger): solo SQLite, solo core_booking
+    NOTES_FTS_TABLE = 'core_booking_notes_fts'
+
+    # Id più grande che un database accetta come intero (BIGINT con segno): oltre, SQLite
+    # solleva OverflowError invece di non trovare nulla
+    MAX_ID = 2 ** 63 - 1
+
+    # Database su cui la tabella FTS5 esiste (solo l'esito positivo, come DirectoryService)
+    _fts_checked = set()
+
+    def __init__(self, professional):
+        self.professional = professional
+        self.date_from = None
+        self.date_to = None
+        # (nome, valore, filtro sul queryset, predicato sulle occorrenze)
+        self._filters = []
+
+    def _add(self, name, value, apply, matches):
+        self._filters.append((name, value, apply, matches))
+        return self
+
+    @property
+    def is_filtered(self):
+        return bool(self._filters)
+
+    def client(self, prefix):
+        """Nome o email del cliente che iniziano con `prefix`, senza distinzione tra maiuscole, minuscole e accenti."""
+        prefix = fold((prefix or '').strip())
+        if not prefix:
+            return self
+        # Range [prefix, prefix con l'ultimo carattere incrementato) su LOWER(client_email) e
+        # su client_name_folded, entrambi indicizzati: a differenza di ILIKE/LIKE 'x%' è
+        # indicizzabile su ogni database. Le email sono ASCII, LOWER basta. Se l'ultimo
+        # carattere è già il code point massimo non c'è un successivo: resta solo >= prefix
+        if ord(prefix[-1]) < sys.maxunicode:
+            upper = prefix[:-1] + chr(ord(prefix[-1]) + 1)
+            email = Q(email_ci__gte=prefix, email_ci__lt=upper)
+            name = Q(client_name_folded__gte=prefix, client_name_folded__lt=upper)
+        else:
+            email = Q(email_ci__gte=prefix, email_ci__startswith=prefix)
+            name = Q(client_name_folded__gte=prefix, client_name_folded__startswith=prefix)
+
+        def apply(queryset):
+            return queryset.alias(email_ci=Lower('client_email')).filter(email | name)
+
+        def matches(occurrence):
+            return occurrence.client_email.lower().startswith(prefix) or fold(occurrence.client_name).startswith(prefix)
+
+        return self._add('client', prefix, apply, matches)
+
+    def service(self, service):
+        """Servizio del catalogo: istanza, id oppure nome (senza distinzione tra maiuscole e minuscole)."""
+        if service in (None, ''):
+            return self
+        if isinstance(service, Service):
+            service = service.id
+        if str(service).isdecimal():
+            service_id = int(service)
+            if service_id > self.MAX_ID:
+                # Nessun servizio può avere quell'id
+                return self._add('service', service_id, lambda queryset: queryset.none(), lambda occurrence: False)
+            return self._add(
+                'service', service_id,
+                lambda queryset: queryset.filter(service_id=service_id),
+                lambda occurrence: occurrence.service_id == service_id,
+            )
+        name = str(service).lower()
+        return self._add(
+            'service', name,
+            lambda queryset: queryset.filter(service__name__iexact=name),
+            lambda occurrence: occurrence.service.name.lower() == name,
+        )
+
+    def dates(self, start=None, end=None):
+        """Appuntamenti con data in [start, end] (estremi facoltativi)."""
+        if start:
+            self.date_from = start
+            self._add(
+                'date_from', start.isoformat(),
+                lambda queryset: queryset.filter(date__gte=start), lambda occurrence: occurrence.date >= start,
+            )
+        if end:
+            self.date_to = end
+            self._add(
+                'date_to', end.isoformat(),
+                lambda queryset: queryset.filter(date__lte=end), lambda occurrence: occurrence.date <= end,
+            )
+        return self
+
+    @classmethod
+    def notes_fts_available(cls, using):
+        conn = connections[using]
+        if conn.vendor != 'sqlite':
+            return False
+        name = str(conn.settings_dict['NAME'])
+        if name not in cls._fts_checked:
+            if cls.NOTES_FTS_TABLE not in conn.introspection.table_names():
+                return False
+            cls._fts_checked.add(name)
+        return True
+
+    def notes(self, text):
+        """
+        Ricerca nelle note: tutte le parole, ciascuna come inizio di parola.
+        Su SQLite le booking in tabella passano dall'indice FTS5 (che piega
+        maiuscole e accenti come fold); l'archivio (freddo, letto di rado) e gli
+        altri database cercano ' parola' in notes_folded (vedi fold_words).
+        """
+        words = fold_words(text or '').split()
+        if not words:
+            return self
+        match = ' '.join(f'"{word}"*' for word in words)
+
+        def apply(queryset):
+            if queryset.model is Booking and self.notes_fts_available(queryset.db):
+                return queryset.filter(id__in=RawSQL(
+                    f'SELECT rowid FROM {self.NOTES_FTS_TABLE} WHERE {self.NOTES_FTS_TABLE} MATCH %s', [match],
+                ))
+            for word in words:
+                queryset = queryset.filter(notes_folded__contains=f' {word}')
+            return queryset
+
+        def matches(occurrence):
+            notes = fold_words(occurrence.notes)
+            return all(f' {word}' in notes for word in words)
+
+        return self._add('notes', match, apply, matches)
+
+    def apply(self, queryset):
+        """Il queryset (di Booking o ArchivedBooking) con tutti i filtri."""
+        for _, _, apply, _ in self._filters:
+            queryset = apply(queryset)
+        return queryset
+
+    def matches(self, occurrence):
+        """True se l'occorrenza ricorrente soddisfa tutti i filtri."""
+        return all(matches(occurrence) for _, _, _, matches in self._filters)
+
+    def sources(self):
+        """history_sources del professionista, filtrate."""
+        return [self.apply(source) for source in HistoryService.history_sources(self.professional)]
+
+    def cache_key(self):
+        """
+        Parti della chiave in cache della pagina: una voce per combinazione di
+        filtri (hash, perché il testo libero non è una chiave di cache valida).
+        """
+        if not self._filters:
+            return ()
+        raw = '&'.join(f'{name}={value}' for name, value, _, _ in self._filters)
+        return (hashlib.md5(raw.encode()).hexdigest(),)
 
 
 class HistoryService:
+    # Numero di prenotazioni mostrate per pagina nello storico
+    PAGE_SIZE = 50
+    # Righe lette dal DB per ogni blocco durante l'export in streaming
+    EXPORT_CHUNK_SIZE = 2000
+    # Campi esportati (CSV/NDJSON), nello stesso ordine delle colonne
+    EXPORT_FIELDS = ('id', 'date', 'time', 'client_name', 'client_email', 'service', 'notes')
+
+    @staticmethod
+    def history_sources(professional):
+        """
+        Le sorgenti dello storico del professionista: booking in tabella e booking
+        archiviate (ArchivedBooking). Entrambe ordinate dalla più recente alla più
+        vecchia (id come tie-breaker) sul rispettivo indice, con il servizio
+        caricato nella stessa query (il template ne mostra il nome).
+        """
+        return [
+            model.objects.filter(professional=professional).select_related('service').order_by('-date', '-time', '-id')
+            for model in (Booking, ArchivedBooking)
+        ]
+
+    @staticmethod
+    def query(professional):
+        """Query builder dei filtri dello storico (vedi HistoryQuery)."""
+        return HistoryQuery(professional)
+
+    @staticmethod
+    def _position(booking):
+        # Le occorrenze ricorrenti non hanno id: a parità di slot vengono dopo le booking
+        return booking.date, booking.time, booking.id or 0
+
+    @classmethod
+    def merge(cls, sources, key=None):
+        """
+        Fusione ordinata e pigra di sorgenti già ordinate per (-date, -time, -id):
+        legge dalle sorgenti solo quando serve e tiene in memoria una riga per
+        ciascuna. Gli id non si ripetono (l'archivio conserva quello originale).
+        """
+        return heapq.merge(*sources, key=key or cls._position, reverse=True)
+
+    @classmethod
+    def get_professional_history(cls, professional, chunk_size=None):
+        """
+        Storico completo delle prenotazioni del professionista loggato, passate
+        (anche archiviate) e future, dalla più recente alla più vecchia.
+        Iteratore pigro sulle due sorgenti, lette a blocchi dal DB.
+        """
+        chunk_size = chunk_size or cls.EXPORT_CHUNK_SIZE
+        return cls.merge([source.iterator(chunk_size=chunk_size) for source in cls.history_sources(professional)])
+
+    @staticmethod
+    def encode_cursor(booking):
+        """Cursore opaco (per l'URL) che identifica la posizione di una booking nello storico."""
+        raw = f"{booking.date.isoformat()}|{booking.time.isoformat()}|{booking.id or 0}"
+        return base64.urlsafe_b64encode(raw.encode()).decode().rstrip('=')
+
+    @staticmethod
+    def decode_cursor(cursor):
+        """
+        Decodifica un cursore generato da encode_cursor.
+        Ritorna la tupla (date, time, id) oppure None se il cursore non è valido.
+        """
+        try:
+            padded = cursor + '=' * (-len(cursor) % 4)
+            raw_date, raw_time, raw_id = base64.urlsafe_b64decode(padded).decode().split('|')
+            return date.fromisoformat(raw_date), time.fromisoformat(raw_time), int(raw_id)
+        except (ValueError, UnicodeDecodeError):
+            return None
+
+    @classmethod
+    def get_history_page(cls, professional, cursor=None, page_size=None, query=None):
+        """
+        Una pagina dello storico con paginazione keyset su (-date, -time, -id).
+        A differenza di OFFSET il costo non cresce con il numero di pagina:
+        la query riparte sempre dall'ultima booking vista, usando l'indice.
+        Ritorna la lista delle booking e il cursore della pagina successiva (o None).
+        Le occorrenze degli appuntamenti ricorrenti (fino a HISTORY_HORIZON_DAYS
+        da oggi) entrano come terza sorgente, espanse solo per la pagina.
+        Con `query` (HistoryService.query) la pagina è filtrata.
+        """
+        query = query or cls.query(professional)
+        recurrences = RecurrenceService.load(professional, end=cls._recurring_horizon())
+        return cls.paginate(query.sources(), cursor, page_size, recurrences, query)
+
+    @classmethod
+    async def _aget_history_page(cls, professional, cursor=None, page_size=None, query=None):
+        query = query or cls.query(professional)
+        recurrences = await RecurrenceService.aload(professional, end=cls._recurring_horizon())
+        return await cls.apaginate(query.sources(), cursor, page_size, recurrences, query)
+
     @staticmethod
-    def get_professional_history(professional):
+    def _recurring_horizon():
+        return date.today() + timedelta(days=RecurrenceService.HISTORY_HORIZON_DAYS)
+
+    @classmethod
+    def _occurrence_page(cls, recurrences, cursor, page_size, query=None):
+        """
+        Occorrenze ricorrenti successive al cursore (al più page_size + 1), dalla
+        più recente: il generatore parte dalla data del cursore e si ferma appena
+        la pagina è piena, qualunque sia la durata della regola. L'intervallo
+        di date della query restringe l'espansione, gli altri filtri scartano
+        le occorrenze che non corrispondono.
+        """
+        position = cls.decode_cursor(cursor) if cursor else None
+        start, end = date.min, cls._recurring_horizon()
+        if position:
+            end = min(end, position[0])
+        if query is not None:
+            start = query.date_from or start
+            end = min(end, query.date_to or end)
+        occurrences = RecurrenceService.expand(recurrences, start, end, reverse=True)
+        if position:
+            occurrences = (occurrence for occurrence in occurrences if cls._position(occurrence) < position)
+        if query is not None and query.is_filtered:
+            occurrences = filter(query.matches, occurrences)
+        return list(itertools.islice(occurrences, page_size + 1))
+
+    @classmethod
+    def _after_cursor(cls, bookings, cursor):
+        """Filtro keyset: solo le booking successive alla posizione del cursore."""
+        position = cls.decode_cursor(cursor) if cursor else None
+        if not position:
+            return bookings
+        last_date, last_time, last_id = position
+        return bookings.filter(
+            Q(date__lt=last_date)
+            | Q(date=last_date, time__lt=last_time)
+            | Q(date=last_date, time=last_time, id__lt=last_id)
+        )
+
+    @classmethod
+    def _page_result(cls, page, page_size):
+        """Dalla lista letta (page_size + 1 righe) ricava pagina e cursore successivo."""
+        next_cursor = None
+        if len(page) > page_size:
+            page = page[:page_size]
+            next_cursor = cls.encode_cursor(page[-1])
+        return {'bookings': page, 'next_cursor': next_cursor}
+
+    @staticmethod
+    def _sources(bookings):
+        return [bookings] if isinstance(bookings, QuerySet) else list(bookings)
+
+    @classmethod
+    def _merge_page(cls, pages, page_size):
+        return list(itertools.islice(cls.merge(pages), page_size + 1))
+
+    @classmethod
+    def paginate(cls, bookings, cursor=None, page_size=None, recurrences=None, query=None):
+        """
+        Paginazione keyset di un queryset di booking già ordinato per (-date, -time, -id),
+        eventualmente filtrato (es. dalle API), o di una lista di queryset così
+        ordinati (history_sources): da ognuno si legge al più una pagina e le
+        pagine si fondono. Con `recurrences` (RecurrenceService.load) anche le
+        occorrenze ricorrenti, filtrate con `query`.
+        """
+        page_size = page_size or cls.PAGE_SIZE
+        # Leggo una riga in più solo per sapere se esiste una pagina successiva
+        pages = [list(cls._after_cursor(source, cursor)[:page_size + 1]) for source in cls._sources(bookings)]
+        if recurrences:
+            pages.append(cls._occurrence_page(recurrences, cursor, page_size, query))
+        return cls._page_result(cls._merge_page(pages, page_size), page_size)
+
+    @classmethod
+    async def apaginate(cls, bookings, cursor=None, page_size=None, recurrences=None, query=None):
+        """Versione async di paginate (async for sui queryset)."""
+        page_size = page_size or cls.PAGE_SIZE
+        pages = [
+            [booking async for booking in cls._after_cursor(source, cursor)[:page_size + 1]]
+            for source in cls._sources(bookings)
+        ]
+        if recurrences:
+            pages.append(cls._occurrence_page(recurrences, cursor, page_size, query))
+        return cls._page_result(cls._merge_page(pages, page_size), page_size)
+
+    @classmethod
+    def get_cached_history_page(cls, professional, cursor=None, query=None):
+        """
+        Come get_history_page, servita dalla ProfessionalCache (una voce per
+        cursore e combinazione di filtri).
+        """
+        # Cursori non validi equivalgono alla prima pagina: non creo voci in cache per ciascuno
+        if cursor and not cls.decode_cursor(cursor):
+            cursor = None
+        key = (cursor or '', *(query.cache_key() if query else ()))
+        return ProfessionalCache.get_or_set(
+            'history', professional.id, key,
+            lambda: cls.get_history_page(professional, cursor=cursor, query=query),
+        )
+
+    @classmethod
+    async def aget_cached_history_page(cls, professional, cursor=None, query=None):
+        """Versione async di get_cached_history_page (stesse voci di cache)."""
+        if cursor and not cls.decode_cursor(cursor):
+            cursor = None
+        key = (cursor or '', *(query.cache_key() if query else ()))
+        return await ProfessionalCache.aget_or_set(
+            'history', professional.id, key,
+            lambda: cls._aget_history_page(professional, cursor, query=query),
+        )
+
+    @classmethod
+    def iter_professional_history(cls, professional, chunk_size=None, using=None):
         """
-        Storico completo delle prenotazioni del professionista loggato.
-        Mostra tutte le booking (passate e future) ordinate dalla più recente alla più vecchia.
+        Itera su tutto lo storico a memoria costante (per l'export):
+        restituisce tuple nell'ordine di EXPORT_FIELDS, lette a blocchi dal DB
+        e fuse tra booking e archivio. `using` fissa il database da cui leggere
+        (la lettura avviene dopo la fine della vista, vedi routers.read_alias).
         """
-        return Booking.objects.filter(
-            professional=professional
-        ).order_by('-date', '-time')  # più recenti in alto
+        lookups = ServiceCatalogService.value_lookups(cls.EXPORT_FIELDS)
+        chunk_size = chunk_size or cls.EXPORT_CHUNK_SIZE
+        rows = [
+            source.using(using).values_list(*lookups).iterator(chunk_size=chunk_size)
+            for source in cls.history_sources(professional)
+        ]
+        position = [cls.EXPORT_FIELDS.index(field) for field in ('date', 'time', 'id')]
+        return cls.merge(rows, key=lambda row: tuple(row[index] for index in position))
@@ -0,0 +1,219 @@
+import itertools
+import time
+import uuid
+from datetime import date, timedelta
+
+from django.db import transaction
+from django.db.models import Exists, OuterRef, Q
+from django.template import engines
+
+from core.models import Booking, NotificationLedger, OutboundEmail, RecurrenceException, RecurringBooking
+from core.services.email_service import EmailOutboxService
+from core.services.recurrence_service import Occurrence, RecurrenceService
+
+
+class NotificationService:
+    """
+    Notifiche email renderizzate da template testuali in core/templates/core/emails/
+    (la prima riga è l'oggetto, il resto il corpo).
+    I template vengono compilati una sola volta per processo e riusati per
+    ogni messaggio: il rendering di un blocco di promemoria non rilegge né
+    ricompila nulla.
+    """
+    TEMPLATE_DIR = 'core/emails'
+    # Booking lette, renderizzate e accodate per ogni blocco dello scheduler
+    BATCH_SIZE = 500
+
+    _compiled = {}
+
+    @classmethod
+    def get_template(cls, kind):
+        """Template compilato (in cache a livello di classe) per il tipo di notifica."""
+        template = cls._compiled.get(kind)
+        if template is None:
+            template = engines['django'].get_template(f'{cls.TEMPLATE_DIR}/{kind}.txt')
+            cls._compiled[kind] = template
+        return template
+
+    @classmethod
+    def render(cls, kind, context):
+        """Ritorna (oggetto, corpo) della notifica `kind` per il contesto dato."""
+        subject, _, body = cls.get_template(kind).render(context).lstrip().partition('\n')
+        return subject.strip(), body.strip() + '\n'
+
+    # --- notifiche della prenotazione ------------------------------------------
+
+    @classmethod
+    def enqueue_booking_created(cls, booking):
+        """
+        Accoda (on_commit) la notifica al professionista, se ha un'email,
+        e la conferma al cliente. Professional e user devono essere già caricati.
+        """
+        professional = booking.professional
+        context = {'booking': booking, 'professional': professional}
+        if professional.user.email:
+            EmailOutboxService.enqueue(*cls.render('booking_professional', context), professional.user.email)
+        EmailOutboxService.enqueue(*cls.render('booking_client', context), booking.client_email)
+
+    @classmethod
+    def enqueue_cancellations(cls, bookings):
+        """
+        Avviso di annullamento al cliente per un blocco di booking (con
+        professionista e servizio già caricati): un solo bulk_create
+        nell'outbox, nella transazione di chi cancella.
+        """
+        emails = []
+        for booking in bookings:
+            subject, body = cls.render(
+                'booking_cancelled', {'booking': booking, 'professional': booking.professional},
+            )
+            emails.append(OutboundEmail(subject=subject, body=body, to=booking.client_email))
+        OutboundEmail.objects.bulk_create(emails, batch_size=cls.BATCH_SIZE)
+
+    # --- promemoria -------------------------------------------------------------
+
+    @staticmethod
+    def reminder_candidates(day):
+        """
+        Booking del giorno `day` senza promemoria già registrato: una sola query
+        sull'indice (date, time), con professionista e servizio in JOIN.
+        """
+        already_sent = NotificationLedger.objects.filter(
+            booking=OuterRef('pk'), kind=NotificationLedger.KIND_REMINDER,
+        )
+        return (
+            Booking.objects.filter(date=day)
+            .exclude(Exists(already_sent))
+            .select_related('professional', 'service')
+            .order_by('date', 'time', 'id')
+        )
+
+    @classmethod
+    def _claim(cls, bookings, run_id):
+        """
+        Registra nel ledger le booking del blocco e ritorna solo quelle registrate
+        da questa esecuzione: se un altro scheduler le ha già prese, il vincolo
+        univoco scarta le nostre righe (ignore_conflicts) e non vengono accodate.
+        """
+        NotificationLedger.objects.bulk_create([
+            NotificationLedger(booking=booking, kind=NotificationLedger.KIND_REMINDER, run_id=run_id)
+            for booking in bookings
+        ], ignore_conflicts=True)
+        claimed = set(
+            NotificationLedger.objects.filter(
+                run_id=run_id, booking__in=bookings,
+            ).values_list('booking_id', flat=True)
+        )
+        return [booking for booking in bookings if booking.id in claimed]
+
+    @staticmethod
+    def reminder_occurrences(day):
+        """
+        Occorrenze ricorrenti del giorno `day` senza promemoria già registrato.
+        Le regole attive quel giorno, non annullate né già avvisate, si leggono
+        con una query; se la data cade davvero nella serie lo decide RecurrenceService.
+        """
+        already_sent = NotificationLedger.objects.filter(
+            rule=OuterRef('pk'), date=day, kind=NotificationLedger.KIND_REMINDER,
+        )
+        cancelled = RecurrenceException.objects.filter(rule=OuterRef('pk'), date=day)
+        rules = (
+            RecurringBooking.objects.filter(start_date__lte=day)
+            .filter(Q(until__isnull=True) | Q(until__gte=day))
+            .exclude(Exists(already_sent))
+            .exclude(Exists(cancelled))
+            .select_related('professional', 'service')
+            .order_by('time', 'id')
+        )
+        for rule in rules.iterator(chunk_size=NotificationService.BATCH_SIZE):
+            if RecurrenceService.occurs_on(rule, day):
+                occurrence = Occurrence(
+                    rule.id, rule.professional_id, day, rule.time, rule.client_name, rule.client_email,
+                    rule.service, rule.notes,
+                )
+                yield occurrence, rule.professional
+
+    @classmethod
+    def _claim_occurrences(cls, occurrences, run_id):
+        """Come _claim, per le occorrenze ricorrenti: il ledger le identifica con (regola, data)."""
+        NotificationLedger.objects.bulk_create([
+            NotificationLedger(
+                rule_id=occurrence.rule_id, date=occurrence.date, kind=NotificationLedger.KIND_REMINDER,
+                run_id=run_id,
+            )
+            for occurrence, _ in occurrences
+        ], ignore_conflicts=True)
+        claimed = set(
+            NotificationLedger.objects.filter(
+                run_id=run_id, rule_id__in=[occurrence.rule_id for occurrence, _ in occurrences],
+            ).values_list('rule_id', flat=True)
+        )
+        return [(occurrence, professional) for occurrence, professional in occurrences
+                if occurrence.rule_id in claimed]
+
+    @classmethod
+    def _queue_reminders(cls, claimed, batch_size):
+        emails = []
+        for booking, professional in claimed:
+            subject, body = cls.render('reminder', {'booking': booking, 'professional': professional})
+            emails.append(OutboundEmail(subject=subject, body=body, to=booking.client_email))
+        OutboundEmail.objects.bulk_create(emails, batch_size=batch_size)
+
+    @classmethod
+    def schedule_reminders(cls, day=None, batch_size=None, send=True, on_batch=None):
+        """
+        Promemoria per le booking e le occorrenze ricorrenti di `day` (default: domani).
+        Per ogni blocco di batch_size booking, in una transazione: registrazione
+        nel ledger, rendering con il template già compilato e bulk_create nell'outbox.
+        Con send=True l'outbox viene poi svuotata subito (stessa connessione SMTP
+        per ogni batch); altrimenti ci pensa il worker send_outbox.
+        Ritorna le metriche: appuntamenti selezionati, accodate, saltate, inviate,
+        fallite, secondi e messaggi al secondo (rendering+accodamento e invio).
+        """
+        day = day or date.today() + timedelta(days=1)
+        batch_size = batch_size or cls.BATCH_SIZE
+        run_id = uuid.uuid4()
+        stats = {
+            'date': day.isoformat(), 'selected': 0, 'queued': 0, 'skipped': 0,
+            'sent': 0, 'failed': 0, 'queue_seconds': 0.0, 'send_seconds': 0.0,
+        }
+
+        started = time.monotonic()
+        bookings = cls.reminder_candidates(day).iterator(chunk_size=batch_size)
+        occurrences = cls.reminder_occurrences(day)
+        sources = [
+            (bookings, lambda chunk: [(booking, booking.professional) for booking in cls._claim(chunk, run_id)]),
+            (occurrences, lambda chunk: cls._claim_occurrences(chunk, run_id)),
+        ]
+        for source, claim in sources:
+            while True:
+                chunk = list(itertools.islice(source, batch_size))
+                if not chunk:
+                    break
+                with transaction.atomic():
+                    claimed = claim(chunk)
+                    cls._queue_reminders(claimed, batch_size)
+                stats['selected'] += len(chunk)
+                stats['queued'] += len(claimed)
+                stats['skipped'] += len(chunk) - len(claimed)
+                if on_batch:
+                    on_batch(stats)
+        stats['queue_seconds'] = time.monotonic() - started
+
+        if send:
+            started = time.monotonic()
+            while True:
+                sent, failed = EmailOutboxService.send_pending()
+                stats['sent'] += sent
+                stats['failed'] += failed
+                if EmailOutboxService.queue_drained(sent, failed, EmailOutboxService.BATCH_SIZE):
+                    break
+            stats['send_seconds'] = time.monotonic() - started
+
+        stats['queued_per_second'] = cls._rate(stats['queued'], stats['queue_seconds'])
+        stats['sent_per_second'] = cls._rate(stats['sent'], stats['send_seconds'])
+        return stats
+
+    @staticmethod
+    def _rate(count, seconds):
+        return round(count / seconds, 1) if seconds else 0.0
@@ -0,0 +1,102 @@
+import hashlib
+
+from django.core.cache import cache
+from django.http import HttpResponse
+from django.utils.cache import get_conditional_response, patch_cache_control
+from django.utils.http import http_date
+
+
+class PageCacheService:
+    """
+    Cache HTTP delle pagine pubbliche (home, prenotazione, conferma).
+
+    - GET condizionale: ogni vista calcola ETag (hash di ciò che determina la
+      pagina) e Last-Modified (dagli updated_at di Professional e Booking); se
+      la copia del client è ancora valida risponde 304 senza renderizzare.
+    - Pagine intere: l'HTML si salva nel cache framework con chiave derivata
+      dall'ETag, quindi una modifica (ETag nuovo) rende irraggiungibile la
+      copia precedente senza invalidazioni esplicite.
+
+    Le pagine con il token CSRF nel form cambiano con il cookie del client:
+    il cookie entra nell'ETag (csrf_part) e non si salvano mai intere.
+    """
+    KEY_PREFIX = 'page'
+    DEFAULT_TIMEOUT = 60 * 10
+    # Quanto proxy e browser possono riusare una pagina pubblica senza rivalidarla
+    PUBLIC_MAX_AGE = 60
+
+    @staticmethod
+    def etag(*parts):
+        """ETag forte dalle parti che determinano il contenuto della pagina."""
+        digest = hashlib.md5(':'.join(str(part) for part in parts).encode()).hexdigest()
+        return f'"{digest}"'
+
+    @staticmethod
+    def csrf_part(request):
+        """
+        Segreto CSRF del client (dal cookie, o quello appena generato dal
+        rendering): va nell'ETag delle pagine che contengono {% csrf_token %}.
+        """
+        return request.META.get('CSRF_COOKIE', '')
+
+    @staticmethod
+    def not_modified(request, etag=None, last_modified=None):
+        """Risposta 304 se If-None-Match / If-Modified-Since sono ancora validi, altrimenti None."""
+        timestamp = int(last_modified.timestamp()) if last_modified else None
+        return get_conditional_response(request, etag=etag, last_modified=timestamp)
+
+    @classmethod
+    def set_validators(cls, response, etag=None, last_modified=None, private=False):
+        """
+        ETag, Last-Modified e Cache-Control sulla risposta (anche sui 304).
+        private=True per le pagine legate al client (cookie CSRF, dati della
+        prenotazione): solo il browser le conserva e le rivalida ad ogni uso.
+        """
+        if etag:
+            response['ETag'] = etag
+        if last_modified:
+            response['Last-Modified'] = http_date(last_modified.timestamp())
+        if private:
+            patch_cache_control(response, private=True, no_cache=True)
+        else:
+            patch_cache_control(response, public=True, max_age=cls.PUBLIC_MAX_AGE)
+        return response
+
+    # --- pagine intere ----------------------------------------------------------
+
+    @classmethod
+    def _key(cls, etag):
+        digest = etag.strip('"')
+        return f'{cls.KEY_PREFIX}:{digest}'
+
+    @staticmethod
+    def _to_response(entry):
+        if entry is None:
+            return None
+        content, content_type = entry
+        return HttpResponse(content, content_type=content_type)
+
+    @staticmethod
+    def _entry(response):
+        return response.content, response['Content-Type']
+
+    @classmethod
+    def get(cls, etag):
+        """Pagina salvata per questo ETag, come HttpResponse nuova (o None)."""
+        return cls._to_response(cache.get(cls._key(etag)))
+
+    @classmethod
+    def set(cls, etag, response, timeout=None):
+        if response.status_code == 200:
+            cache.set(cls._key(etag), cls._entry(response), timeout or cls.DEFAULT_TIMEOUT)
+
+    @classmethod
+    async def aget(cls, etag):
+        """Versione async di get."""
+        return cls._to_response(await cache.aget(cls._key(etag)))
+
+    @classmethod
+    async def aset(cls, etag, response, timeout=None):
+        """Versione async di set."""
+        if response.status_code == 200:
+            await cache.aset(cls._key(etag), cls._entry(response), timeout or cls.DEFAULT_TIMEOUT)
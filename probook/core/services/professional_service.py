@@ -1,6 +1,10 @@
-from datetime import date
+import heapq
+from datetime import date, timedelta
 from django.utils import timezone
 from core.models import Booking
+from core.services.cache_service import ProfessionalCache
+from core.services.recurrence_service import RecurrenceService
+from core.services.stats_service import BookingStatsService
 
 
 class ProfessionalService:
@@ -14,35 +18,90 @@ class ProfessionalService:
         - conteggio prenotazioni di oggi
         - prossima prenotazione in agenda
         - totale prenotazioni registrate (per le card in alto).
+
+        Le card vengono lette con un'unica query sul rollup BookingDailyStat,
+        la tabella con una seconda query, più quella delle regole ricorrenti:
+        le loro occorrenze dei prossimi RecurrenceService.DASHBOARD_DAYS giorni
+        entrano in tabella (non nei contatori, che contano le booking registrate).
         """
-        today = date.today()
-        now = timezone.localtime().time()
+        stats = ProfessionalService._get_daily_stats(professional, date.today())
+        return ProfessionalService._with_next_booking(stats)
 
-        # Tutte le prenotazioni del professionista, ordinate cronologicamente
-        all_bookings = Booking.objects.filter(
-            professional=professional
-        ).order_by('date', 'time')
-        total_bookings = all_bookings.count()
+    @staticmethod
+    def get_cached_dashboard_stats(professional):
+        """
+        Come get_dashboard_stats, ma servita dalla ProfessionalCache.
+        In cache va solo la parte che dipende dalla data (valida fino a mezzanotte
+        o al prossimo cambiamento delle booking); la prossima prenotazione dipende
+        dall'ora corrente ed è ricalcolata ad ogni richiesta, senza query.
+        """
+        stats = ProfessionalCache.get_or_set(
+            'dashboard', professional.id, (),
+            lambda: ProfessionalService._get_daily_stats(professional, date.today()),
+            day_scoped=True,
+        )
+        return ProfessionalService._with_next_booking(stats)
 
-        # Prenotazioni future (usate nella tabella principale della dashboard)
-        future_bookings = all_bookings.filter(date__gte=today)
+    @staticmethod
+    async def aget_cached_dashboard_stats(professional):
+        """Versione async di get_cached_dashboard_stats (ORM e cache async)."""
+        stats = await ProfessionalCache.aget_or_set(
+            'dashboard', professional.id, (),
+            lambda: ProfessionalService._aget_daily_stats(professional, date.today()),
+            day_scoped=True,
+        )
+        return ProfessionalService._with_next_booking(stats)
+
+    @staticmethod
+    def _future_bookings(professional, today):
+        """Prenotazioni da oggi in poi, in ordine di agenda (tabella della dashboard)."""
+        return Booking.objects.filter(
+            professional=professional, date__gte=today,
+        ).select_related('service').order_by('date', 'time')
+
+    @staticmethod
+    def _recurring_window(today):
+        return today, today + timedelta(days=RecurrenceService.DASHBOARD_DAYS - 1)
 
-        # Prenotazioni di oggi (per la card "Prenotazioni di oggi")
-        todays_bookings = all_bookings.filter(date=today)
+    @staticmethod
+    def _agenda(bookings, recurrences, today):
+        """Booking future e occorrenze ricorrenti della finestra, fuse in ordine di agenda."""
+        occurrences = RecurrenceService.expand(recurrences, *ProfessionalService._recurring_window(today))
+        return list(heapq.merge(bookings, occurrences, key=lambda booking: (booking.date, booking.time)))
 
-        # Prossima prenotazione:
-        # - prima cerco oggi, a partire dall'ora corrente
-        # - se non c'è nulla oggi, prendo la prima dei giorni successivi
-        next_booking = future_bookings.filter(
-            date=today, time__gte=now
-        ).first() or future_bookings.filter(
-            date__gt=today
-        ).first()
+    @staticmethod
+    def _get_daily_stats(professional, today):
+        """Contatori e tabella delle prenotazioni future: dipendono solo dalla data."""
+        recurrences = RecurrenceService.load(professional, *ProfessionalService._recurring_window(today))
+        return {
+            # Prenotazioni future (tabella "Prenotazioni in arrivo"), valutate subito
+            # così la prossima prenotazione si ricava senza altre query
+            'bookings': ProfessionalService._agenda(
+                ProfessionalService._future_bookings(professional, today), recurrences, today,
+            ),
+            # Contatori delle card dal rollup giornaliero: O(giorni), non O(booking)
+            **BookingStatsService.counters(professional, today),
+        }
 
+    @staticmethod
+    async def _aget_daily_stats(professional, today):
+        future_bookings = [booking async for booking in ProfessionalService._future_bookings(professional, today)]
+        recurrences = await RecurrenceService.aload(professional, *ProfessionalService._recurring_window(today))
         return {
-            'bookings': future_bookings,        # usate nella tabella "Prenotazioni in arrivo"
-            'future_count': future_bookings.count(),
-            'today_count': todays_bookings.count(),
-            'next_booking': next_booking,
-            'total_bookings': total_bookings,
+            'bookings': ProfessionalService._agenda(future_bookings, recurrences, today),
+            **await BookingStatsService.acounters(professional, today),
         }
+
+    @staticmethod
+    def _with_next_booking(stats):
+        """
+        Prossima prenotazione: la prima di oggi a partire dall'ora corrente,
+        altrimenti la prima dei giorni successivi (la lista è già ordinata).
+        """
+        today = date.today()
+        now = timezone.localtime().time()
+        next_booking = next(
+            (b for b in stats['bookings'] if b.date > today or b.time >= now),
+            None,
+        )
+        return {**stats, 'next_booking': next_booking}
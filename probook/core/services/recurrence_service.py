@@ -0,0 +1,254 @@
+import heapq
+from dataclasses import dataclass
+from datetime import date, time, timedelta
+
+from django.db.models import Q
+
+from core.models import Booking, RecurrenceException, RecurringBooking, Service
+
+
+@dataclass(frozen=True)
+class Occurrence:
+    """
+    Occorrenza "virtuale" di un RecurringBooking: non ha una riga in Booking
+    ma ne espone gli stessi attributi, così template, serializer e griglia di
+    disponibilità la trattano come una prenotazione.
+    """
+    rule_id: int
+    professional_id: int
+    date: date
+    time: object
+    client_name: str
+    client_email: str
+    service: Service
+    notes: str
+    id = None
+    is_recurring = True
+
+    @property
+    def service_id(self):
+        return self.service.id
+
+
+class RecurrenceService:
+    """
+    Espansione pigra delle regole ricorrenti (sottoinsieme di RRULE: FREQ
+    DAILY/WEEKLY/MONTHLY, INTERVAL, COUNT, UNTIL).
+
+    L'occorrenza n-esima si calcola in O(1) dalla data di inizio, quindi per
+    una finestra [start, end] si salta subito alla prima occorrenza utile e
+    si generano solo quelle della finestra, senza materializzare righe: le
+    liste a finestra limitata (dashboard, disponibilità) e lo storico a
+    cursore leggono una regola infinita a costo costante.
+    """
+    # Occorrenze mostrate nella tabella "in arrivo" della dashboard
+    DASHBOARD_DAYS = 28
+    # Lo storico mostra le occorrenze fino a questo orizzonte (le regole senza fine non hanno un "più recente")
+    HISTORY_HORIZON_DAYS = 90
+    # Conflitti tra regole cercati entro questo orizzonte
+    CONFLICT_HORIZON_DAYS = 366
+    # Giorno del mese massimo per FREQ=MONTHLY: ogni mese ha l'occorrenza e l'indice resta aritmetico
+    MAX_MONTHLY_DAY = 28
+
+    # --- aritmetica delle occorrenze --------------------------------------------
+
+    @staticmethod
+    def _add_months(day, months):
+        month = day.month - 1 + months
+        return day.replace(year=day.year + month // 12, month=month % 12 + 1)
+
+    @classmethod
+    def nth_date(cls, rule, index):
+        """Data dell'occorrenza `index` (0 = start_date), senza limiti di COUNT/UNTIL."""
+        if rule.frequency == RecurringBooking.FREQ_MONTHLY:
+            return cls._add_months(rule.start_date, index * rule.interval)
+        step = 7 if rule.frequency == RecurringBooking.FREQ_WEEKLY else 1
+        return rule.start_date + timedelta(days=index * step * rule.interval)
+
+    @staticmethod
+    def _months_between(first, second):
+        return (second.year - first.year) * 12 + second.month - first.month
+
+    @classmethod
+    def _index_at_or_before(cls, rule, day):
+        """Indice dell'ultima occorrenza con data <= day (-1 se day precede l'inizio)."""
+        if day < rule.start_date:
+            return -1
+        if rule.frequency == RecurringBooking.FREQ_MONTHLY:
+            index = cls._months_between(rule.start_date, day) // rule.interval
+            return index if cls.nth_date(rule, index) <= day else index - 1
+        step = (7 if rule.frequency == RecurringBooking.FREQ_WEEKLY else 1) * rule.interval
+        return (day - rule.start_date).days // step
+
+    @classmethod
+    def _last_index(cls, rule):
+        """Indice dell'ultima occorrenza per COUNT/UNTIL (None = senza fine)."""
+        limits = []
+        if rule.count is not None:
+            limits.append(rule.count - 1)
+        if rule.until is not None:
+            limits.append(cls._index_at_or_before(rule, rule.until))
+        return min(limits) if limits else None
+
+    @classmethod
+    def dates(cls, rule, start, end, reverse=False):
+        """Date delle occorrenze in [start, end], in ordine (decrescente con reverse)."""
+        first = 0 if start <= rule.start_date else cls._index_at_or_before(rule, start - timedelta(days=1)) + 1
+        last = cls._index_at_or_before(rule, end)
+        limit = cls._last_index(rule)
+        if limit is not None:
+            last = min(last, limit)
+        indexes = range(last, first - 1, -1) if reverse else range(first, last + 1)
+        return (cls.nth_date(rule, index) for index in indexes)
+
+    @classmethod
+    def occurs_on(cls, rule, day):
+        index = cls._index_at_or_before(rule, day)
+        limit = cls._last_index(rule)
+        return index >= 0 and (limit is None or index <= limit) and cls.nth_date(rule, index) == day
+
+    # --- lettura ------------------------------------------------------------------
+
+    @staticmethod
+    def _rules(professional, start=None, end=None):
+        rules = RecurringBooking.objects.filter(professional=professional).select_related('service')
+        if end is not None:
+            rules = rules.filter(start_date__lte=end)
+        if start is not None:
+            rules = rules.filter(Q(until__isnull=True) | Q(until__gte=start))
+        return rules
+
+    @staticmethod
+    def _exceptions(rules, start=None, end=None):
+        exceptions = RecurrenceException.objects.filter(rule__in=[rule.id for rule in rules])
+        if start is not None:
+            exceptions = exceptions.filter(date__gte=start)
+        if end is not None:
+            exceptions = exceptions.filter(date__lte=end)
+        return exceptions.values_list('rule_id', 'date')
+
+    @classmethod
+    def load(cls, professional, start=None, end=None):
+        """
+        Regole del professionista attive in [start, end] e date annullate, per
+        expand(). La query delle eccezioni parte solo se ci sono regole.
+        """
+        rules = list(cls._rules(professional, start, end))
+        exceptions = set(cls._exceptions(rules, start, end)) if rules else set()
+        return rules, exceptions
+
+    @classmethod
+    async def aload(cls, professional, start=None, end=None):
+        """Versione async di load."""
+        rules = [rule async for rule in cls._rules(professional, start, end)]
+        exceptions = {row async for row in cls._exceptions(rules, start, end)} if rules else set()
+        return rules, exceptions
+
+    @classmethod
+    def expand(cls, recurrences, start, end, reverse=False):
+        """
+        Generatore delle occorrenze in [start, end] di tutte le regole (da
+        load/aload), fuse in ordine di (data, ora) e senza le date annullate.
+        """
+        rules, exceptions = recurrences
+        # Un generatore per regola, creato da una funzione: in un'espressione annidata
+        # `rule` verrebbe letto solo al consumo, cioè sempre l'ultima regola
+        streams = [cls._stream(rule, exceptions, start, end, reverse) for rule in rules]
+        return heapq.merge(*streams, key=lambda occurrence: (occurrence.date, occurrence.time), reverse=reverse)
+
+    @classmethod
+    def _stream(cls, rule, exceptions, start, end, reverse):
+        for day in cls.dates(rule, start, end, reverse):
+            if (rule.id, day) not in exceptions:
+                yield Occurrence(
+                    rule.id, rule.professional_id, day, rule.time, rule.client_name, rule.client_email,
+                    rule.service, rule.notes,
+                )
+
+    @classmethod
+    def occurrences(cls, professional, start, end):
+        """Occorrenze del professionista in [start, end], in ordine di agenda."""
+        return cls.expand(cls.load(professional, start, end), start, end)
+
+    # --- conflitti ----------------------------------------------------------------
+
+    @staticmethod
+    def minutes(at):
+        """Orario -> minuti dalla mezzanotte."""
+        return at.hour * 60 + at.minute
+
+    @staticmethod
+    def clock(minutes):
+        """Minuti dalla mezzanotte -> orario, limitato all'interno della giornata."""
+        minutes = min(max(minutes, 0), 24 * 60 - 1)
+        return time(minutes // 60, minutes % 60)
+
+    @classmethod
+    def overlaps(cls, first_at, first_length, second_at, second_length):
+        """True se gli intervalli [inizio, inizio + durata) di due appuntamenti dello stesso giorno si toccano."""
+        first, second = cls.minutes(first_at), cls.minutes(second_at)
+        return first < second + second_length and second < first + first_length
+
+    @staticmethod
+    def length(service, slot_minutes):
+        """Durata di un appuntamento: quella del servizio, altrimenti uno slot."""
+        return (service.duration_minutes if service else None) or slot_minutes
+
+    @classmethod
+    def is_occupied(cls, professional, day, at, length):
+        """
+        True se un'occorrenza non annullata di una regola del professionista si
+        sovrappone all'intervallo [at, at + length) del giorno.
+        """
+        rules = RecurringBooking.objects.filter(
+            professional=professional, start_date__lte=day, time__lt=cls.clock(cls.minutes(at) + length),
+        ).filter(Q(until__isnull=True) | Q(until__gte=day)).exclude(exceptions__date=day).select_related('service')
+        return any(
+            cls.overlaps(rule.time, cls.length(rule.service, professional.slot_minutes), at, length)
+            and cls.occurs_on(rule, day)
+            for rule in rules
+        )
+
+    @classmethod
+    def find_conflict(cls, rule, today=None):
+        """
+        Prima data in cui la regola (non ancora salvata) si sovrapporrebbe a un
+        appuntamento: una Booking concreta, oppure un'altra regola entro
+        CONFLICT_HORIZON_DAYS. None se è libera. Le sovrapposizioni tengono
+        conto delle durate dei servizi, non solo dell'ora di inizio.
+        """
+        professional = rule.professional
+        slot_minutes = professional.slot_minutes
+        length = cls.length(rule.service, slot_minutes)
+        # Un appuntamento che inizia prima di rule.time la tocca solo se dura più della distanza:
+        # basta cercare dall'inizio meno la durata più lunga del catalogo
+        longest = max([slot_minutes, *professional.catalog.exclude(duration_minutes=None).values_list(
+            'duration_minutes', flat=True,
+        )])
+        begin = cls.minutes(rule.time)
+        window = {'time__gte': cls.clock(begin - longest + 1), 'time__lt': cls.clock(begin + length)}
+        start = max(rule.start_date, today or date.today())
+        end = start + timedelta(days=cls.CONFLICT_HORIZON_DAYS)
+
+        # Booking esistenti: poche righe (orari vicini, dal primo giorno utile), controllate in O(1) ciascuna
+        booked = Booking.objects.filter(
+            professional_id=rule.professional_id, date__gte=start, **window,
+        ).values_list('date', 'time', 'service__duration_minutes').order_by('date', 'time')
+        if rule.until is not None:
+            booked = booked.filter(date__lte=rule.until)
+        for day, at, duration in booked.iterator():
+            if cls.overlaps(rule.time, length, at, duration or slot_minutes) and cls.occurs_on(rule, day):
+                return day
+
+        others = [
+            other for other in RecurringBooking.objects.filter(
+                professional_id=rule.professional_id, **window,
+            ).exclude(pk=rule.pk).select_related('service')
+            if cls.overlaps(rule.time, length, other.time, cls.length(other.service, slot_minutes))
+        ]
+        if others:
+            exceptions = set(cls._exceptions(others, start, end))
+            for day in cls.dates(rule, start, end):
+                if any(cls.occurs_on(other, day) and (other.id, day) not in exceptions for other in others):
+                    return day
+        return None
@@ -0,0 +1,153 @@
+import heapq
+import itertools
+from datetime import timedelta
+
+from django.db import IntegrityError, transaction
+from django.db.models import Count, F, Q, Sum
+from django.db.models.functions import Coalesce
+
+from core.models import ArchivedBooking, Booking, BookingDailyStat
+
+
+class BookingStatsService:
+    """
+    Rollup giornaliero delle prenotazioni (BookingDailyStat).
+    I signal di Booking chiamano apply() ad ogni creazione, spostamento o
+    cancellazione; le scritture massive (bulk_create, update su queryset) non
+    emettono signal e devono chiamare rebuild() per i professionisti toccati.
+    """
+    REBUILD_BATCH_SIZE = 1000
+    # Giorni mostrati di default nei trend (e massimo consentito)
+    DEFAULT_TREND_DAYS = 30
+    MAX_TREND_DAYS = 366
+
+    @staticmethod
+    def stat_key(booking):
+        """Chiave del rollup a cui appartiene una booking."""
+        return booking.professional_id, booking.date, booking.service_id
+
+    @staticmethod
+    def apply(key, delta):
+        """
+        Somma `delta` (+1 / -1) al contatore di (professional_id, date, service_id).
+        L'UPDATE con F() è atomico nel DB, quindi richieste concorrenti non si
+        perdono incrementi; se la riga non esiste la creo, e se nel frattempo
+        l'ha creata un'altra richiesta (vincolo univoco) ripeto l'UPDATE.
+        """
+        professional_id, day, service_id = key
+        rows = BookingDailyStat.objects.filter(
+            professional_id=professional_id, date=day, service_id=service_id,
+        )
+        if delta < 0:
+            # Un giorno/servizio che resta senza booking non occupa righe
+            deleted, _ = rows.filter(count__lte=-delta).delete()
+            if not deleted:
+                rows.update(count=F('count') + delta)
+            return
+        if rows.update(count=F('count') + delta):
+            return
+        try:
+            with transaction.atomic():
+                BookingDailyStat.objects.create(
+                    professional_id=professional_id, date=day, service_id=service_id, count=delta,
+                )
+        except IntegrityError:
+            rows.update(count=F('count') + delta)
+
+    @classmethod
+    def _grouped_counts(cls, professional=None):
+        """
+        (chiave, numero di booking) per ogni chiave del rollup: le GROUP BY di
+        booking e archivio, ordinate per chiave e lette a blocchi, fuse senza
+        tenerle in memoria (una chiave può comparire in entrambe).
+        """
+        streams = []
+        for model in (Booking, ArchivedBooking):
+            bookings = model.objects.all()
+            if professional is not None:
+                bookings = bookings.filter(professional=professional)
+            rows = bookings.values_list('professional_id', 'date', 'service_id').annotate(
+                count=Count('id'),
+            ).order_by('professional_id', 'date', 'service_id')
+            streams.append(rows.iterator(chunk_size=cls.REBUILD_BATCH_SIZE))
+        key = lambda row: row[:3]
+        for stat_key, rows in itertools.groupby(heapq.merge(*streams, key=key), key=key):
+            yield stat_key, sum(row[3] for row in rows)
+
+    @classmethod
+    def rebuild(cls, professional=None):
+        """
+        Ricalcola il rollup da zero (di un professionista o di tutti) con una
+        GROUP BY sulle booking, archiviate comprese, scritta a blocchi di
+        REBUILD_BATCH_SIZE righe. Ritorna il numero di righe create.
+        """
+        stats = BookingDailyStat.objects.all()
+        if professional is not None:
+            stats = stats.filter(professional=professional)
+
+        created = 0
+        with transaction.atomic():
+            stats.delete()
+            counts = cls._grouped_counts(professional)
+            while True:
+                batch = [
+                    BookingDailyStat(professional_id=professional_id, date=day, service_id=service_id, count=count)
+                    for (professional_id, day, service_id), count in itertools.islice(counts, cls.REBUILD_BATCH_SIZE)
+                ]
+                if not batch:
+                    return created
+                BookingDailyStat.objects.bulk_create(batch)
+                created += len(batch)
+
+    # --- letture ----------------------------------------------------------------
+
+    @staticmethod
+    def _counter_aggregates(today):
+        """Contatori della dashboard come somme condizionali sul rollup."""
+        return {
+            name: Coalesce(Sum('count', filter=condition), 0)
+            for name, condition in (
+                ('total_bookings', None),
+                ('future_count', Q(date__gte=today)),
+                ('today_count', Q(date=today)),
+            )
+        }
+
+    @classmethod
+    def counters(cls, professional, today):
+        """Totale, future e di oggi: una query sul rollup (una riga per giorno e servizio)."""
+        return BookingDailyStat.objects.filter(professional=professional).aggregate(
+            **cls._counter_aggregates(today)
+        )
+
+    @classmethod
+    async def acounters(cls, professional, today):
+        """Versione async di counters."""
+        return await BookingDailyStat.objects.filter(professional=professional).aaggregate(
+            **cls._counter_aggregates(today)
+        )
+
+    @classmethod
+    def trend(cls, professional, start, days, by_service=False):
+        """
+        Prenotazioni per giorno da `start` per `days` giorni (giorni vuoti a zero).
+        Con by_service=True ogni giorno ha il dettaglio {servizio: numero}.
+        Ritorna una lista di dict ordinata per data.
+        """
+        days = min(days, cls.MAX_TREND_DAYS)
+        end = start + timedelta(days=days - 1)
+        rows = BookingDailyStat.objects.filter(
+            professional=professional, date__range=(start, end),
+        ).values_list('date', 'service__name', 'count')
+
+        per_day = {start + timedelta(days=offset): {} for offset in range(days)}
+        for day, service, count in rows:
+            per_day[day][service] = count
+
+        trend = []
+        for day, services in per_day.items():
+            point = {'date': day, 'total': sum(services.values())}
+            if by_service:
+                point['services'] = dict(sorted(services.items()))
+            trend.append(point)
+        return trend
@@ -0,0 +1,141 @@
+import logging
+import math
+import time
+
+from django.conf import settings
+from django.core.cache import cache
+
+logger = logging.getLogger('probook.throttle')
+
+
+class ThrottleService:
+    """
+    Token bucket per ambito (IP del client, professionista) nel cache framework,
+    configurati in settings.PROBOOK_THROTTLE.
+
+    Ogni richiesta costa una get_many e, se passa, una set_many dei bucket
+    coinvolti (più un incr del contatore): O(1), senza toccare il database.
+    Una richiesta respinta non consuma token negli altri bucket, così chi
+    martella da un IP non esaurisce anche il bucket del professionista.
+
+    Lettura e scrittura non sono atomiche: due worker possono far passare
+    insieme la stessa richiesta "di troppo", un errore di pochi token che per
+    un limite anti-abuso è accettabile.
+    """
+    KEY_PREFIX = 'throttle'
+    PERIODS = {'s': 1, 'm': 60, 'h': 60 * 60, 'd': 60 * 60 * 24}
+
+    @staticmethod
+    def config():
+        return getattr(settings, 'PROBOOK_THROTTLE', {})
+
+    @classmethod
+    def enabled(cls):
+        return cls.config().get('ENABLED', False)
+
+    @classmethod
+    def parse_rate(cls, rate):
+        """'10/h' -> (capacità 10, periodo in secondi 3600)."""
+        count, period = rate.split('/')
+        return int(count), cls.PERIODS[period[0]]
+
+    @classmethod
+    def _key(cls, scope, ident):
+        return f'{cls.KEY_PREFIX}:{scope}:{ident}'
+
+    @staticmethod
+    def consume(state, capacity, period, now):
+        """
+        Un passo del token bucket. `state` è (token, istante) oppure None per un
+        bucket pieno; si ricarica di capacity/period token al secondo.
+        Ritorna il nuovo stato e l'attesa in secondi (0 se la richiesta passa).
+        """
+        tokens, updated = state or (capacity, now)
+        tokens = min(capacity, tokens + (now - updated) * capacity / period)
+        if tokens >= 1:
+            return (tokens - 1, now), 0
+        return (tokens, now), (1 - tokens) * period / capacity
+
+    @classmethod
+    def _plan(cls, buckets, states, now):
+        """Stato aggiornato dei bucket, attesa massima e ambito che blocca (o None)."""
+        rates = cls.config().get('RATES', {})
+        updates, wait, blocked, timeout = {}, 0, None, 0
+        for scope, ident in buckets:
+            capacity, period = cls.parse_rate(rates[scope])
+            key = cls._key(scope, ident)
+            updates[key], scope_wait = cls.consume(states.get(key), capacity, period, now)
+            # Dopo un periodo senza richieste il bucket è di nuovo pieno: la voce può scadere
+            timeout = max(timeout, period)
+            if scope_wait > wait:
+                wait, blocked = scope_wait, scope
+        return updates, wait, blocked, timeout
+
+    @classmethod
+    def check(cls, buckets, now=None):
+        """
+        Consuma un token da ciascun bucket [(ambito, identificativo), ...].
+        Ritorna 0 se la richiesta passa, altrimenti i secondi da attendere.
+        """
+        keys = [cls._key(scope, ident) for scope, ident in buckets]
+        now = time.time() if now is None else now
+        updates, wait, blocked, timeout = cls._plan(buckets, cache.get_many(keys), now)
+        if not wait:
+            cache.set_many(updates, timeout)
+        cls._count(cls._counter_key(blocked))
+        cls._log(buckets, blocked, wait)
+        return wait
+
+    @classmethod
+    async def acheck(cls, buckets, now=None):
+        """Versione async di check."""
+        keys = [cls._key(scope, ident) for scope, ident in buckets]
+        now = time.time() if now is None else now
+        updates, wait, blocked, timeout = cls._plan(buckets, await cache.aget_many(keys), now)
+        if not wait:
+            await cache.aset_many(updates, timeout)
+        await cls._acount(cls._counter_key(blocked))
+        cls._log(buckets, blocked, wait)
+        return wait
+
+    @staticmethod
+    def retry_after(wait):
+        """Valore dell'header Retry-After (secondi interi, per eccesso)."""
+        return max(1, math.ceil(wait))
+
+    # --- metriche ---------------------------------------------------------------
+
+    @classmethod
+    def _counter_key(cls, blocked):
+        return f'{cls.KEY_PREFIX}:count:' + (f'rejected:{blocked}' if blocked else 'allowed')
+
+    @staticmethod
+    def _count(key):
+        try:
+            cache.incr(key)
+        except ValueError:
+            cache.add(key, 1, None)
+
+    @staticmethod
+    async def _acount(key):
+        try:
+            await cache.aincr(key)
+        except ValueError:
+            await cache.aadd(key, 1, None)
+
+    @staticmethod
+    def _log(buckets, blocked, wait):
+        if blocked:
+            logger.info(
+                "Richiesta limitata (%s): %s, riprova tra %.0f s", blocked, dict(buckets)[blocked], wait,
+            )
+
+    @classmethod
+    def counters(cls):
+        """
+        Contatori dall'avvio della cache: richieste passate e respinte per ambito
+        (es. {'allowed': 120, 'rejected:ip': 4, 'rejected:professional': 0}).
+        """
+        names = ['allowed'] + [f'rejected:{scope}' for scope in cls.config().get('RATES', {})]
+        values = cache.get_many([f'{cls.KEY_PREFIX}:count:{name}' for name in names])
+        return {name: values.get(f'{cls.KEY_PREFIX}:count:{name}', 0) for name in names}
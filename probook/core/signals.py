@@ -0,0 +1,115 @@
+from django.db.models.signals import post_delete, post_save, pre_save
+from django.dispatch import receiver
+
+from core.models import Booking, OpeningHours, Professional, RecurrenceException, RecurringBooking, Service
+from core.services.cache_service import ProfessionalCache
+from core.services.calendar_service import CalendarService
+from core.services.catalog_service import ServiceCatalogService
+from core.services.directory_service import DirectoryService
+from core.services.stats_service import BookingStatsService
+
+
+@receiver([post_save, post_delete], sender=Booking)
+@receiver([post_save, post_delete], sender=OpeningHours)
+@receiver([post_save, post_delete], sender=RecurringBooking)
+def bump_professional_cache(sender, instance, **kwargs):
+    """
+    Una booking, un orario o una regola ricorrente cambiati rendono obsolete
+    dashboard, storico e disponibilità in cache.
+    """
+    ProfessionalCache.bump(instance.professional_id)
+
+
+@receiver([post_save, post_delete], sender=RecurrenceException)
+def bump_professional_cache_on_exception(sender, instance, **kwargs):
+    """
+    Un'occorrenza annullata o spostata cambia le stesse viste della sua regola,
+    e gli EXDATE della serie nel feed calendario.
+    """
+    CalendarService.touch_rule(instance.rule_id)
+    # Se la regola è stata cancellata insieme alle eccezioni, il suo signal ha già invalidato
+    professional_id = RecurringBooking.objects.filter(pk=instance.rule_id).values_list(
+        'professional_id', flat=True,
+    ).first()
+    if professional_id:
+        ProfessionalCache.bump(professional_id)
+
+
+@receiver(pre_save, sender=Booking)
+def remember_booking_stat_key(sender, instance, raw=False, **kwargs):
+    """
+    Su una modifica ricordo giorno e servizio precedenti, per spostare il conteggio nel rollup.
+    Di solito sono quelli letti dal DB (Booking.from_db) o salvati l'ultima volta: la
+    SELECT serve solo per un'istanza costruita a mano o caricata senza quei campi.
+    """
+    instance._previous_stat_key = None
+    if raw or instance._state.adding or not instance.pk:
+        return
+    instance._previous_stat_key = getattr(instance, '_loaded_stat_key', None) or Booking.objects.filter(
+        pk=instance.pk,
+    ).values_list('professional_id', 'date', 'service_id').first()
+
+
+@receiver(post_save, sender=Booking)
+def update_daily_stats_on_save(sender, instance, created, raw=False, **kwargs):
+    if raw:
+        return
+    key = BookingStatsService.stat_key(instance)
+    instance._loaded_stat_key = key
+    previous = None if created else getattr(instance, '_previous_stat_key', None)
+    if previous == key:
+        return
+    if previous:
+        BookingStatsService.apply(previous, -1)
+    BookingStatsService.apply(key, +1)
+
+
+@receiver(post_delete, sender=Booking)
+def update_daily_stats_on_delete(sender, instance, **kwargs):
+    BookingStatsService.apply(BookingStatsService.stat_key(instance), -1)
+
+
+@receiver(post_delete, sender=Booking)
+def record_booking_tombstone(sender, instance, origin=None, **kwargs):
+    """
+    Il feed calendario incrementale deve poter annunciare la cancellazione.
+    Non quando la booking sparisce insieme al professionista (o all'utente):
+    il tombstone punterebbe a un profilo in cancellazione.
+    """
+    origin_model = getattr(origin, 'model', type(origin))
+    if origin_model is Booking:
+        CalendarService.record_deletion(instance)
+
+
+@receiver(post_delete, sender=RecurringBooking)
+def record_rule_tombstone(sender, instance, origin=None, **kwargs):
+    """Come per le booking: la serie cancellata esce dai calendari dei client."""
+    origin_model = getattr(origin, 'model', type(origin))
+    if origin_model is RecurringBooking:
+        CalendarService.record_rule_deletion(instance)
+
+
+@receiver(post_save, sender=Professional)
+def bump_professional_cache_on_profile(sender, instance, raw=False, **kwargs):
+    """Anche i dati del profilo (nome, durata degli slot) finiscono nelle viste in cache."""
+    ProfessionalCache.bump(instance.id)
+    DirectoryService.index_professional(instance)
+    if not raw:
+        # I servizi citati nella descrizione diventano voci del catalogo
+        ServiceCatalogService.sync_from_description(instance)
+
+
+@receiver([post_save, post_delete], sender=Service)
+def bump_professional_cache_on_service(sender, instance, **kwargs):
+    """
+    Nome e durata dei servizi compaiono in dashboard, storico e disponibilità;
+    il listino anche nell'header delle pagine del professionista, la cui
+    fragment cache (e l'ETag) segue Professional.updated_at.
+    """
+    ProfessionalCache.bump(instance.professional_id)
+    ServiceCatalogService.touch(instance.professional_id)
+
+
+@receiver(post_delete, sender=Professional)
+def remove_from_directory(sender, instance, **kwargs):
+    DirectoryService.remove_professional(instance.id)
@@ -1,3 +1,1720 @@
-from django.test import TestCase
+import importlib
+import io
+import json
+import os
+import sys
+import tempfile
+import threading
+import uuid
+from datetime import date, time, timedelta
+from decimal import Decimal
+from unittest import mock, skipUnless
 
-# Create your tests here.
+from asgiref.sync import sync_to_async
+from django.conf import settings
+from django.core import mail
+from django.core.cache import cache
+from django.core.exceptions import ImproperlyConfigured, ValidationError
+from django.core.management import call_command
+from django.core.management.base import CommandError
+from django.db import IntegrityError, connection, connections, transaction
+from django.db.migrations.executor import MigrationExecutor
+from django.test import TestCase, TransactionTestCase, override_settings
+from django.test.utils import CaptureQueriesContext
+from django.urls import reverse
+from django.utils import timezone
+
+from core.models import (
+    ArchivedBooking, Booking, RecurrenceException, RecurringBooking, BookingDailyStat, BookingTombstone, NotificationLedger, OpeningHours, OutboundEmail, Professional,
+    User,
+)
+from core import benchmarks
+from core.forms import BookingForm
+from core.instrumentation import RequestProfile
+from core.paginators import ApproximateCountPaginator
+from core.routers import ReadReplicaRouter, use_read_replica
+from core.services.archive_service import ArchiveService
+from core.services.availability_service import AvailabilityService
+from core.services.booking_service import BookingService, SlotTakenError
+from core.services.bulk_service import BulkBookingService
+from core.services.cache_service import ProfessionalCache
+from core.services.calendar_service import CalendarService
+from core.services.catalog_service import ServiceCatalogService
+from core.services.directory_service import DirectoryService
+from core.services.email_service import EmailOutboxService
+from core.services.history_service import HistoryService
+from core.services.notification_service import NotificationService
+from core.services.professional_service import ProfessionalService
+from core.services.recurrence_service import RecurrenceService
+from core.services.stats_service import BookingStatsService
+from core.services.throttle_service import ThrottleService
+from core.throttling import client_ip
+
+
+class ProBookTestCase(TestCase):
+    """Base comune: un professionista con il relativo utente."""
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.user = User.objects.create_user(
+            username='salone', password='pwd-test-123', email='salone@example.com',
+            is_professional=True,
+        )
+        cls.professional = Professional.objects.create(
+            user=cls.user, business_name='Salone Test', services='Taglio, Barba',
+        )
+
+    def setUp(self):
+        # Ogni test parte con la cache vuota (gli id possono ripetersi tra un test e l'altro)
+        cache.clear()
+
+    def service(self, name):
+        """Voce del catalogo del professionista di test (creata se manca)."""
+        return ServiceCatalogService.resolve(self.professional, [name])[name]
+
+    def make_booking(self, day, at=time(10, 0), **kwargs):
+        """Crea una prenotazione per il professionista di test (service per nome)."""
+        data = {
+            'client_name': 'Mario Rossi',
+            'client_email': 'mario@example.com',
+            'service': 'Taglio',
+        }
+        data.update(kwargs)
+        data['service'] = self.service(data['service'])
+        return Booking.objects.create(
+            professional=self.professional, date=day, time=at, **data
+        )
+
+
+class DashboardStatsTests(ProBookTestCase):
+    def test_counters_and_next_booking(self):
+        today = date.today()
+        self.make_booking(today - timedelta(days=3))
+        self.make_booking(today, at=time(0, 0))
+        tomorrow = self.make_booking(today + timedelta(days=1))
+        self.make_booking(today + timedelta(days=5))
+
+        stats = ProfessionalService.get_dashboard_stats(self.professional)
+
+        self.assertEqual(stats['total_bookings'], 4)
+        self.assertEqual(stats['future_count'], 3)
+        self.assertEqual(stats['today_count'], 1)
+        self.assertEqual(len(stats['bookings']), 3)
+        # La prenotazione di oggi a mezzanotte è già passata
+        self.assertEqual(stats['next_booking'], tomorrow)
+
+    def test_query_count(self):
+        """Regressione: card + tabella + regole ricorrenti in esattamente 3 query."""
+        today = date.today()
+        for offset in range(10):
+            self.make_booking(today + timedelta(days=offset))
+
+        with self.assertNumQueries(3):
+            stats = ProfessionalService.get_dashboard_stats(self.professional)
+            list(stats['bookings'])
+            stats['next_booking']
+
+
+class ServiceCatalogTests(ProBookTestCase):
+    def test_catalog_from_description_and_booking_form(self):
+        self.assertEqual(
+            list(self.professional.catalog.values_list('name', flat=True)), ['Barba', 'Taglio'],
+        )
+        # Varianti dello stesso nome confluiscono nella stessa voce
+        self.assertEqual(self.service(' taglio ').id, self.service('Taglio').id)
+
+        other = Professional.objects.create(
+            user=User.objects.create(username='altro'), business_name='Altro', services='Piega',
+        )
+        form = BookingForm({
+            'client_name': 'Anna', 'client_email': 'anna@example.com',
+            'service': other.catalog.get().id,
+            'date': (date.today() + timedelta(days=1)).isoformat(), 'time': '10:00',
+        }, professional=self.professional)
+        # Il servizio di un altro professionista non è prenotabile
+        self.assertIn('service', form.errors)
+
+    def test_revenue_per_service(self):
+        taglio = self.service('Taglio')
+        taglio.price = Decimal('25.00')
+        taglio.save()
+        day = date.today()
+        self.make_booking(day, at=time(9, 0))
+        self.make_booking(day, at=time(10, 0))
+        self.make_booking(day, at=time(11, 0), service='Barba')  # senza prezzo
+
+        with self.assertNumQueries(1):
+            revenue = ServiceCatalogService.revenue(self.professional, day, day)
+        self.assertEqual(
+            [(row['name'], row['bookings'], row['revenue']) for row in revenue],
+            [('Taglio', 2, Decimal('50.00')), ('Barba', 1, 0)],
+        )
+
+
+class DailyStatsTests(ProBookTestCase):
+    def rollup(self):
+        return {
+            (stat.date, stat.service.name): stat.count
+            for stat in BookingDailyStat.objects.filter(professional=self.professional).select_related('service')
+        }
+
+    def test_signals_keep_rollup_in_sync(self):
+        day = date.today() + timedelta(days=1)
+        first = self.make_booking(day, at=time(9, 0))
+        self.make_booking(day, at=time(10, 0))
+        self.make_booking(day, at=time(11, 0), service='Barba')
+        self.assertEqual(self.rollup(), {(day, 'Taglio'): 2, (day, 'Barba'): 1})
+
+        # Spostamento di giorno e servizio: il conteggio passa da una riga all'altra
+        first.date, first.service = day + timedelta(days=1), self.service('Barba')
+        first.save()
+        self.assertEqual(self.rollup(), {
+            (day, 'Taglio'): 1, (day, 'Barba'): 1, (day + timedelta(days=1), 'Barba'): 1,
+        })
+
+        # Le righe rimaste a zero spariscono
+        Booking.objects.filter(service__name='Barba').delete()
+        self.assertEqual(self.rollup(), {(day, 'Taglio'): 1})
+
+        # La chiave precedente è quella letta dal DB: il salvataggio è il solo UPDATE
+        booking = Booking.objects.get()
+        booking.notes = 'Arriva tardi'
+        with self.assertNumQueries(1):
+            booking.save()
+        booking.date = day + timedelta(days=2)
+        booking.save()
+        self.assertEqual(self.rollup(), {(day + timedelta(days=2), 'Taglio'): 1})
+
+    def test_rebuild_after_bulk_writes(self):
+        today = date.today()
+        Booking.objects.bulk_create([
+            Booking(professional=self.professional, client_name='Cliente',
+                    client_email='cliente@example.com', service=self.service('Taglio'),
+                    date=today + timedelta(days=offset % 3), time=time(8 + offset))
+            for offset in range(6)
+        ])
+        self.assertEqual(self.rollup(), {})
+
+        out = io.StringIO()
+        call_command('rebuild_daily_stats', stdout=out)
+        self.assertIn('3 righe', out.getvalue())
+        self.assertEqual(ProfessionalService.get_dashboard_stats(self.professional)['today_count'], 2)
+
+    def test_rebuild_merges_archive_in_batches(self):
+        day = date(2020, 3, 2)
+        for hour in (9, 10, 11):
+            self.make_booking(day, at=time(hour), service='Barba' if hour == 11 else 'Taglio')
+        ArchiveService.archive_before(date(2021, 1, 1))
+        # Stessa chiave sia in archivio sia in tabella (es. un import sul passato)
+        self.make_booking(day, at=time(12, 0))
+        self.make_booking(day + timedelta(days=1))
+        expected = self.rollup()
+
+        with mock.patch.object(BookingStatsService, 'REBUILD_BATCH_SIZE', 1):
+            self.assertEqual(BookingStatsService.rebuild(self.professional), 3)
+        self.assertEqual(self.rollup(), expected)
+        self.assertEqual(expected[day, 'Taglio'], 3)
+
+    def test_trend_endpoint(self):
+        today = date.today()
+        self.make_booking(today, service='Barba')
+        self.make_booking(today - timedelta(days=2))
+        self.make_booking(today - timedelta(days=2), at=time(11, 0))
+        token = self.client.post(
+            reverse('api_token'), {'username': 'salone', 'password': 'pwd-test-123'},
+        ).json()['access']
+
+        # utente (JWT) + professional + rollup (trend e totali per servizio)
+        with self.assertNumQueries(4):
+            response = self.client.get(
+                reverse('api_trend'), {'days': 3, 'by': 'service'},
+                HTTP_AUTHORIZATION=f'Bearer {token}',
+            )
+        data = response.json()
+        self.assertEqual([point['total'] for point in data['days']], [2, 0, 1])
+        self.assertEqual(data['days'][0]['services'], {'Taglio': 2})
+        self.assertEqual(
+            [(row['name'], row['bookings']) for row in data['services']], [('Taglio', 2), ('Barba', 1)],
+        )
+
+        response = self.client.get(reverse('api_trend'), {'days': 0}, HTTP_AUTHORIZATION=f'Bearer {token}')
+        self.assertEqual(response.status_code, 400)
+        response = self.client.get(reverse('api_trend'), {'start': '9999-12-25'}, HTTP_AUTHORIZATION=f'Bearer {token}')
+        self.assertEqual(response.status_code, 400)
+
+
+@skipUnless(connection.vendor == 'sqlite', "EXPLAIN QUERY PLAN specifico di SQLite")
+class BookingIndexPlanTests(ProBookTestCase):
+    """Le query calde non devono mai ricadere su un full scan di core_booking."""
+
+    BOOKINGS = 1_000_000
+
+    @classmethod
+    def setUpTestData(cls):
+        super().setUpTestData()
+        # Genero 1M di prenotazioni direttamente in SQL: con bulk_create sarebbe troppo lento
+        with connection.cursor() as cursor:
+            cursor.execute(
+                """
+                WITH RECURSIVE seq(n) AS (
+                    SELECT 0 UNION ALL SELECT n + 1 FROM seq WHERE n < %s
+                )
+                INSERT INTO core_booking
+                    (professional_id, client_name, client_email, date, time, service_id, notes, updated_at,
+                     client_name_folded, notes_folded)
+                SELECT %s, 'Cliente ' || (n %% 1000), 'Cliente' || (n %% 1000) || '@example.com',
+                       date('2000-01-01', '+' || (n / 10) || ' days'),
+                       printf('%%02d:00:00', 8 + n %% 10),
+                       %s, CASE WHEN n %% 1000 = 0 THEN 'allergia tinta ' || n ELSE '' END, datetime('now'),
+                       'cliente ' || (n %% 1000), CASE WHEN n %% 1000 = 0 THEN ' allergia tinta ' || n ELSE '' END
+                FROM seq
+                """,
+                [cls.BOOKINGS - 1, cls.professional.id, cls.professional.catalog.get(name='Taglio').id],
+            )
+            cursor.execute('ANALYZE')
+
+    def assertIndexedPlan(self, queryset):
+        plan = queryset.explain()
+        self.assertIn('USING', plan)
+        self.assertNotRegex(plan, r'SCAN core_booking(?! USING)')
+        # L'ordinamento deve venire dall'indice, non da un sort temporaneo
+        self.assertNotIn('TEMP B-TREE', plan)
+
+    def test_dashboard_queries_use_index(self):
+        self.assertIndexedPlan(
+            Booking.objects.filter(
+                professional=self.professional, date__gte=date.today()
+            ).order_by('date', 'time')
+        )
+
+    def test_history_query_uses_index(self):
+        live, archived = HistoryService.history_sources(self.professional)
+        self.assertIndexedPlan(live)
+        self.assertIn('archived_prof_history_idx', archived.explain())
+
+    def test_reminder_query_uses_index(self):
+        self.assertIndexedPlan(NotificationService.reminder_candidates(date(2001, 1, 1)))
+
+    def test_history_filters_use_indexes(self):
+        # Prefisso del cliente: range sulle espressioni LOWER(...) indicizzate, qualunque sia il case
+        live, archived = HistoryService.query(self.professional).client('CLIENTE42@').sources()
+        self.assertIn('booking_prof_email_ci_idx', live.explain())
+        self.assertNotRegex(live.explain(), r'SCAN core_booking(?! USING)')
+        self.assertEqual(live.count(), self.BOOKINGS // 1000)
+
+        # Note: la tabella FTS5 trova le 1000 righe con note senza leggere core_booking
+        live, _ = HistoryService.query(self.professional).notes('Allergia').sources()
+        plan = live.explain()
+        self.assertIn('core_booking_notes_fts VIRTUAL TABLE', plan)
+        self.assertNotRegex(plan, r'SCAN core_booking(?! USING|_notes_fts)')
+        self.assertEqual(live.count(), self.BOOKINGS // 1000)
+
+        query = HistoryService.query(self.professional).client('cliente0@').notes('tinta 999000')
+        page = HistoryService.paginate(query.sources())
+        self.assertEqual([booking.notes for booking in page['bookings']], ['allergia tinta 999000'])
+
+
+class HistoryPaginationTests(ProBookTestCase):
+    def setUp(self):
+        super().setUp()
+        base = date(2024, 1, 1)
+        # Più prenotazioni nello stesso giorno: il cursore deve confrontare anche l'ora
+        for offset in range(7):
+            self.make_booking(base + timedelta(days=offset // 3), at=time(9 + offset % 3))
+        self.client.force_login(self.user)
+
+    def test_pages_cover_history_without_gaps(self):
+        seen = []
+        cursor = None
+        while True:
+            page = HistoryService.get_history_page(self.professional, cursor=cursor, page_size=3)
+            seen.extend(b.id for b in page['bookings'])
+            cursor = page['next_cursor']
+            if not cursor:
+                break
+
+        expected = [booking.id for booking in HistoryService.get_professional_history(self.professional)]
+        self.assertEqual(seen, expected)
+
+    def test_invalid_cursor_falls_back_to_first_page(self):
+        response = self.client.get(reverse('booking_history'), {'cursor': 'non-valido'})
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(len(response.context['bookings']), 7)
+        self.assertTrue(response.context['is_first_page'])
+        self.assertNotContains(response, 'Più recenti')
+
+    def test_streaming_exports(self):
+        response = self.client.get(reverse('booking_history_export', args=['csv']))
+        self.assertTrue(response.streaming)
+        lines = b''.join(response.streaming_content).decode().splitlines()
+        self.assertEqual(lines[0], ','.join(HistoryService.EXPORT_FIELDS))
+        self.assertEqual(len(lines), 8)
+
+        response = self.client.get(reverse('booking_history_export', args=['ndjson']))
+        rows = [json.loads(line) for line in b''.join(response.streaming_content).splitlines()]
+        self.assertEqual(len(rows), 7)
+        self.assertEqual(rows[0]['date'], '2024-01-03')
+
+        response = self.client.get(reverse('booking_history_export', args=['xml']))
+        self.assertEqual(response.status_code, 404)
+
+
+class EmailOutboxTests(ProBookTestCase):
+    def post_booking(self):
+        return self.client.post(reverse('public_booking', args=[self.professional.id]), {
+            'client_name': 'Anna Bianchi',
+            'client_email': 'anna@example.com',
+            'service': self.service('Taglio').id,
+            'date': (date.today() + timedelta(days=2)).isoformat(),
+            'time': '11:00',
+        })
+
+    def test_booking_enqueues_on_commit_without_sending(self):
+        with self.captureOnCommitCallbacks(execute=True):
+            response = self.post_booking()
+        self.assertEqual(response.status_code, 302)
+        self.assertEqual(len(mail.outbox), 0)
+        self.assertEqual(
+            set(OutboundEmail.objects.values_list('to', flat=True)),
+            {'salone@example.com', 'anna@example.com'},
+        )
+
+        call_command('send_outbox', stdout=io.StringIO())
+        self.assertEqual(len(mail.outbox), 2)
+        self.assertFalse(OutboundEmail.objects.exclude(status=OutboundEmail.STATUS_SENT).exists())
+
+    def test_failed_send_is_retried_with_backoff(self):
+        email = OutboundEmail.objects.create(subject='Test', body='Corpo', to='x@example.com')
+
+        class BrokenConnection:
+            def open(self):
+                pass
+
+            def close(self):
+                pass
+
+            def send_messages(self, messages):
+                raise OSError("SMTP non raggiungibile")
+
+        sent, failed = EmailOutboxService.send_pending(connection=BrokenConnection())
+        self.assertEqual((sent, failed), (0, 1))
+        email.refresh_from_db()
+        self.assertEqual(email.status, OutboundEmail.STATUS_PENDING)
+        self.assertEqual(email.attempts, 1)
+        self.assertGreater(email.next_attempt_at, email.created_at)
+        # Non ancora "matura": il batch successivo la salta
+        self.assertEqual(EmailOutboxService.send_pending(), (0, 0))
+
+    def test_unreachable_smtp_fails_whole_batch_with_backoff(self):
+        for to in ('a@example.com', 'b@example.com'):
+            OutboundEmail.objects.create(subject='Test', body='Corpo', to=to)
+        claimed = []
+
+        class DownConnection:
+            def open(self):
+                # Le email sono già prese in carico (lease) prima di parlare con il server
+                claimed.extend(OutboundEmail.objects.filter(next_attempt_at__gt=timezone.now()))
+                raise ConnectionRefusedError("SMTP giù")
+
+            def close(self):
+                pass
+
+        self.assertEqual(EmailOutboxService.send_pending(connection=DownConnection()), (0, 2))
+        self.assertEqual(len(claimed), 2)
+        for email in OutboundEmail.objects.all():
+            self.assertEqual((email.status, email.attempts, email.last_error), (OutboundEmail.STATUS_PENDING, 1, "SMTP giù"))
+            self.assertGreater(email.next_attempt_at, email.created_at + EmailOutboxService.BACKOFF_BASE / 2)
+
+        # Il worker non si ferma: registra il tentativo e aspetta
+        OutboundEmail.objects.update(next_attempt_at=timezone.now())
+        with mock.patch('core.services.email_service.get_connection', return_value=DownConnection()), \
+                mock.patch('core.management.commands.send_outbox.time.sleep', side_effect=[None, KeyboardInterrupt]):
+            with self.assertRaises(KeyboardInterrupt):
+                call_command('send_outbox', loop=True, stdout=io.StringIO())
+        self.assertEqual(set(OutboundEmail.objects.values_list('attempts', flat=True)), {2})
+
+
+class NotificationTests(ProBookTestCase):
+    def test_booking_templates_are_plain_text(self):
+        booking = self.make_booking(date(2030, 5, 6), at=time(9, 30), client_name="Anna D'Amico")
+        subject, body = NotificationService.render(
+            'booking_client', {'booking': booking, 'professional': self.professional},
+        )
+        self.assertEqual(subject, 'Conferma prenotazione da Salone Test')
+        self.assertIn("Ciao Anna D'Amico,", body)
+        self.assertIn('il 2030-05-06 alle 09:30', body)
+        self.assertIn('Servizio: Taglio', body)
+        # Compilato una volta sola e poi riusato
+        self.assertIs(NotificationService.get_template('booking_client'), NotificationService.get_template('booking_client'))
+
+    def test_reminders_are_batched_and_sent_once(self):
+        tomorrow = date.today() + timedelta(days=1)
+        for hour in (9, 10, 11, 12, 13):
+            self.make_booking(tomorrow, at=time(hour), client_email=f'cliente{hour}@example.com')
+        self.make_booking(tomorrow + timedelta(days=1))
+
+        # Costo costante per blocco: selezione, ledger (insert + rilettura), outbox, savepoint;
+        # più la selezione delle regole ricorrenti (nessuna, quindi nessun blocco)
+        with self.assertNumQueries(7):
+            stats = NotificationService.schedule_reminders(send=False)
+        self.assertEqual((stats['selected'], stats['queued']), (5, 5))
+
+        out = io.StringIO()
+        call_command('send_reminders', stdout=out)
+        self.assertIn('0 accodati', out.getvalue())
+        self.assertEqual(len(mail.outbox), 5)
+        self.assertTrue(mail.outbox[0].subject.startswith('Promemoria: domani da Salone Test'))
+        self.assertEqual(NotificationLedger.objects.count(), 5)
+
+    def test_bookings_claimed_by_another_run_are_skipped(self):
+        booking = self.make_booking(date.today() + timedelta(days=1))
+        NotificationLedger.objects.create(
+            booking=booking, kind=NotificationLedger.KIND_REMINDER, run_id=uuid.uuid4(),
+        )
+        self.assertEqual(NotificationService._claim([booking], uuid.uuid4()), [])
+
+    def test_recurring_occurrences_get_reminders(self):
+        tomorrow = date.today() + timedelta(days=1)
+        rule = BookingService.create_recurring(RecurringBooking(
+            professional=self.professional, client_name='Cliente abituale', client_email='abituale@example.com',
+            service=self.service('Taglio'), time=time(15, 0), start_date=tomorrow - timedelta(days=7),
+        ))
+        BookingService.create_recurring(RecurringBooking(
+            professional=self.professional, client_name='Annullato', client_email='annullato@example.com',
+            service=self.service('Taglio'), time=time(16, 0), start_date=tomorrow, frequency='daily',
+        )).exceptions.create(date=tomorrow)
+
+        stats = NotificationService.schedule_reminders(send=False)
+        self.assertEqual((stats['selected'], stats['queued']), (1, 1))
+        email = OutboundEmail.objects.get()
+        self.assertEqual(email.to, 'abituale@example.com')
+        self.assertIn(f'{tomorrow:%Y-%m-%d} alle 15:00', email.body)
+        self.assertEqual(NotificationLedger.objects.get().rule, rule)
+        # Una seconda esecuzione non lo accoda di nuovo
+        self.assertEqual(NotificationService.schedule_reminders(send=False)['selected'], 0)
+
+
+class SlotReservationTests(ProBookTestCase):
+    def test_taken_slot_returns_form_error(self):
+        day = date.today() + timedelta(days=1)
+        self.make_booking(day, at=time(9, 30))
+        response = self.client.post(reverse('public_booking', args=[self.professional.id]), {
+            'client_name': 'Luca Verdi',
+            'client_email': 'luca@example.com',
+            'service': self.service('Barba').id,
+            'date': day.isoformat(),
+            'time': '09:30',
+        })
+        self.assertEqual(response.status_code, 200)
+        self.assertIn('time', response.context['form'].errors)
+        self.assertEqual(Booking.objects.count(), 1)
+
+    def test_overlapping_intervals_are_rejected(self):
+        day = date.today() + timedelta(days=1)
+        colore = self.service('Colore')
+        colore.duration_minutes = 60
+        colore.save()
+        self.make_booking(day, at=time(10, 0), service='Colore')
+
+        def reserve(at, service='Barba'):
+            return BookingService.reserve_slot(Booking(
+                professional=self.professional, client_name='Luca Verdi', client_email='luca@example.com',
+                date=day, time=at, service=self.service(service),
+            ))
+
+        # 10:00-11:00 occupato: 10:30 inizia dentro, 9:30 (60 minuti) finisce dentro
+        with self.assertRaises(SlotTakenError):
+            reserve(time(10, 30))
+        with self.assertRaises(SlotTakenError):
+            reserve(time(9, 30), service='Colore')
+        reserve(time(11, 0))
+
+        # Lo stesso vale per le occorrenze ricorrenti e per le regole nuove
+        BookingService.create_recurring(RecurringBooking(
+            professional=self.professional, client_name='Abituale', client_email='abituale@example.com',
+            service=colore, time=time(14, 0), start_date=day, frequency='weekly',
+        ))
+        with self.assertRaises(SlotTakenError):
+            reserve(time(14, 30))
+        with self.assertRaises(SlotTakenError):
+            BookingService.create_recurring(RecurringBooking(
+                professional=self.professional, client_name='Altro', client_email='altro@example.com',
+                service=self.service('Barba'), time=time(10, 45), start_date=day - timedelta(days=7), frequency='weekly',
+            ))
+        self.assertEqual(Booking.objects.count(), 2)
+        self.assertEqual(RecurringBooking.objects.count(), 1)
+
+
+class AsyncViewTests(ProBookTestCase):
+    """Le viste pubbliche e della dashboard servite come coroutine (AsyncClient, handler ASGI)."""
+
+    async def test_public_booking_and_success_page(self):
+        barba = await sync_to_async(self.service)('Barba')
+        day = date.today() + timedelta(days=2)
+        response = await self.async_client.post(
+            reverse('public_booking', args=[self.professional.id]), {
+                'client_name': 'Luca Verdi', 'client_email': 'luca@example.com',
+                'service': barba.id, 'date': day.isoformat(), 'time': '11:00',
+            },
+        )
+        self.assertEqual(response.status_code, 302)
+        # Le due email sono agganciate al commit della connessione del thread ORM
+        pending = await sync_to_async(lambda: len(connection.run_on_commit))()
+        self.assertEqual(pending, 2)
+
+        response = await self.async_client.get(response.url)
+        self.assertContains(response, 'Salone Test')
+
+    async def test_taken_slot_and_availability(self):
+        barba = await sync_to_async(self.service)('Barba')
+        day = date.today() + timedelta(days=2)
+        await Booking.objects.acreate(
+            professional=self.professional, client_name='Mario Rossi',
+            client_email='mario@example.com', service=barba, date=day, time=time(11, 0),
+        )
+        response = await self.async_client.post(
+            reverse('public_booking', args=[self.professional.id]), {
+                'client_name': 'Luca Verdi', 'client_email': 'luca@example.com',
+                'service': barba.id, 'date': day.isoformat(), 'time': '11:00',
+            },
+        )
+        self.assertIn('time', response.context['form'].errors)
+
+        response = await self.async_client.get(
+            reverse('professional_availability', args=[self.professional.id]),
+            {'start': day.isoformat(), 'days': 1},
+        )
+        slots = response.json()['days'][0]['slots']
+        self.assertNotIn('11:00', slots)
+
+    async def test_dashboard_and_history_match_sync_services(self):
+        taglio = await sync_to_async(self.service)('Taglio')
+        await self.async_client.aforce_login(self.user)
+        for offset in range(3):
+            await Booking.objects.acreate(
+                professional=self.professional, client_name='Mario Rossi',
+                client_email='mario@example.com', service=taglio,
+                date=date.today() + timedelta(days=offset), time=time(10, 0),
+            )
+
+        response = await self.async_client.get(
+            reverse('professional_dashboard', args=[self.professional.id]),
+        )
+        self.assertEqual(response.context['total_bookings'], 3)
+        self.assertEqual(response.context['today_count'], 1)
+
+        response = await self.async_client.get(reverse('booking_history'))
+        self.assertEqual(len(response.context['bookings']), 3)
+        self.assertIsNone(response.context['next_cursor'])
+
+
+class UniqueSlotMigrationTests(TransactionTestCase):
+    """La 0008 deve applicarsi anche a un database che contiene già slot duplicati."""
+
+    before = [('core', '0007_outboundemail')]
+    after = [('core', '0008_booking_unique_slot')]
+
+    def tearDown(self):
+        # Riporto lo schema all'ultima migrazione per i test successivi
+        executor = MigrationExecutor(connection)
+        executor.migrate(executor.loader.graph.leaf_nodes())
+
+    def test_duplicates_removed_before_constraint(self):
+        executor = MigrationExecutor(connection)
+        executor.migrate(self.before)
+        apps = executor.loader.project_state(self.before).apps
+        user = apps.get_model('core', 'User').objects.create(username='duplicati')
+        professional = apps.get_model('core', 'Professional').objects.create(user=user, business_name='Doppio')
+        Booking = apps.get_model('core', 'Booking')
+        slot = {'professional': professional, 'date': date(2024, 1, 1), 'time': time(10, 0), 'service': 'Taglio'}
+        first = Booking.objects.create(client_name='Primo', client_email='a@example.com', **slot)
+        Booking.objects.create(client_name='Secondo', client_email='b@example.com', **slot)
+        Booking.objects.create(client_name='Terzo', client_email='c@example.com', **slot)
+        other = Booking.objects.create(
+            client_name='Altro', client_email='d@example.com', **{**slot, 'time': time(11, 0)},
+        )
+
+        executor = MigrationExecutor(connection)
+        with self.assertLogs('probook.migrations', 'WARNING'):
+            executor.migrate(self.after)
+        apps = executor.loader.project_state(self.after).apps
+        self.assertEqual(
+            sorted(apps.get_model('core', 'Booking').objects.values_list('id', flat=True)), [first.id, other.id],
+        )
+
+
+class ConcurrentSlotReservationTests(TransactionTestCase):
+    """Molti thread sullo stesso slot: deve vincere esattamente una richiesta."""
+
+    THREADS = 16
+
+    def test_exactly_one_winner(self):
+        user = User.objects.create_user(username='concorrenza', password='pwd-test-123')
+        professional = Professional.objects.create(
+            user=user, business_name='Salone Concorrente', services='Taglio',
+        )
+        data = {
+            'client_name': 'Cliente',
+            'client_email': 'cliente@example.com',
+            'service': professional.catalog.get().id,
+            'date': (date.today() + timedelta(days=1)).isoformat(),
+            'time': '15:00',
+        }
+        barrier = threading.Barrier(self.THREADS)
+        results = []
+
+        def reserve():
+            try:
+                form = BookingForm(data, professional=professional)
+                self.assertTrue(form.is_valid())
+                barrier.wait()
+                BookingService.create_booking(professional.id, form)
+                results.append('ok')
+            except SlotTakenError:
+                results.append('taken')
+            except Exception as exc:
+                results.append(exc)
+            finally:
+                connections.close_all()
+
+        threads = [threading.Thread(target=reserve) for _ in range(self.THREADS)]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+
+        self.assertEqual(results.count('ok'), 1, results)
+        self.assertEqual(results.count('taken'), self.THREADS - 1, results)
+        self.assertEqual(Booking.objects.filter(professional=professional).count(), 1)
+
+
+class AvailabilityTests(ProBookTestCase):
+    def setUp(self):
+        super().setUp()
+        # Tutti i giorni 9-12, slot da 60 minuti: 3 slot al giorno
+        for weekday in range(7):
+            OpeningHours.objects.create(
+                professional=self.professional, weekday=weekday,
+                opens_at=time(9, 0), closes_at=time(12, 0),
+            )
+        self.professional.slot_minutes = 60
+        self.professional.save()
+        self.tomorrow = date.today() + timedelta(days=1)
+
+    def test_slot_minutes_must_be_positive(self):
+        # Uno slot da 0 minuti farebbe fallire la griglia (range con passo 0)
+        self.professional.slot_minutes = 0
+        with self.assertRaises(ValidationError):
+            self.professional.full_clean()
+        with self.assertRaises(IntegrityError), transaction.atomic():
+            Professional.objects.filter(pk=self.professional.pk).update(slot_minutes=0)
+
+    def get_grid(self, **params):
+        response = self.client.get(
+            reverse('professional_availability', args=[self.professional.id]), params,
+        )
+        self.assertEqual(response.status_code, 200)
+        return {day['date']: day['slots'] for day in response.json()['days']}
+
+    def test_booked_and_overlapping_slots_are_excluded(self):
+        self.make_booking(self.tomorrow, at=time(9, 0))
+        # Booking fuori griglia: 10:30-11:30 occupa sia lo slot delle 10 che quello delle 11
+        self.make_booking(self.tomorrow, at=time(10, 30))
+        grid = self.get_grid(start=self.tomorrow.isoformat(), days=2)
+        self.assertEqual(grid[self.tomorrow.isoformat()], [])
+        self.assertEqual(grid[(self.tomorrow + timedelta(days=1)).isoformat()], ['09:00', '10:00', '11:00'])
+
+    def test_thirty_day_grid_uses_one_booking_query_and_cache(self):
+        professional = Professional.objects.prefetch_related('opening_hours').get(id=self.professional.id)
+        # Orari già caricati dal prefetch: una query sulle booking e una sulle regole ricorrenti
+        with self.assertNumQueries(2):
+            grid = AvailabilityService.get_availability(professional, start=self.tomorrow)
+        self.assertEqual(len(grid), AvailabilityService.DEFAULT_DAYS)
+        with self.assertNumQueries(0):
+            AvailabilityService.get_availability(professional, start=self.tomorrow)
+
+    def test_cache_is_invalidated_when_booking_changes(self):
+        start = self.tomorrow.isoformat()
+        self.assertEqual(len(self.get_grid(start=start, days=1)[start]), 3)
+        booking = self.make_booking(self.tomorrow, at=time(11, 0))
+        self.assertEqual(self.get_grid(start=start, days=1)[start], ['09:00', '10:00'])
+        booking.delete()
+        self.assertEqual(len(self.get_grid(start=start, days=1)[start]), 3)
+
+    def test_service_durations(self):
+        start = self.tomorrow.isoformat()
+        long_service = self.service('Colore')
+        long_service.duration_minutes = 90
+        long_service.save()
+        # 9:00-10:30: occupa anche lo slot delle 10
+        self.make_booking(self.tomorrow, at=time(9, 0), service='Colore')
+        self.assertEqual(self.get_grid(start=start, days=1)[start], ['11:00'])
+        # Un servizio da 90 minuti il giorno dopo entra solo alle 9 e alle 10
+        day_after = (self.tomorrow + timedelta(days=1)).isoformat()
+        grid = self.get_grid(start=day_after, days=1, service=long_service.id)
+        self.assertEqual(grid[day_after], ['09:00', '10:00'])
+
+    def test_invalid_parameters(self):
+        url = reverse('professional_availability', args=[self.professional.id])
+        self.assertEqual(self.client.get(url, {'service': '999'}).status_code, 400)
+        self.assertEqual(self.client.get(url, {'start': 'domani'}).status_code, 400)
+        self.assertEqual(self.client.get(url, {'days': '0'}).status_code, 400)
+
+
+class ProfessionalCacheTests(ProBookTestCase):
+    def setUp(self):
+        super().setUp()
+        self.client.force_login(self.user)
+        self.make_booking(date.today() + timedelta(days=1))
+
+    def test_dashboard_is_served_from_cache_until_bookings_change(self):
+        url = reverse('professional_dashboard', args=[self.professional.id])
+        self.client.get(url)
+        # Seconda visita: restano solo sessione/utente/professional, nessuna query sulle booking
+        with self.assertNumQueries(3):
+            response = self.client.get(url)
+        self.assertEqual(response.context['future_count'], 1)
+
+        self.make_booking(date.today() + timedelta(days=2))
+        response = self.client.get(url)
+        self.assertEqual(response.context['future_count'], 2)
+        self.assertEqual(ProfessionalCache.stats()['dashboard'], {'hits': 1, 'misses': 2})
+
+    def test_history_cache_is_invalidated_on_delete(self):
+        url = reverse('booking_history')
+        self.assertEqual(len(self.client.get(url).context['bookings']), 1)
+        Booking.objects.all().delete()
+        self.assertEqual(len(self.client.get(url).context['bookings']), 0)
+
+
+class BulkImportExportTests(ProBookTestCase):
+    def test_import_jsonl_skips_invalid_rows_and_taken_slots(self):
+        self.make_booking(date(2023, 5, 2), at=time(10, 0))
+        rows = [
+            {'client_name': 'Anna', 'client_email': 'anna@example.com', 'service': 'Taglio',
+             'date': '2023-05-01', 'time': '10:00'},
+            {'client_name': 'Bruno', 'client_email': 'non-una-email', 'service': 'Barba',
+             'date': '2023-05-01', 'time': '11:00'},
+            # Slot già occupato: ignorato senza interrompere l'import
+            {'client_name': 'Carla', 'client_email': 'carla@example.com', 'service': 'Colore',
+             'date': '2023-05-02', 'time': '10:00'},
+        ]
+        with tempfile.NamedTemporaryFile('w', suffix='.jsonl', delete=False) as f:
+            f.write('\n'.join(json.dumps(row) for row in rows))
+        self.addCleanup(os.unlink, f.name)
+
+        out, err = io.StringIO(), io.StringIO()
+        with self.captureOnCommitCallbacks(execute=True):
+            call_command(
+                'import_bookings', f.name, professional=self.professional.id,
+                batch_size=2, stdout=out, stderr=err,
+            )
+
+        self.assertIn('Riga 2', err.getvalue())
+        self.assertIn('1 importate, 1 su slot già occupati, 1 non valide su 3 righe', out.getvalue())
+        self.assertEqual(Booking.objects.count(), 2)
+        self.assertEqual(OutboundEmail.objects.count(), 0)
+        self.assertTrue(Booking.objects.filter(client_name='Anna', date=date(2023, 5, 1)).exists())
+
+    def test_import_jsonl_reports_malformed_lines_and_keeps_going(self):
+        lines = [
+            json.dumps({'client_name': 'Anna', 'client_email': 'anna@example.com', 'service': 'Taglio',
+                        'date': '2023-05-01', 'time': '10:00'}),
+            '{"client_name": "Bruno",',
+            '["non", "un", "oggetto"]',
+            json.dumps({'client_name': 'Carla', 'client_email': 'carla@example.com', 'service': 'Taglio',
+                        'date': '2023-05-01', 'time': '11:00'}),
+        ]
+        with tempfile.NamedTemporaryFile('w', suffix='.jsonl', delete=False) as f:
+            f.write('\n'.join(lines))
+        self.addCleanup(os.unlink, f.name)
+
+        out, err = io.StringIO(), io.StringIO()
+        call_command(
+            'import_bookings', f.name, professional=self.professional.id,
+            batch_size=2, stdout=out, stderr=err,
+        )
+
+        self.assertIn('Riga 2: JSON non valido', err.getvalue())
+        self.assertIn('Riga 3: La riga deve essere un oggetto JSON', err.getvalue())
+        self.assertIn('2 importate, 0 su slot già occupati, 2 non valide su 4 righe', out.getvalue())
+        self.assertEqual(BookingDailyStat.objects.get(professional=self.professional).count, 2)
+
+    def test_import_updates_rollup_after_a_partial_import(self):
+        def rows():
+            yield {'client_name': 'Anna', 'client_email': 'anna@example.com', 'service': 'Taglio',
+                   'date': '2023-05-01', 'time': '10:00'}
+            raise OSError('lettura interrotta')
+
+        version = ProfessionalCache.version(self.professional.id)
+        with self.assertRaises(OSError):
+            BulkBookingService.import_rows(self.professional, rows(), batch_size=1)
+
+        # Il primo blocco è salvato: rollup e cache lo vedono comunque
+        self.assertEqual(BookingDailyStat.objects.get(professional=self.professional).count, 1)
+        self.assertNotEqual(ProfessionalCache.version(self.professional.id), version)
+
+    def test_export_csv_round_trips_through_import(self):
+        for hour in (9, 10, 11):
+            self.make_booking(date(2023, 1, 10), at=time(hour), notes=f'nota {hour}')
+        out = io.StringIO()
+        call_command('export_bookings', professional=self.professional.id, stdout=out)
+
+        other = Professional.objects.create(
+            user=User.objects.create_user(username='altro', password='pwd-test-123'),
+            business_name='Altro salone',
+        )
+        with tempfile.NamedTemporaryFile('w', suffix='.csv', delete=False, newline='') as f:
+            f.write(out.getvalue())
+        self.addCleanup(os.unlink, f.name)
+        call_command('import_bookings', f.name, professional=other.id, stdout=io.StringIO())
+
+        self.assertEqual(
+            list(other.bookings.order_by('time').values_list('time', 'notes')),
+            [(time(9), 'nota 9'), (time(10), 'nota 10'), (time(11), 'nota 11')],
+        )
+
+
+class BookingAPITests(ProBookTestCase):
+    def setUp(self):
+        super().setUp()
+        for day in range(1, 6):
+            self.make_booking(date.today() + timedelta(days=day), service='Taglio' if day % 2 else 'Barba')
+        response = self.client.post(
+            reverse('api_token'), {'username': 'salone', 'password': 'pwd-test-123'},
+        )
+        self.auth = {'HTTP_AUTHORIZATION': f"Bearer {response.json()['access']}"}
+
+    def test_bookings_list_filters_and_paginates(self):
+        url = reverse('api_bookings')
+        # utente (JWT) + professional + una query per la pagina di ciascuna sorgente (booking e archivio)
+        with self.assertNumQueries(4):
+            response = self.client.get(url, {'service': 'Taglio'}, **self.auth)
+        data = response.json()
+        self.assertEqual([b['service'] for b in data['results']], ['Taglio'] * 3)
+        self.assertIsNone(data['next_cursor'])
+
+        self.assertEqual(self.client.get(url).status_code, 401)
+        self.assertEqual(self.client.get(url, {'date_from': 'ieri'}, **self.auth).status_code, 400)
+
+    def test_unchanged_list_returns_304(self):
+        url = reverse('api_bookings')
+        etag = self.client.get(url, **self.auth)['ETag']
+        with self.assertNumQueries(2):
+            response = self.client.get(url, HTTP_IF_NONE_MATCH=etag, **self.auth)
+        self.assertEqual(response.status_code, 304)
+        # Confronto per ETag interi (RFC 9110), non per sottostringa
+        self.assertEqual(self.client.get(url, HTTP_IF_NONE_MATCH=f'"a", W/{etag}', **self.auth).status_code, 304)
+        self.assertEqual(self.client.get(url, HTTP_IF_NONE_MATCH=f'"x{etag[1:]}', **self.auth).status_code, 200)
+
+        self.make_booking(date.today() + timedelta(days=9))
+        response = self.client.get(url, HTTP_IF_NONE_MATCH=etag, **self.auth)
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(len(response.json()['results']), 6)
+
+    def test_dashboard(self):
+        url = reverse('api_dashboard')
+        # utente + professional + regole ricorrenti, tabella e card
+        with self.assertNumQueries(5):
+            data = self.client.get(url, **self.auth).json()
+        self.assertEqual(data['future_count'], 5)
+        self.assertEqual(len(data['bookings']), 5)
+        self.assertEqual(data['next_booking']['date'], (date.today() + timedelta(days=1)).isoformat())
+        # Seconda richiesta servita dalla cache
+        with self.assertNumQueries(2):
+            self.client.get(url, **self.auth)
+
+    def test_public_booking_creation(self):
+        url = reverse('api_public_booking', args=[self.professional.id])
+        payload = {
+            'client_name': 'Giulia', 'client_email': 'giulia@example.com', 'service': self.service('Taglio').id,
+            'date': (date.today() + timedelta(days=1)).isoformat(), 'time': '16:00',
+        }
+        response = self.client.post(url, payload, content_type='application/json')
+        self.assertEqual(response.status_code, 201)
+        self.assertEqual(response.json()['time'], '16:00:00')
+
+        response = self.client.post(url, payload, content_type='application/json')
+        self.assertEqual(response.status_code, 409)
+
+        payload['date'] = '2000-01-01'
+        response = self.client.post(url, payload, content_type='application/json')
+        self.assertEqual(response.status_code, 400)
+        self.assertIn('date', response.json())
+
+
+THROTTLE_TEST_SETTINGS = {'ENABLED': True, 'RATES': {'ip': '2/m', 'professional': '3/m'}, 'CLIENT_IP_HEADER': None}
+
+
+@override_settings(PROBOOK_THROTTLE=THROTTLE_TEST_SETTINGS)
+class ThrottleTests(ProBookTestCase):
+    def post(self, ip):
+        return self.client.post(
+            reverse('public_booking', args=[self.professional.id]), {'client_name': 'Bot'}, REMOTE_ADDR=ip,
+        )
+
+    def test_token_bucket_refills_over_time(self):
+        state, wait = ThrottleService.consume(None, 2, 60, now=0)
+        state, wait = ThrottleService.consume(state, 2, 60, now=0)
+        self.assertEqual(wait, 0)
+        state, wait = ThrottleService.consume(state, 2, 60, now=0)
+        self.assertEqual(wait, 30)
+        self.assertEqual(ThrottleService.consume(state, 2, 60, now=30)[1], 0)
+
+    def test_public_booking_is_throttled_before_any_query(self):
+        self.assertEqual(self.post('10.0.0.1').status_code, 200)
+        self.assertEqual(self.post('10.0.0.1').status_code, 200)
+        with self.assertNumQueries(0):
+            response = self.post('10.0.0.1')
+        self.assertEqual(response.status_code, 429)
+        self.assertEqual(response['Retry-After'], '30')
+
+        # Un altro IP passa finché non si esaurisce il bucket del professionista
+        self.assertEqual(self.post('10.0.0.2').status_code, 200)
+        self.assertEqual(self.post('10.0.0.3').status_code, 429)
+        # I GET (pagina in cache) non consumano token
+        self.assertEqual(self.client.get(reverse('public_booking', args=[self.professional.id])).status_code, 200)
+        self.assertEqual(
+            ThrottleService.counters(), {'allowed': 3, 'rejected:ip': 1, 'rejected:professional': 1},
+        )
+        # Gli stessi contatori nel monitoraggio per lo staff, accanto a quelli della cache
+        self.client.force_login(User.objects.create(username='staff', is_staff=True))
+        stats = self.client.get(reverse('cache_stats')).json()
+        self.assertEqual(stats['throttle'], ThrottleService.counters())
+        self.assertIn('dashboard', stats)
+
+    def test_api_booking_is_throttled(self):
+        url = reverse('api_public_booking', args=[self.professional.id])
+        statuses = [self.client.post(url, {}, REMOTE_ADDR='10.0.0.9').status_code for _ in range(3)]
+        self.assertEqual(statuses, [400, 400, 429])
+
+    def test_client_ip_from_proxy_header_and_ipv6_network(self):
+        request = mock.Mock(META={'REMOTE_ADDR': '127.0.0.1', 'HTTP_X_FORWARDED_FOR': '1.2.3.4, 5.6.7.8'})
+        self.assertEqual(client_ip(request), '127.0.0.1')
+        with override_settings(PROBOOK_THROTTLE={**THROTTLE_TEST_SETTINGS, 'CLIENT_IP_HEADER': 'HTTP_X_FORWARDED_FOR'}):
+            self.assertEqual(client_ip(request), '5.6.7.8')
+        request.META = {'REMOTE_ADDR': '2001:db8:1:2::42'}
+        self.assertEqual(client_ip(request), '2001:db8:1:2::/64')
+
+
+class DirectoryTests(ProBookTestCase):
+    def setUp(self):
+        super().setUp()
+        for i, (name, services) in enumerate([
+            ('Barberia Centrale', 'Barba, Taglio uomo'),
+            ('Studio Colore', 'Colore, Meches'),
+            ('Estetica Più', 'Manicure, Pedicure'),
+        ]):
+            user = User.objects.create(username=f'dir{i}')
+            Professional.objects.create(user=user, business_name=name, services=services)
+
+    def names(self, **params):
+        response = self.client.get(reverse('home'), params)
+        self.assertEqual(response.status_code, 200)
+        return [p.business_name for p in response.context['professionals']]
+
+    def test_lists_all_professionals(self):
+        self.assertEqual(len(self.names()), 4)
+
+    @skipUnless(connection.vendor == 'sqlite', "FTS5 disponibile solo su SQLite")
+    def test_fts_search_with_prefix_and_accents(self):
+        self.assertTrue(DirectoryService.fts_available())
+        self.assertEqual(self.names(q='barberi'), ['Barberia Centrale'])
+        self.assertEqual(self.names(q='piu'), ['Estetica Più'])
+        # Caratteri speciali FTS5 non devono rompere la query
+        self.assertEqual(self.names(q='colore"*('), ['Studio Colore'])
+
+    @skipUnless(connection.vendor == 'sqlite', "FTS5 disponibile solo su SQLite")
+    def test_fts_page_past_the_end_and_missing_table(self):
+        # Come il fallback (Paginator.get_page): una pagina oltre l'ultima è l'ultima
+        page = DirectoryService.search('centrale', page_number=5)
+        self.assertEqual((page['page'], [p.business_name for p in page['professionals']]), (1, ['Barberia Centrale']))
+        # Una tabella che manca non resta "mancante" per sempre nel processo
+        DirectoryService._fts_checked.clear()
+        with mock.patch.object(connection.introspection, 'table_names', return_value=[]):
+            self.assertFalse(DirectoryService.fts_available())
+        self.assertTrue(DirectoryService.fts_available())
+
+    def test_fallback_search(self):
+        page = DirectoryService.search('meches', use_fts=False)
+        self.assertEqual([p.business_name for p in page['professionals']], ['Studio Colore'])
+
+    def test_index_follows_updates_and_deletes(self):
+        professional = Professional.objects.get(business_name='Studio Colore')
+        self.assertEqual(self.names(q='colore'), ['Studio Colore'])
+        professional.business_name = 'Atelier Capelli'
+        professional.services = 'Piega'
+        professional.save()
+        self.assertEqual(self.names(q='colore'), [])
+        self.assertEqual(self.names(q='atelier'), ['Atelier Capelli'])
+        professional.delete()
+        self.assertEqual(self.names(q='atelier'), [])
+
+
+class ArchiveTests(ProBookTestCase):
+    def setUp(self):
+        super().setUp()
+        self.old = [self.make_booking(date(2020, 3, day), client_name=f'Vecchio {day}') for day in (1, 2, 3)]
+        self.recent = self.make_booking(date.today() + timedelta(days=1), client_name='Recente')
+        self.stats_before = list(BookingDailyStat.objects.order_by('date').values_list('date', 'count'))
+
+    def test_command_moves_old_bookings_in_batches(self):
+        out = io.StringIO()
+        with mock.patch.object(ArchiveService, 'archive_before', wraps=ArchiveService.archive_before) as archive:
+            call_command('archive_bookings', days=30, batch_size=2, stdout=out)
+        self.assertEqual(archive.call_args.kwargs['batch_size'], 2)
+        self.assertIn('Archiviate 3 prenotazioni', out.getvalue())
+
+        self.assertEqual(list(Booking.objects.values_list('id', flat=True)), [self.recent.id])
+        archived = ArchivedBooking.objects.get(pk=self.old[0].id)
+        self.assertEqual((archived.client_name, archived.service.name), ('Vecchio 1', 'Taglio'))
+        # Spostamento, non cancellazione: rollup invariato e nessun tombstone per il feed
+        self.assertFalse(BookingTombstone.objects.exists())
+        self.assertEqual(list(BookingDailyStat.objects.order_by('date').values_list('date', 'count')), self.stats_before)
+        BookingStatsService.rebuild(self.professional)
+        self.assertEqual(list(BookingDailyStat.objects.order_by('date').values_list('date', 'count')), self.stats_before)
+
+    def test_negative_horizon_is_rejected(self):
+        with self.assertRaises(CommandError):
+            call_command('archive_bookings', days=-1, stdout=io.StringIO())
+        with self.assertRaises(ValueError):
+            ArchiveService.cutoff(-1)
+        self.assertEqual(ArchiveService.cutoff(0, today=date(2024, 1, 10)), date(2024, 1, 10))
+        self.assertFalse(ArchivedBooking.objects.exists())
+
+    def test_history_merges_live_and_archived(self):
+        expected = [self.recent.id] + [booking.id for booking in reversed(self.old)]
+        ArchiveService.archive_before(date(2020, 3, 3))
+        # Una booking nuova con data nel passato resta in tabella, tra due archiviate
+        late = self.make_booking(date(2020, 3, 2), at=time(18, 0))
+        expected.insert(2, late.id)
+
+        history = HistoryService.get_professional_history(self.professional)
+        self.assertEqual([booking.id for booking in history], expected)
+
+        seen, cursor = [], None
+        while True:
+            page = HistoryService.get_history_page(self.professional, cursor=cursor, page_size=2)
+            seen.extend(booking.id for booking in page['bookings'])
+            cursor = page['next_cursor']
+            if not cursor:
+                break
+        self.assertEqual(seen, expected)
+
+        rows = list(HistoryService.iter_professional_history(self.professional))
+        self.assertEqual([row[0] for row in rows], expected)
+
+    def test_archives_overridden_occurrence(self):
+        start = date(2020, 3, 9)
+        rule = RecurringBooking.objects.create(
+            professional=self.professional, client_name='Abituale', client_email='abituale@example.com',
+            service=self.service('Taglio'), time=time(9, 0), start_date=start, frequency='weekly', count=3,
+        )
+        moved = BookingService.override_occurrence(rule, start + timedelta(weeks=1), time=time(15, 0))
+        ArchiveService.archive_before(date(2021, 1, 1))
+
+        self.assertTrue(ArchivedBooking.objects.filter(pk=moved.pk).exists())
+        self.assertIsNone(RecurrenceException.objects.get(rule=rule).booking)
+        # Nello storico la booking archiviata sostituisce ancora l'occorrenza
+        history = [(b.date, b.time) for b in HistoryService.get_history_page(self.professional)['bookings']]
+        self.assertIn((start + timedelta(weeks=1), time(15, 0)), history)
+        self.assertNotIn((start + timedelta(weeks=1), time(9, 0)), history)
+
+
+class RecurrenceTests(ProBookTestCase):
+    def rule(self, start, **kwargs):
+        data = {
+            'client_name': 'Cliente abituale', 'client_email': 'abituale@example.com',
+            'service': self.service('Taglio'), 'time': time(10, 0), 'start_date': start,
+        }
+        data.update(kwargs)
+        return BookingService.create_recurring(RecurringBooking(professional=self.professional, **data))
+
+    def test_expansion_jumps_to_the_window(self):
+        rule = RecurringBooking(start_date=date(2024, 1, 1), frequency='weekly', interval=2, count=5)
+        self.assertEqual(
+            list(RecurrenceService.dates(rule, date(2024, 1, 10), date(2024, 12, 31))),
+            [date(2024, 1, 15), date(2024, 1, 29), date(2024, 2, 12), date(2024, 2, 26)],
+        )
+        monthly = RecurringBooking(start_date=date(2000, 1, 15), frequency='monthly', interval=1, until=date(2030, 1, 1))
+        # Trent'anni di regola, ma si generano solo le date della finestra
+        self.assertEqual(
+            list(RecurrenceService.dates(monthly, date(2025, 2, 16), date(2025, 5, 15), reverse=True)),
+            [date(2025, 5, 15), date(2025, 4, 15), date(2025, 3, 15)],
+        )
+        self.assertTrue(RecurrenceService.occurs_on(monthly, date(2029, 12, 15)))
+        self.assertFalse(RecurrenceService.occurs_on(monthly, date(2030, 1, 15)))
+        monthly.start_date = date(2024, 1, 31)
+        with self.assertRaises(ValidationError):
+            monthly.clean()
+        # Anche fuori dall'admin: create_recurring valida la regola prima di salvarla
+        with self.assertRaises(ValidationError):
+            self.rule(date(2030, 1, 31), frequency='monthly')
+        self.assertFalse(RecurringBooking.objects.exists())
+
+    def test_expansion_keeps_each_rule_data(self):
+        start = date.today() + timedelta(days=1)
+        self.rule(start, client_name='Primo', count=2)
+        self.rule(start, client_name='Secondo', time=time(15, 0), frequency='daily', count=2)
+        occurrences = RecurrenceService.occurrences(self.professional, start, start + timedelta(days=7))
+        self.assertEqual(
+            [(o.client_name, o.date, o.time) for o in occurrences],
+            [('Primo', start, time(10, 0)), ('Secondo', start, time(15, 0)),
+             ('Secondo', start + timedelta(days=1), time(15, 0)), ('Primo', start + timedelta(days=7), time(10, 0))],
+        )
+
+    def test_occurrences_in_dashboard_availability_and_conflicts(self):
+        tomorrow = date.today() + timedelta(days=1)
+        rule = self.rule(tomorrow, frequency='daily')
+        self.make_booking(tomorrow, at=time(9, 0))
+
+        bookings = ProfessionalService.get_dashboard_stats(self.professional)['bookings']
+        self.assertEqual(len(bookings), 1 + RecurrenceService.DASHBOARD_DAYS - 1)
+        self.assertEqual([(b.time, b.id is None) for b in bookings[:2]], [(time(9, 0), False), (time(10, 0), True)])
+
+        grid = AvailabilityService.get_availability(self.professional, start=tomorrow, days=1)
+        self.assertNotIn(time(10, 0), grid[tomorrow])
+
+        # Lo slot di un'occorrenza non si prenota; una volta annullata sì
+        with self.assertRaises(SlotTakenError):
+            BookingService.reserve_slot(Booking(
+                professional=self.professional, client_name='X', client_email='x@example.com',
+                date=tomorrow, time=time(10, 0), service=self.service('Barba'),
+            ))
+        BookingService.cancel_occurrence(rule, tomorrow)
+        self.assertIn(time(10, 0), AvailabilityService.get_availability(self.professional, start=tomorrow, days=1)[tomorrow])
+
+        # Una regola che cadrebbe su una booking esistente viene rifiutata
+        with self.assertRaises(SlotTakenError):
+            self.rule(tomorrow - timedelta(days=7), time=time(9, 0), frequency='weekly')
+
+    def test_override_materializes_a_single_occurrence(self):
+        start = date.today() + timedelta(days=1)
+        rule = self.rule(start)
+        moved = BookingService.override_occurrence(rule, start + timedelta(days=7), time=time(15, 0), notes='Spostato')
+        self.assertEqual(Booking.objects.get(), moved)
+        self.assertEqual(RecurrenceException.objects.get().booking, moved)
+        days = [b.date for b in ProfessionalService.get_dashboard_stats(self.professional)['bookings']]
+        self.assertEqual(days[:3], [start, start + timedelta(days=7), start + timedelta(days=14)])
+
+    def test_history_pages_expand_only_the_page(self):
+        # Regola settimanale aperta da dieci anni: la prima pagina non la espande tutta
+        start = date.today() - timedelta(weeks=520)
+        rule = self.rule(start)
+        RecurrenceException.objects.create(rule=rule, date=start + timedelta(weeks=519))
+        booking = self.make_booking(date.today() - timedelta(days=3), at=time(12, 0))
+
+        with self.assertNumQueries(4):
+            page = HistoryService.get_history_page(self.professional, page_size=20)
+        horizon = date.today() + timedelta(days=RecurrenceService.HISTORY_HORIZON_DAYS)
+        self.assertTrue(all(b.date <= horizon for b in page['bookings']))
+        self.assertIn(booking, page['bookings'])
+        self.assertNotIn(start + timedelta(weeks=519), [b.date for b in page['bookings']])
+
+        seen, cursor = [], None
+        while True:
+            page = HistoryService.get_history_page(self.professional, cursor=cursor, page_size=100)
+            seen.extend((b.date, b.id) for b in page['bookings'])
+            cursor = page['next_cursor']
+            if not cursor:
+                break
+        self.assertEqual(seen, sorted(seen, reverse=True, key=lambda item: (item[0], item[1] or 0)))
+        self.assertEqual(len(seen), len(set(seen)))
+        self.assertEqual(seen[-1], (start, None))
+
+
+class HistoryFilterTests(ProBookTestCase):
+    def setUp(self):
+        super().setUp()
+        self.archived = self.make_booking(date(2020, 5, 4), notes='Allergia alla tinta')
+        self.giulia = self.make_booking(
+            date.today() - timedelta(days=10), client_name='Giulia Bianchi', client_email='giulia@example.com',
+            service='Barba', notes='Porta la tinta',
+        )
+        self.mario = self.make_booking(date.today() - timedelta(days=2), service='Barba')
+        ArchiveService.archive_before(date(2021, 1, 1))
+        # Regola ricorrente di un altro "Mario": le occorrenze passano dagli stessi filtri
+        BookingService.create_recurring(RecurringBooking(
+            professional=self.professional, client_name='Mario Verdi', client_email='verdi@example.com',
+            service=self.service('Taglio'), time=time(18, 0), start_date=date.today() - timedelta(days=6),
+            frequency='weekly', count=2,
+        ))
+
+    def archived_booking(self):
+        return ArchivedBooking.objects.get(pk=self.archived.pk)
+
+    def ids(self, query):
+        return [(b.id, b.date) for b in HistoryService.get_history_page(self.professional, query=query)['bookings']]
+
+    def test_filters_compose_on_all_sources(self):
+        query = HistoryService.query
+        occurrence = (None, date.today() + timedelta(days=1))
+        self.assertEqual(
+            self.ids(query(self.professional).client('MARIO')),
+            [occurrence, (self.mario.id, self.mario.date), (None, date.today() - timedelta(days=6)),
+             (self.archived.id, self.archived.date)],
+        )
+        self.assertEqual(self.ids(query(self.professional).client('mario').service('barba')), [(self.mario.id, self.mario.date)])
+        self.assertEqual(self.ids(query(self.professional).client('giulia@')), [(self.giulia.id, self.giulia.date)])
+        # Note: FTS sulle booking in tabella, icontains sull'archivio, parole come prefisso
+        self.assertEqual(
+            self.ids(query(self.professional).notes('tint')),
+            [(self.giulia.id, self.giulia.date), (self.archived.id, self.archived.date)],
+        )
+        self.assertEqual(
+            self.ids(query(self.professional).notes('tinta').dates(date(2020, 1, 1), date(2020, 12, 31))),
+            [(self.archived.id, self.archived.date)],
+        )
+        self.assertEqual(self.ids(query(self.professional).dates(start=date.today())), [occurrence])
+        self.assertEqual(self.ids(query(self.professional).client('nessuno')), [])
+
+    def test_accents_and_case_are_folded_on_every_source(self):
+        old = self.make_booking(date(2020, 6, 1), client_name='Élodie Martin', client_email='em@example.com', notes='Tè verde')
+        ArchiveService.archive_before(date(2021, 1, 1))
+        live = self.make_booking(
+            date.today() - timedelta(days=3), client_name='ÉLODIE Rossi', client_email='er@example.com', notes='Chiede il TÈ',
+        )
+        BookingService.create_recurring(RecurringBooking(
+            professional=self.professional, client_name='élodie Verdi', client_email='ev@example.com',
+            service=self.service('Taglio'), time=time(19, 0), start_date=date.today() - timedelta(days=1),
+            count=1, notes='te freddo',
+        ))
+        expected = [(None, date.today() - timedelta(days=1)), (live.id, live.date), (old.id, old.date)]
+        for prefix in ('élo', 'ELO', 'Elodie'):
+            self.assertEqual(self.ids(HistoryService.query(self.professional).client(prefix)), expected)
+        for words in ('tè', 'TE'):
+            self.assertEqual(self.ids(HistoryService.query(self.professional).notes(words)), expected)
+
+    def test_notes_index_follows_updates_and_deletes(self):
+        notes = lambda text: [b.id for b in HistoryService.get_history_page(
+            self.professional, query=HistoryService.query(self.professional).notes(text),
+        )['bookings']]
+        self.mario.notes = 'Arriva in ritardo'
+        self.mario.save()
+        Booking.objects.filter(pk=self.giulia.pk).update(notes='')
+        self.assertEqual(notes('ritardo'), [self.mario.id])
+        self.assertEqual(notes('porta'), [])
+        self.mario.delete()
+        self.assertEqual(notes('ritardo'), [])
+
+    def test_view_and_api_filters(self):
+        self.client.force_login(self.user)
+        with mock.patch.object(HistoryService, 'PAGE_SIZE', 1):
+            response = self.client.get(reverse('booking_history'), {'client': 'mario', 'service': self.service('Barba').id})
+        self.assertEqual(response.context['bookings'], [self.mario])
+        with mock.patch.object(HistoryService, 'PAGE_SIZE', 3):
+            response = self.client.get(reverse('booking_history'), {'client': 'mario'})
+        # La pagina successiva conserva i filtri
+        self.assertContains(response, f'?client=mario&amp;cursor={response.context["next_cursor"]}')
+        response = self.client.get(reverse('booking_history'), {'client': 'mario', 'cursor': response.context['next_cursor']})
+        self.assertEqual(response.context['bookings'], [self.archived_booking()])
+
+        # Filtri non validi: errore nel form e storico non filtrato
+        response = self.client.get(reverse('booking_history'), {'date_from': '2024-02-01', 'date_to': '2024-01-01'})
+        self.assertIn('date_to', response.context['form'].errors)
+        self.assertFalse(response.context['is_filtered'])
+
+        token = self.client.post(
+            reverse('api_token'), {'username': 'salone', 'password': 'pwd-test-123'},
+        ).json()['access']
+        response = self.client.get(
+            reverse('api_bookings'), {'client': 'GIU', 'q': 'tinta'}, HTTP_AUTHORIZATION=f'Bearer {token}',
+        )
+        self.assertEqual([b['id'] for b in response.json()['results']], [self.giulia.id])
+
+
+    def test_out_of_range_filters_match_nothing(self):
+        token = self.client.post(
+            reverse('api_token'), {'username': 'salone', 'password': 'pwd-test-123'},
+        ).json()['access']
+        for params in ({'service': '²'}, {'service': '9' * 30}, {'client': chr(sys.maxunicode)}):
+            response = self.client.get(reverse('api_bookings'), params, HTTP_AUTHORIZATION=f'Bearer {token}')
+            self.assertEqual(response.status_code, 200)
+            self.assertEqual(response.json()['results'], [])
+        self.assertEqual(self.ids(HistoryService.query(self.professional).service(self.service('Barba').id + 2 ** 64)), [])
+
+class PageCacheTests(ProBookTestCase):
+    """GET condizionale, pagine intere in cache e fragment cache dell'header."""
+
+    def test_home_conditional_get_and_page_cache(self):
+        response = self.client.get(reverse('home'))
+        etag = response['ETag']
+        self.assertIn('public', response['Cache-Control'])
+        self.assertTrue(response.has_header('Last-Modified'))
+
+        self.assertEqual(self.client.get(reverse('home'), HTTP_IF_NONE_MATCH=etag).status_code, 304)
+        # Senza validatori la pagina arriva dalla cache, senza rendering
+        response = self.client.get(reverse('home'))
+        self.assertIsNone(response.context)
+        self.assertEqual(response['ETag'], etag)
+
+        self.professional.business_name = 'Salone Nuovo'
+        self.professional.save()
+        response = self.client.get(reverse('home'), HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, 200)
+        self.assertContains(response, 'Salone Nuovo')
+
+    def test_public_booking_etag_follows_csrf_cookie_and_catalog(self):
+        url = reverse('public_booking', args=[self.professional.id])
+        response = self.client.get(url)
+        etag = response['ETag']
+        self.assertIn('private', response['Cache-Control'])
+        # Il client ora ha il cookie CSRF con cui è stato generato l'ETag
+        self.assertEqual(self.client.get(url, HTTP_IF_NONE_MATCH=etag).status_code, 304)
+
+        self.client.cookies.clear()
+        self.assertEqual(self.client.get(url, HTTP_IF_NONE_MATCH=etag).status_code, 200)
+
+        self.service('Shampoo')
+        response = self.client.get(url, HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, 200)
+        self.assertContains(response, 'Shampoo')
+
+    def test_professional_header_fragment_cache(self):
+        url = reverse('public_booking', args=[self.professional.id])
+
+        def price_list():
+            content = self.client.get(url).content.decode()
+            return content.split('<ul class="service-list">')[1].split('</ul>')[0]
+
+        self.assertIn('Barba', price_list())
+        # Un update senza signal non tocca updated_at: l'header resta quello in cache
+        self.professional.catalog.filter(name='Barba').update(name='Rasatura')
+        self.assertNotIn('Rasatura', price_list())
+        ServiceCatalogService.touch(self.professional.id)
+        self.assertIn('Rasatura', price_list())
+
+    def test_booking_success_last_modified(self):
+        booking = self.make_booking(date.today() + timedelta(days=1))
+        url = reverse('booking_success', args=[booking.id])
+        response = self.client.get(url)
+        self.assertIn('private', response['Cache-Control'])
+        last_modified = response['Last-Modified']
+        self.assertEqual(self.client.get(url, HTTP_IF_MODIFIED_SINCE=last_modified).status_code, 304)
+        self.assertEqual(self.client.get(url, HTTP_IF_NONE_MATCH=response['ETag']).status_code, 304)
+
+        Booking.objects.filter(pk=booking.pk).update(
+            client_name='Luca Verdi', updated_at=booking.updated_at + timedelta(seconds=5),
+        )
+        response = self.client.get(url, HTTP_IF_NONE_MATCH=response['ETag'])
+        self.assertEqual(response.status_code, 200)
+        self.assertContains(response, 'Luca Verdi')
+
+
+class CalendarFeedTests(ProBookTestCase):
+    def setUp(self):
+        super().setUp()
+        self.url = reverse('calendar_feed', args=[self.professional.calendar_token])
+        self.first = self.make_booking(date.today() + timedelta(days=1), notes='Arriva, forse; tardi')
+        self.second = self.make_booking(date.today() + timedelta(days=2), client_name='Luca Verdi')
+        # Booking "vecchie": fuori dal margine del sync token
+        Booking.objects.update(updated_at=timezone.now() - timedelta(hours=1))
+
+    def feed(self, **params):
+        response = self.client.get(self.url, params)
+        self.assertEqual(response.status_code, 200)
+        return response, b''.join(response.streaming_content).decode()
+
+    def test_full_feed_and_conditional_get(self):
+        response, body = self.feed()
+        self.assertEqual(response['Content-Type'], 'text/calendar; charset=utf-8')
+        self.assertTrue(body.startswith('BEGIN:VCALENDAR\r\n') and body.endswith('END:VCALENDAR\r\n'))
+        self.assertIn(f'UID:booking-{self.first.id}@probook', body)
+        self.assertIn('DESCRIPTION:mario@example.com\\nArriva\\, forse\\; tardi', body)
+        self.assertIn('SUMMARY:Taglio - Luca Verdi', body)
+        self.assertTrue(all(len(line.encode()) <= 75 for line in body.split('\r\n')))
+
+        etag = response['ETag']
+        self.assertEqual(self.client.get(self.url, HTTP_IF_NONE_MATCH=etag).status_code, 304)
+        self.make_booking(date.today() + timedelta(days=3))
+        self.assertEqual(self.client.get(self.url, HTTP_IF_NONE_MATCH=etag).status_code, 200)
+
+        self.assertEqual(self.client.get(reverse('calendar_feed', args=['sbagliato'])).status_code, 404)
+        self.assertEqual(self.client.get(self.url, {'sync_token': 'x'}).status_code, 400)
+
+    def test_sync_token_returns_only_changes_and_deletions(self):
+        response, _ = self.feed()
+        token = response['X-Sync-Token']
+        third = self.make_booking(date.today() + timedelta(days=3))
+        deleted_id = self.first.id
+        self.first.delete()
+
+        _, body = self.feed(sync_token=token)
+        self.assertIn(f'UID:booking-{third.id}@probook', body)
+        self.assertNotIn(f'UID:booking-{self.second.id}@probook', body)
+        cancelled = body.split(f'UID:booking-{deleted_id}@probook')[1].split('END:VEVENT')[0]
+        self.assertIn('STATUS:CANCELLED', cancelled)
+
+        _, body = self.feed(updated_since=(timezone.now() - timedelta(days=1)).isoformat())
+        self.assertIn(f'UID:booking-{self.second.id}@probook', body)
+
+    def test_recurring_series_is_one_event_with_rrule(self):
+        start = date.today() + timedelta(days=1)
+        rule = BookingService.create_recurring(RecurringBooking(
+            professional=self.professional, client_name='Cliente abituale', client_email='abituale@example.com',
+            service=self.service('Taglio'), time=time(15, 0), start_date=start, count=4,
+        ))
+        response, _ = self.feed()
+        token = response['X-Sync-Token']
+        RecurringBooking.objects.filter(pk=rule.pk).update(updated_at=timezone.now() - timedelta(hours=1))
+        rule.exceptions.create(date=start + timedelta(weeks=1))
+
+        _, body = self.feed(sync_token=token)
+        event = body.split(f'UID:rule-{rule.id}@probook')[1].split('END:VEVENT')[0]
+        self.assertIn(f'DTSTART:{start:%Y%m%d}T150000', event)
+        self.assertIn('RRULE:FREQ=WEEKLY;INTERVAL=1;COUNT=4', event)
+        self.assertIn(f'EXDATE:{start + timedelta(weeks=1):%Y%m%d}T150000', event)
+        self.assertNotIn(f'UID:booking-{self.first.id}@probook', body)
+
+        # La serie cancellata esce dai calendari come un solo evento annullato
+        rule_id = rule.id
+        rule.delete()
+        _, body = self.feed(sync_token=token)
+        cancelled = body.split(f'UID:rule-{rule_id}@probook')[1].split('END:VEVENT')[0]
+        self.assertIn('STATUS:CANCELLED', cancelled)
+
+    def test_tombstones_pruning_and_professional_deletion(self):
+        self.first.delete()
+        BookingTombstone.objects.update(deleted_at=timezone.now() - CalendarService.TOMBSTONE_RETENTION - timedelta(days=1))
+        self.assertEqual(CalendarService.prune_tombstones(), 1)
+        # Le booking cancellate insieme al professionista non lasciano tombstone
+        self.professional.delete()
+        self.assertFalse(BookingTombstone.objects.exists())
+
+
+class BookingAdminTests(ProBookTestCase):
+    def setUp(self):
+        super().setUp()
+        self.admin_user = User.objects.create_superuser(username='admin', password='pwd-test-123')
+        self.client.force_login(self.admin_user)
+        self.url = reverse('admin:core_booking_changelist')
+        self.year = timezone.localdate().year
+
+    def make_bookings(self, count, start=0):
+        day = date(self.year, 1, 1)
+        for index in range(start, start + count):
+            self.make_booking(day + timedelta(days=index % 300), at=time(8 + index // 300), client_name=f'Cliente {index}')
+
+    def test_changelist_queries_do_not_grow_with_rows(self):
+        self.assertRedirects(self.client.get(self.url), f'{self.url}?date__year={self.year}')
+        self.make_bookings(5)
+        with self.assertNumQueries(5) as small:
+            self.client.get(self.url, {'date__year': self.year})
+        self.make_bookings(60, start=5)
+        other = Professional.objects.create(
+            user=User.objects.create_user(username='altro', password='pwd-test-123'), business_name='Altro',
+        )
+        Booking.objects.create(
+            professional=other, client_name='X', client_email='x@example.com', date=date(self.year, 3, 1),
+            time=time(9), service=ServiceCatalogService.resolve(other, ['Barba'])['Barba'],
+        )
+        with self.assertNumQueries(len(small.captured_queries)):
+            response = self.client.get(self.url, {'date__year': self.year})
+        self.assertContains(response, 'Cliente 64')
+
+    def test_all_dates_lists_every_booking_with_estimated_count(self):
+        self.make_bookings(5)
+        Booking.objects.filter(client_name='Cliente 4').delete()
+        self.assertRedirects(self.client.get(self.url), f'{self.url}?date__year={self.year}')
+        # "Tutte le date" della date hierarchy è "?": dopo la prima apertura non rimbalza più
+        with mock.patch.object(ApproximateCountPaginator, 'EXACT_THRESHOLD', 2), \
+                CaptureQueriesContext(connection) as queries:
+            response = self.client.get(f'{self.url}?')
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.context['cl'].result_count, ApproximateCountPaginator.estimate(Booking.objects.all()))
+        self.assertFalse([q for q in queries if 'COUNT(' in q['sql'] and 'core_booking' in q['sql']])
+
+    def test_paginator_estimates_only_unfiltered_large_tables(self):
+        self.make_bookings(5)
+
+        class SmallThreshold(ApproximateCountPaginator):
+            EXACT_THRESHOLD = 2
+
+        Booking.objects.filter(client_name='Cliente 0').delete()
+        # Senza statistiche la stima è l'id massimo (qui le righe erano 5, una cancellata)
+        self.assertEqual(SmallThreshold(Booking.objects.order_by('pk'), 2).count, 5)
+        self.assertEqual(SmallThreshold(Booking.objects.filter(time=time(8)).order_by('pk'), 2).count, 4)
+        self.assertEqual(ApproximateCountPaginator(Booking.objects.order_by('pk'), 2).count, 4)
+
+    def test_cancel_action_notifies_clients_in_batches(self):
+        self.make_bookings(3)
+        ids = list(Booking.objects.values_list('pk', flat=True))
+        with mock.patch.object(BookingService, 'CANCEL_BATCH_SIZE', 2):
+            self.client.post(self.url, {'action': 'cancel_bookings', '_selected_action': ids})
+        self.assertFalse(Booking.objects.exists())
+        self.assertEqual(BookingTombstone.objects.count(), 3)
+        emails = OutboundEmail.objects.order_by('to', 'id')
+        self.assertEqual(emails.count(), 3)
+        self.assertIn('annullata', emails[0].body)
+
+    def test_export_action_streams_csv(self):
+        self.make_bookings(2)
+        booking = Booking.objects.order_by('date').first()
+        response = self.client.post(self.url, {
+            'action': 'export_csv', '_selected_action': list(Booking.objects.values_list('pk', flat=True)),
+        })
+        self.assertTrue(response.streaming)
+        lines = b''.join(response.streaming_content).decode().splitlines()
+        self.assertEqual(lines[0], 'id,client_name,client_email,service,date,time,notes')
+        self.assertEqual(lines[1].split(',')[:4], [str(booking.id), 'Cliente 0', 'mario@example.com', 'Taglio'])
+        self.assertEqual(len(lines), 3)
+
+
+class BenchmarkCompareTests(TestCase):
+    def test_regressions_over_threshold_are_reported(self):
+        baseline = {'scenarios': {
+            'booking_history': {'p95_ms': 10.0, 'queries': 4},
+            'booking_success': {'p95_ms': 2.0, 'queries': 2},
+        }}
+        results = {'scenarios': {
+            'booking_history': {'p95_ms': 11.5, 'queries': 4},
+            'booking_success': {'p95_ms': 2.0, 'queries': 3},
+            'nuovo_scenario': {'p95_ms': 99.0, 'queries': 9},
+        }}
+        self.assertEqual(benchmarks.compare(results, baseline, threshold=0.2), [
+            'booking_success: 3 query (baseline 2)',
+        ])
+        self.assertEqual(len(benchmarks.compare(results, baseline, threshold=0.1)), 2)
+
+    def test_budget_applies_without_baseline(self):
+        results = {'scenarios': {'directory_search_name': {'p95_ms': 12.5, 'queries': 3}}}
+        self.assertEqual(benchmarks.compare(results, None, threshold=0.2), [
+            'directory_search_name: p95 12.5 ms oltre il budget di 10.0 ms',
+        ])
+
+
+class StartupTests(TestCase):
+    IMPORTTIME = (
+        "import time: self [us] | cumulative | imported package\n"
+        "import time:       900 |        900 |     django.conf\n"
+        "import time:      5000 |      12000 |   django.core.wsgi\n"
+        "import time:      3000 |     400000 | probook.wsgi\n"
+        "import time:        50 |         50 | gc\n"
+    )
+
+    def test_importtime_parsing_and_budget(self):
+        imports = benchmarks.parse_importtime(self.IMPORTTIME, 'probook.wsgi', top=2)
+        self.assertEqual(imports['import_ms'], 400.0)
+        self.assertEqual(imports['modules'], 4)
+        self.assertEqual([m['module'] for m in imports['slowest']], ['django.core.wsgi', 'probook.wsgi'])
+
+        results = {'startup': {'wsgi_import': {'median_ms': 400.0}, 'check': {'median_ms': 900.0}}}
+        baseline = {'startup': {'wsgi_import': {'median_ms': 300.0}, 'check': {'median_ms': 900.0}}}
+        self.assertEqual(benchmarks.compare_startup(results, budget={'wsgi_import': 500.0}), [])
+        self.assertEqual(benchmarks.compare_startup(results, baseline, budget={'check': 800.0}), [
+            'wsgi_import: 400.0 ms > 360.0 ms (baseline 300.0 ms)',
+            'check: 900.0 ms oltre il budget di 800.0 ms',
+        ])
+
+    SHARED_CACHE = 'django.core.cache.backends.redis.RedisCache'
+
+    def load_production_settings(self, **env):
+        sys.modules.pop('probook.settings_production', None)
+        with mock.patch.dict(os.environ, env), \
+                mock.patch.dict(sys.modules['probook.settings'].CACHES['default'], BACKEND=env.get(
+                    'PROBOOK_CACHE_BACKEND', sys.modules['probook.settings'].CACHES['default']['BACKEND'],
+                )):
+            return importlib.import_module('probook.settings_production')
+
+    def test_production_settings(self):
+        with self.assertRaises(ImproperlyConfigured):
+            self.load_production_settings(PROBOOK_SECRET_KEY='', PROBOOK_CACHE_BACKEND=self.SHARED_CACHE)
+        # Cache per processo: rifiutata
+        with self.assertRaisesMessage(ImproperlyConfigured, 'LocMemCache'):
+            self.load_production_settings(
+                PROBOOK_SECRET_KEY='segreto', PROBOOK_CACHE_BACKEND='django.core.cache.backends.locmem.LocMemCache',
+            )
+
+        production = self.load_production_settings(
+            PROBOOK_SECRET_KEY='segreto', PROBOOK_ALLOWED_HOSTS='a.it, b.it', PROBOOK_CACHE_BACKEND=self.SHARED_CACHE,
+        )
+        self.assertFalse(production.DEBUG)
+        self.assertEqual(production.ALLOWED_HOSTS, ['a.it', 'b.it'])
+        loaders = production.TEMPLATES[0]['OPTIONS']['loaders']
+        self.assertEqual(loaders[0][0], 'django.template.loaders.cached.Loader')
+        self.assertNotIn('rest_framework_simplejwt', production.INSTALLED_APPS)
+        self.assertIn('core', production.INSTALLED_APPS)
+
+
+class RequestProfilingTests(ProBookTestCase):
+    def setUp(self):
+        super().setUp()
+        self.client.force_login(self.user)
+        self.make_booking(date.today() + timedelta(days=1))
+        self.url = reverse('professional_dashboard', args=[self.professional.id])
+
+    def test_disabled_by_default(self):
+        self.assertNotIn('Server-Timing', self.client.get(self.url))
+
+    def test_server_timing_and_jsonl_sink(self):
+        with tempfile.TemporaryDirectory() as tmp:
+            log_file = os.path.join(tmp, 'profile.jsonl')
+            config = {'ENABLED': True, 'SAMPLE_RATE': 1.0, 'DUPLICATE_THRESHOLD': 2, 'LOG_FILE': log_file}
+            with override_settings(PROBOOK_PROFILING=config):
+                response = self.client.get(self.url)
+            with open(log_file) as f:
+                record = json.loads(f.readline())
+
+        timing = response['Server-Timing']
+        self.assertIn('sql;dur=', timing)
+        self.assertIn('tpl;dur=', timing)
+        self.assertIn('svc.ProfessionalService.aget_cached_dashboard_stats;dur=', timing)
+        self.assertEqual(record['view'], 'professional_dashboard')
+        self.assertGreater(record['sql_count'], 0)
+
+    def test_duplicate_queries_are_detected(self):
+        profile = RequestProfile()
+        for _ in range(3):
+            profile.record_query('SELECT * FROM core_booking WHERE id = %s', 0.001)
+        profile.record_query('SELECT 1', 0.001)
+        self.assertEqual(profile.duplicates(3), {'SELECT * FROM core_booking WHERE id = %s': 3})
+
+
+class DatabaseProfileTests(TestCase):
+    @skipUnless(connection.vendor == 'sqlite', "PRAGMA specifiche di SQLite")
+    def test_sqlite_pragmas_applied_on_connect(self):
+        with connection.cursor() as cursor:
+            cursor.execute('PRAGMA journal_mode')
+            self.assertEqual(cursor.fetchone()[0], 'wal')
+            cursor.execute('PRAGMA synchronous')
+            self.assertEqual(cursor.fetchone()[0], 1)  # NORMAL
+            cursor.execute('PRAGMA busy_timeout')
+            self.assertEqual(cursor.fetchone()[0], 20000)
+
+    def test_replica_used_only_inside_marked_views(self):
+        router = ReadReplicaRouter()
+
+        @use_read_replica
+        def read_only_view():
+            return router.db_for_read(Booking), router.db_for_write(Booking)
+
+        databases = {'default': {}, 'replica': {}}
+        with override_settings(DATABASES=databases):
+            self.assertEqual(read_only_view(), ('replica', 'default'))
+            self.assertEqual(router.db_for_read(Booking), 'default')
+        # Senza replica configurata tutto resta sul principale
+        self.assertEqual(read_only_view(), ('default', 'default'))
+
+    def test_cache_misses_rebuilt_from_primary(self):
+        router = ReadReplicaRouter()
+
+        @use_read_replica
+        def read_only_view():
+            built = ProfessionalCache.get_or_set('test', 1, (), lambda: router.db_for_read(Booking))
+            return built, router.db_for_read(Booking)
+
+        with mock.patch.dict(settings.DATABASES, {'replica': settings.DATABASES['default']}):
+            # Il valore in cache viene dal principale, il resto della vista legge dalla replica
+            self.assertEqual(read_only_view(), ('default', 'replica'))
+
+    def test_streamed_export_reads_from_replica(self):
+        user = User.objects.create_user(username='export', password='pwd-test-123')
+        professional = Professional.objects.create(user=user, business_name='Salone Export', services='Taglio')
+        self.client.force_login(user)
+        # Il generatore gira dopo la vista: l'alias deve arrivare già risolto
+        with mock.patch.dict(settings.DATABASES, {'replica': settings.DATABASES['default']}), \
+                mock.patch.object(Professional.objects, 'get', return_value=professional), \
+                mock.patch.object(HistoryService, 'iter_professional_history', return_value=iter([])) as rows:
+            response = self.client.get(reverse('booking_history_export', kwargs={'fmt': 'csv'}))
+            b''.join(response.streaming_content)
+        self.assertEqual(rows.call_args.kwargs['using'], 'replica')
@@ -0,0 +1,77 @@
+import functools
+import ipaddress
+
+from asgiref.sync import iscoroutinefunction
+from django.http import HttpResponse
+
+from core.services.throttle_service import ThrottleService
+
+
+def client_ip(request):
+    """
+    IP del client per il throttling: dall'header del reverse proxy se
+    configurato (CLIENT_IP_HEADER), altrimenti REMOTE_ADDR. Un IPv6 conta
+    per la sua /64, che di solito appartiene tutta allo stesso cliente.
+    """
+    header = ThrottleService.config().get('CLIENT_IP_HEADER')
+    raw = (request.META.get(header) if header else None) or request.META.get('REMOTE_ADDR', '')
+    # Con una catena di proxy l'ultimo indirizzo è quello aggiunto dal nostro
+    raw = raw.split(',')[-1].strip()
+    try:
+        address = ipaddress.ip_address(raw)
+    except ValueError:
+        return raw or 'unknown'
+    if address.version == 6:
+        return str(ipaddress.ip_network(f'{address}/64', strict=False))
+    return str(address)
+
+
+# Ambito -> identificativo del bucket, dalla richiesta e dai parametri dell'URL
+SCOPES = {
+    'ip': lambda request, kwargs: client_ip(request),
+    'professional': lambda request, kwargs: kwargs['professional_id'],
+}
+
+
+def throttle_buckets(request, kwargs, scopes):
+    return [(scope, SCOPES[scope](request, kwargs)) for scope in scopes]
+
+
+def throttled_response(wait):
+    response = HttpResponse(
+        "Troppe richieste: riprova tra qualche minuto.", status=429, content_type='text/plain; charset=utf-8',
+    )
+    response['Retry-After'] = ThrottleService.retry_after(wait)
+    return response
+
+
+def throttle(*scopes, methods=('POST',)):
+    """
+    Decoratore per viste pubbliche: un token bucket per ogni ambito (default
+    IP e professionista) sui metodi indicati. Oltre il limite risponde 429
+    con Retry-After prima di eseguire la vista, quindi senza validare il form
+    né toccare il database. Funziona sia con viste sincrone che async; per le
+    APIView c'è core.api.throttling.TokenBucketThrottle.
+    """
+    scopes = scopes or ('ip', 'professional')
+
+    def decorator(view):
+        if iscoroutinefunction(view):
+            @functools.wraps(view)
+            async def async_wrapper(request, *args, **kwargs):
+                if ThrottleService.enabled() and request.method in methods:
+                    wait = await ThrottleService.acheck(throttle_buckets(request, kwargs, scopes))
+                    if wait:
+                        return throttled_response(wait)
+                return await view(request, *args, **kwargs)
+            return async_wrapper
+
+        @functools.wraps(view)
+        def wrapper(request, *args, **kwargs):
+            if ThrottleService.enabled() and request.method in methods:
+                wait = ThrottleService.check(throttle_buckets(request, kwargs, scopes))
+                if wait:
+                    return throttled_response(wait)
+            return view(request, *args, **kwargs)
+        return wrapper
+    return decorator
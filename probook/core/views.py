@@ -1,14 +1,31 @@
-from django.shortcuts import render, get_object_or_404, redirect
+import csv
+import itertools
+import json
+from datetime import date
+
+from asgiref.sync import sync_to_async
+from django.http import Http404, HttpResponseBadRequest, JsonResponse, StreamingHttpResponse
+from django.shortcuts import render, aget_object_or_404, get_object_or_404, redirect
+from django.contrib.admin.views.decorators import staff_member_required
 from django.contrib.auth.decorators import login_required
 from django.contrib.auth.views import LoginView
 from django.urls import reverse
+from django.utils import timezone
 
-from .models import Professional
-from .forms import BookingForm
+from .models import Booking, Professional, Service
+from .routers import read_alias, use_read_replica
+from .throttling import throttle
+from .forms import BookingForm, HistoryFilterForm
 
 from core.services.professional_service import ProfessionalService
 from core.services.history_service import HistoryService
-from core.services.booking_service import BookingService
+from core.services.availability_service import AvailabilityService
+from core.services.booking_service import BookingService, SlotTakenError
+from core.services.calendar_service import CalendarService
+from core.services.cache_service import ProfessionalCache
+from core.services.directory_service import DirectoryService
+from core.services.page_cache_service import PageCacheService
+from core.services.throttle_service import ThrottleService
 
 
 @login_required
@@ -20,18 +37,40 @@ def my_dashboard(request):
     return redirect('professional_dashboard', professional_id=professional.id)
 
 
+@use_read_replica
 def home(request):
-    """Home pubblica: mostra il primo Professional (per ora singolo salone/studio)."""
-    professional = Professional.objects.first()
-    return render(request, 'core/home.html', {'professional': professional})
+    """
+    Home pubblica: directory dei professionisti con ricerca (?q=) e paginazione (?page=).
+    Pagina uguale per tutti: ETag dalla versione della directory, HTML in cache
+    e Cache-Control public, così anche i proxy possono servirla.
+    """
+    query = request.GET.get('q', '').strip()
+    try:
+        page_number = int(request.GET.get('page', 1))
+    except ValueError:
+        page_number = 1
+    etag = PageCacheService.etag('home', DirectoryService.version(), query, page_number)
+    last_modified = DirectoryService.last_modified()
+
+    response = PageCacheService.not_modified(request, etag, last_modified) or PageCacheService.get(etag)
+    if response is None:
+        directory = DirectoryService.search(query, page_number)
+        response = render(request, 'core/home.html', {'query': query, **directory})
+        PageCacheService.set(etag, response, DirectoryService.CACHE_TIMEOUT)
+    return PageCacheService.set_validators(response, etag, last_modified)
 
 
 @login_required
-def professional_dashboard(request, professional_id):
-    """Dashboard principale: dati presi da ProfessionalService."""
-    professional = get_object_or_404(Professional, id=professional_id)
-    stats = ProfessionalService.get_dashboard_stats(professional)
-    return render(request, 'core/dashboard.html', {'professional': professional, **stats})
+async def professional_dashboard(request, professional_id):
+    """Dashboard principale: dati presi da ProfessionalService (tramite la cache per professionista)."""
+    professional = await aget_object_or_404(Professional, id=professional_id)
+    stats = await ProfessionalService.aget_cached_dashboard_stats(professional)
+    # L'URL del feed calendario si mostra solo al titolare (utente già letto da login_required)
+    is_owner = professional.user_id == (await request.auser()).id
+    # Su un miss della fragment cache l'header rilegge il listino: ORM sincrono, fuori dall'event loop
+    return await sync_to_async(render)(request, 'core/dashboard.html', {
+        'professional': professional, 'is_owner': is_owner, **stats,
+    })
 
 
 class ProfessionalLoginView(LoginView):
@@ -43,36 +82,202 @@ class ProfessionalLoginView(LoginView):
         return f'/dashboard/{professional.id}/' if professional else '/'
 
 
-def public_booking(request, professional_id):
-    """Form pubblico di prenotazione: delega creazione + email a BookingService."""
-    professional = get_object_or_404(Professional, id=professional_id)
+@throttle('ip', 'professional')
+async def public_booking(request, professional_id):
+    """
+    Form pubblico di prenotazione: delega creazione + email a BookingService.
+    Vista async: mentre la richiesta attende il DB il worker ASGI serve le altre.
+    I POST passano dai token bucket per IP e per professionista (core.throttling).
+    Sul GET: 304 se il browser ha già la pagina per lo stesso profilo e lo
+    stesso cookie CSRF (il token è nel form, la pagina non è condivisibile).
+    """
+    professional = await aget_object_or_404(Professional, id=professional_id)
+
+    def page_etag():
+        return PageCacheService.etag(
+            'public_booking', professional.id, professional.updated_at.timestamp(),
+            PageCacheService.csrf_part(request),
+        )
+
+    if request.method == 'GET':
+        response = PageCacheService.not_modified(request, page_etag())
+        if response is not None:
+            return PageCacheService.set_validators(response, page_etag(), private=True)
 
     if request.method == 'POST':
-        form = BookingForm(request.POST)
-        if form.is_valid():
-            booking = BookingService.create_booking(professional_id, form)
-            return redirect(reverse('booking_success', args=[booking.id]))
+        form = BookingForm(request.POST, professional=professional)
+        # La validazione legge il servizio scelto dal catalogo: ORM sincrono, fuori dall'event loop
+        if await sync_to_async(form.is_valid)():
+            try:
+                booking = await BookingService.acreate_booking(professional_id, form)
+            except SlotTakenError:
+                form.add_error('time', "Questo orario è già stato prenotato. Scegli un altro orario.")
+            else:
+                return redirect(reverse('booking_success', args=[booking.id]))
     else:
-        form = BookingForm()
+        form = BookingForm(professional=professional)
 
-    return render(request, 'core/public_booking.html', {
+    # Anche il rendering della select dei servizi interroga il catalogo
+    response = await sync_to_async(render)(request, 'core/public_booking.html', {
         'professional': professional,
         'form': form,
     })
+    if request.method == 'GET':
+        # Dopo il rendering: un client senza cookie ha appena ricevuto il suo segreto CSRF
+        PageCacheService.set_validators(response, page_etag(), private=True)
+    return response
+
+
+async def professional_availability(request, professional_id):
+    """
+    API JSON pubblica con gli slot liberi (default 30 giorni da oggi).
+    Parametri GET opzionali: start=YYYY-MM-DD, days=N, service=<id> (slot
+    abbastanza lunghi per la durata di quel servizio).
+    """
+    professional = await aget_object_or_404(
+        Professional.objects.prefetch_related('opening_hours'), id=professional_id,
+    )
+    try:
+        start = date.fromisoformat(request.GET['start']) if 'start' in request.GET else None
+        days = int(request.GET['days']) if 'days' in request.GET else None
+    except ValueError:
+        return JsonResponse({'error': "Parametri start/days non validi."}, status=400)
+    if days is not None and days < 1:
+        return JsonResponse({'error': "days deve essere almeno 1."}, status=400)
+    service = None
+    if 'service' in request.GET:
+        try:
+            service = await professional.catalog.filter(is_active=True).aget(id=int(request.GET['service']))
+        except (ValueError, Service.DoesNotExist):
+            return JsonResponse({'error': "Servizio non valido."}, status=400)
+
+    grid = await AvailabilityService.aget_availability(professional, start=start, days=days, service=service)
+    return JsonResponse({
+        'professional': professional.id,
+        'slot_minutes': professional.slot_minutes,
+        'duration_minutes': AvailabilityService.service_length(professional, service),
+        'days': [
+            {'date': day.isoformat(), 'slots': [slot.strftime('%H:%M') for slot in slots]}
+            for day, slots in grid.items()
+        ],
+    })
 
 
-def booking_success(request, booking_id):
-    """Pagina di conferma dopo l'invio della prenotazione."""
-    booking = get_object_or_404(Professional._meta.model._meta.apps.get_model('core', 'Booking'), id=booking_id)
-    return render(request, 'core/booking_success.html', {'booking': booking})
+async def booking_success(request, booking_id):
+    """
+    Pagina di conferma dopo l'invio della prenotazione.
+    ETag e Last-Modified dagli updated_at di booking e professionista (che
+    copre anche il catalogo); HTML in cache, ma Cache-Control private perché
+    mostra i dati del cliente.
+    """
+    # Il template mostra professionista e servizio: li leggo nella stessa query
+    booking = await aget_object_or_404(Booking.objects.select_related('professional', 'service'), id=booking_id)
+    last_modified = max(booking.updated_at, booking.professional.updated_at)
+    etag = PageCacheService.etag('booking_success', booking.id, last_modified.timestamp())
+
+    response = PageCacheService.not_modified(request, etag, last_modified) or await PageCacheService.aget(etag)
+    if response is None:
+        response = render(request, 'core/booking_success.html', {'booking': booking})
+        await PageCacheService.aset(etag, response)
+    return PageCacheService.set_validators(response, etag, last_modified, private=True)
 
 
 @login_required
-def booking_history(request):
-    """Storico prenotazioni del professionista loggato (gestito da HistoryService)."""
-    professional = Professional.objects.get(user=request.user)
-    bookings = HistoryService.get_professional_history(professional)
-    return render(request, 'core/booking_history.html', {
+@use_read_replica
+async def booking_history(request):
+    """
+    Storico prenotazioni del professionista loggato (gestito da HistoryService),
+    filtrabile per cliente, servizio, date e testo delle note (HistoryFilterForm).
+    I link di paginazione conservano i filtri.
+    """
+    professional = await Professional.objects.aget(user=await request.auser())
+    cursor = request.GET.get('cursor')
+    # Un cursore non decodificabile vale come prima pagina: niente link "Più recenti"
+    if cursor and HistoryService.decode_cursor(cursor) is None:
+        cursor = None
+    params = request.GET.copy()
+    params.pop('cursor', None)
+
+    query = HistoryService.query(professional)
+    form = HistoryFilterForm(params or None, professional=professional)
+    # Filtri non validi: la pagina non è filtrata e il form mostra gli errori
+    if params and await sync_to_async(form.is_valid)():
+        form.apply_to(query)
+    page = await HistoryService.aget_cached_history_page(professional, cursor=cursor, query=query)
+    # Il form renderizza la select del catalogo (una query): render sincrono
+    return await sync_to_async(render)(request, 'core/booking_history.html', {
         'professional': professional,
-        'bookings': bookings,
+        'form': form,
+        'is_filtered': query.is_filtered,
+        'filter_query': params.urlencode() if query.is_filtered else '',
+        'is_first_page': not cursor,
+        **page,
     })
+
+
+class _Echo:
+    """Pseudo-buffer per csv.writer: restituisce la riga invece di scriverla."""
+    def write(self, value):
+        return value
+
+
+@login_required
+@use_read_replica
+def booking_history_export(request, fmt):
+    """Export in streaming (CSV o NDJSON) dell'intero storico, a memoria costante."""
+    professional = Professional.objects.get(user=request.user)
+    # Le righe si leggono mentre la risposta è in streaming, fuori da @use_read_replica:
+    # il database va scelto adesso
+    rows = HistoryService.iter_professional_history(professional, using=read_alias())
+    fields = HistoryService.EXPORT_FIELDS
+
+    if fmt == 'csv':
+        writer = csv.writer(_Echo())
+        content = (writer.writerow(row) for row in itertools.chain([fields], rows))
+        content_type = 'text/csv'
+    elif fmt == 'ndjson':
+        content = (
+            json.dumps(dict(zip(fields, row)), default=str) + '\n' for row in rows
+        )
+        content_type = 'application/x-ndjson'
+    else:
+        raise Http404("Formato di export non supportato")
+
+    response = StreamingHttpResponse(content, content_type=content_type)
+    response['Content-Disposition'] = f'attachment; filename="storico-prenotazioni.{fmt}"'
+    return response
+
+
+def calendar_feed(request, token):
+    """
+    Feed iCalendar delle prenotazioni, generato in streaming (CalendarService).
+    Niente login: il token segreto nell'URL identifica il professionista.
+    ?sync_token=<X-Sync-Token della risposta precedente> o ?updated_since=<ISO 8601>
+    restituiscono solo modifiche e cancellazioni; un feed invariato risponde 304.
+    """
+    professional = get_object_or_404(Professional, calendar_token=token)
+    try:
+        since = CalendarService.parse_since(request.GET.get('sync_token'), request.GET.get('updated_since'))
+    except (ValueError, OverflowError):
+        return HttpResponseBadRequest("sync_token o updated_since non validi.")
+
+    etag = CalendarService.etag(professional, since)
+    response = PageCacheService.not_modified(request, etag)
+    if response is None:
+        now = timezone.now()
+        response = StreamingHttpResponse(
+            CalendarService.feed(professional, since=since, now=now),
+            content_type='text/calendar; charset=utf-8',
+        )
+        response['Content-Disposition'] = 'inline; filename="prenotazioni.ics"'
+        response['X-Sync-Token'] = CalendarService.sync_token(now)
+    return PageCacheService.set_validators(response, etag, private=True)
+
+
+@staff_member_required
+def cache_stats(request):
+    """
+    Monitoraggio: contatori hit/miss della cache per professionista e, sotto
+    'throttle', richieste pubbliche passate e respinte dal throttling.
+    """
+    return JsonResponse({**ProfessionalCache.stats(), 'throttle': ThrottleService.counters()})
@@ -10,6 +10,7 @@ For the full list of settings and their values, see
 https://docs.djangoproject.com/en/5.2/ref/settings/
 """
 
+import os
 from pathlib import Path
 
 # Build paths inside the project like this: BASE_DIR / 'subdir'.
@@ -49,6 +50,8 @@ REST_FRAMEWORK = {
 }
 
 MIDDLEWARE = [
+    # Per primo, così misura anche il resto dello stack (si auto-disattiva se spento)
+    'core.middleware.RequestProfilingMiddleware',
     'django.middleware.security.SecurityMiddleware',
     'django.contrib.sessions.middleware.SessionMiddleware',
     'django.middleware.common.CommonMiddleware',
@@ -58,6 +61,29 @@ MIDDLEWARE = [
     'django.middleware.clickjacking.XFrameOptionsMiddleware',
 ]
 
+# Profilazione per richiesta (query SQL, template, service layer -> header Server-Timing).
+# Spenta di default: da spenta il middleware non entra nemmeno nello stack.
+PROBOOK_PROFILING = {
+    'ENABLED': os.environ.get('PROBOOK_PROFILING', '') == '1',
+    'SAMPLE_RATE': float(os.environ.get('PROBOOK_PROFILING_SAMPLE_RATE', '1.0')),
+    'DUPLICATE_THRESHOLD': 3,
+    'LOG_FILE': os.environ.get('PROBOOK_PROFILING_LOG_FILE') or None,
+}
+
+# Throttling delle prenotazioni pubbliche (token bucket nella cache di default:
+# in produzione serve una cache condivisa tra i worker, es. Redis/Memcached).
+# RATES: "capacità/periodo" per ambito; il bucket si riempie a capacità/periodo.
+# CLIENT_IP_HEADER: header META con l'IP del client messo dal reverse proxy (es. HTTP_X_REAL_IP),
+# altrimenti REMOTE_ADDR.
+PROBOOK_THROTTLE = {
+    'ENABLED': os.environ.get('PROBOOK_THROTTLE', '1') == '1',
+    'RATES': {
+        'ip': os.environ.get('PROBOOK_THROTTLE_IP_RATE', '10/h'),
+        'professional': os.environ.get('PROBOOK_THROTTLE_PROFESSIONAL_RATE', '120/h'),
+    },
+    'CLIENT_IP_HEADER': os.environ.get('PROBOOK_CLIENT_IP_HEADER') or None,
+}
+
 ROOT_URLCONF = 'probook.urls'
 
 TEMPLATES = [
@@ -81,10 +107,77 @@ WSGI_APPLICATION = 'probook.wsgi.application'
 # Database
 # https://docs.djangoproject.com/en/5.2/ref/settings/#databases
 
-DATABASES = {
+# Profilo scelto da ambiente: PROBOOK_DB_ENGINE=sqlite (default) oppure postgresql.
+
+if os.environ.get('PROBOOK_DB_ENGINE', 'sqlite') == 'postgresql':
+    DATABASES = {
+        'default': {
+            'ENGINE': 'django.db.backends.postgresql',
+            'NAME': os.environ.get('PROBOOK_DB_NAME', 'probook'),
+            'USER': os.environ.get('PROBOOK_DB_USER', 'probook'),
+            'PASSWORD': os.environ.get('PROBOOK_DB_PASSWORD', ''),
+            'HOST': os.environ.get('PROBOOK_DB_HOST', 'localhost'),
+            'PORT': os.environ.get('PROBOOK_DB_PORT', '5432'),
+            # Connessioni persistenti, verificate prima del riuso
+            'CONN_MAX_AGE': int(os.environ.get('PROBOOK_DB_CONN_MAX_AGE', '60')),
+            'CONN_HEALTH_CHECKS': True,
+            'OPTIONS': {},
+        }
+    }
+    if os.environ.get('PROBOOK_DB_POOL') == '1':
+        # Pool di psycopg 3 (richiede psycopg[pool]); incompatibile con CONN_MAX_AGE
+        DATABASES['default']['CONN_MAX_AGE'] = 0
+        DATABASES['default']['OPTIONS']['pool'] = {
+            'min_size': int(os.environ.get('PROBOOK_DB_POOL_MIN', '2')),
+            'max_size': int(os.environ.get('PROBOOK_DB_POOL_MAX', '10')),
+        }
+    if os.environ.get('PROBOOK_DB_REPLICA_HOST'):
+        # Replica in sola lettura per le viste marcate con @use_read_replica (vedi core.routers)
+        DATABASES['replica'] = {
+            **DATABASES['default'],
+            'HOST': os.environ['PROBOOK_DB_REPLICA_HOST'],
+            'PORT': os.environ.get('PROBOOK_DB_REPLICA_PORT', DATABASES['default']['PORT']),
+            'OPTIONS': dict(DATABASES['default']['OPTIONS']),
+            'TEST': {'MIRROR': 'default'},
+        }
+else:
+    DATABASES = {
+        'default': {
+            'ENGINE': 'django.db.backends.sqlite3',
+            'NAME': os.environ.get('PROBOOK_DB_NAME', BASE_DIR / 'db.sqlite3'),
+            'OPTIONS': {
+                # Le transazioni prendono subito il lock in scrittura: niente "database is locked"
+                # immediato quando due richieste passano da lettura a scrittura insieme
+                'transaction_mode': 'IMMEDIATE',
+                'timeout': 20,
+                # Eseguito su ogni nuova connessione: WAL (letture non bloccate dalle scritture),
+                # attesa sui lock, fsync ridotti (sicuri con WAL) e file mappato in memoria
+                'init_command': (
+                    'PRAGMA journal_mode=WAL;'
+                    'PRAGMA busy_timeout=20000;'
+                    'PRAGMA synchronous=NORMAL;'
+                    'PRAGMA mmap_size=268435456;'
+                ),
+            },
+            'TEST': {
+                # DB di test su file (non in memoria) così i test di concorrenza usano
+                # connessioni reali in parallelo come in produzione
+                'NAME': BASE_DIR / 'test_db.sqlite3',
+            },
+        }
+    }
+
+DATABASE_ROUTERS = ['core.routers.ReadReplicaRouter']
+
+
+# Cache
+# https://docs.djangoproject.com/en/5.2/topics/cache/
+# Backend configurabile da ambiente (es. Redis/Memcached in produzione), locmem di default.
+
+CACHES = {
     'default': {
-        'ENGINE': 'django.db.backends.sqlite3',
-        'NAME': BASE_DIR / 'db.sqlite3',
+        'BACKEND': os.environ.get('PROBOOK_CACHE_BACKEND', 'django.core.cache.backends.locmem.LocMemCache'),
+        'LOCATION': os.environ.get('PROBOOK_CACHE_LOCATION', 'probook'),
     }
 }
 
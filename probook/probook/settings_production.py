@@ -0,0 +1,80 @@
+"""
+Settings di produzione: DJANGO_SETTINGS_MODULE=probook.settings_production.
+
+Partono da probook.settings (profili di database e cache già scelti da
+ambiente) e cambiano solo ciò che in produzione deve essere diverso:
+- DEBUG spento, SECRET_KEY e host consentiti da ambiente;
+- cache condivisa obbligatoria (LocMemCache rifiutata);
+- template loader in cache esplicito: i template si leggono e compilano una
+  volta per processo, senza controllare i file su disco ad ogni rendering;
+- avvio più leggero: fuori le app che servono solo in sviluppo (API
+  navigabile di DRF, traduzioni di simplejwt) e il middleware di
+  profilazione quando è spento.
+
+Il tempo di avvio si misura con `python manage.py benchmark_startup`.
+"""
+import os
+
+from django.core.exceptions import ImproperlyConfigured
+
+from .settings import *  # noqa: F401,F403
+from .settings import BASE_DIR, CACHES, INSTALLED_APPS, MIDDLEWARE, PROBOOK_PROFILING, REST_FRAMEWORK, TEMPLATES
+
+DEBUG = False
+
+SECRET_KEY = os.environ.get('PROBOOK_SECRET_KEY')
+if not SECRET_KEY:
+    raise ImproperlyConfigured("PROBOOK_SECRET_KEY è obbligatoria con le settings di produzione.")
+
+# Versioni e ETag delle pagine, token bucket del throttling e contatori vivono nella cache:
+# con la locmem ogni worker avrebbe la sua (pagine vecchie servite come fresche, limiti
+# moltiplicati per il numero di worker). Serve una cache condivisa, es. Redis.
+if CACHES['default']['BACKEND'] == 'django.core.cache.backends.locmem.LocMemCache':
+    raise ImproperlyConfigured(
+        "PROBOOK_CACHE_BACKEND deve indicare una cache condivisa tra i worker (es. "
+        "django.core.cache.backends.redis.RedisCache), non LocMemCache."
+    )
+
+ALLOWED_HOSTS = [host.strip() for host in os.environ.get('PROBOOK_ALLOWED_HOSTS', '').split(',') if host.strip()]
+
+# Cookie solo su HTTPS (PROBOOK_HTTPS=0 per un'installazione senza TLS)
+SESSION_COOKIE_SECURE = CSRF_COOKIE_SECURE = os.environ.get('PROBOOK_HTTPS', '1') == '1'
+
+STATIC_ROOT = os.environ.get('PROBOOK_STATIC_ROOT', BASE_DIR / 'staticfiles')
+
+
+# Applicazioni
+# 'rest_framework' serve solo per template e static dell'API navigabile (qui solo JSON);
+# 'rest_framework_simplejwt' solo per le traduzioni, e caricarlo all'avvio importa
+# anche django.test. Autenticazione JWT e view del token restano: le importa DRF
+# (o core.api.urls) alla prima richiesta che le usa.
+
+INSTALLED_APPS = [app for app in INSTALLED_APPS if app not in ('rest_framework', 'rest_framework_simplejwt')]
+
+REST_FRAMEWORK = {
+    **REST_FRAMEWORK,
+    'DEFAULT_RENDERER_CLASSES': ('rest_framework.renderers.JSONRenderer',),
+}
+
+if not PROBOOK_PROFILING['ENABLED']:
+    MIDDLEWARE = [name for name in MIDDLEWARE if name != 'core.middleware.RequestProfilingMiddleware']
+
+
+# Template: loader espliciti (APP_DIRS va spento quando si indicano i loader)
+
+TEMPLATES = [
+    {
+        **TEMPLATES[0],
+        'APP_DIRS': False,
+        'OPTIONS': {
+            **TEMPLATES[0]['OPTIONS'],
+            'debug': False,
+            'loaders': [
+                ('django.template.loaders.cached.Loader', [
+                    'django.template.loaders.filesystem.Loader',
+                    'django.template.loaders.app_directories.Loader',
+                ]),
+            ],
+        },
+    },
+]
@@ -18,7 +18,7 @@ from django.contrib import admin
 from django.urls import path, include
 
 from core import views as core_views
-from core.views import ProfessionalLoginView, booking_history
+from core.views import ProfessionalLoginView, booking_history, booking_history_export
 
 
 urlpatterns = [
@@ -29,11 +29,22 @@ urlpatterns = [
     path('dashboard/me/', core_views.my_dashboard, name='my_dashboard'),
     path('dashboard/<int:professional_id>/', core_views.professional_dashboard, name='professional_dashboard'),
     path('dashboard/history/', booking_history, name='booking_history'),
+    path('dashboard/history/export/<str:fmt>/', booking_history_export, name='booking_history_export'),
 
     # Prenotazioni pubbliche
     path('book/<int:professional_id>/', core_views.public_booking, name='public_booking'),
+    path('book/<int:professional_id>/availability/', core_views.professional_availability, name='professional_availability'),
     path('booking/success/<int:booking_id>/', core_views.booking_success, name='booking_success'),
 
+    # Feed iCalendar del professionista (autenticato dal token nell'URL)
+    path('calendar/<str:token>.ics', core_views.calendar_feed, name='calendar_feed'),
+
+    # API REST versionate (JWT)
+    path('api/v1/', include('core.api.urls')),
+
+    # Monitoraggio (solo staff)
+    path('monitoring/cache/', core_views.cache_stats, name='cache_stats'),
+
     # Auth built‑in (login/logout/password reset ecc.)
     path('accounts/', include('django.contrib.auth.urls')),
 